@@ -38,6 +38,36 @@ def create_app(config_name=None):
     app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'jwt-secret-key')
     app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_SIZE', 16777216))  # 16MB
     
+    # Gravação em lote dos contadores de reprodução
+    app.config['PLAY_COUNT_FLUSH_INTERVAL'] = float(os.environ.get('PLAY_COUNT_FLUSH_INTERVAL', 5))  # segundos
+    app.config['PLAY_COUNT_FLUSH_THRESHOLD'] = int(os.environ.get('PLAY_COUNT_FLUSH_THRESHOLD', 1000))
+    app.config['PLAY_COUNT_REPLAY_WINDOW'] = float(os.environ.get('PLAY_COUNT_REPLAY_WINDOW', 30))  # segundos
+    
+    # Gravação em lote do último login
+    app.config['LAST_LOGIN_FLUSH_INTERVAL'] = float(os.environ.get('LAST_LOGIN_FLUSH_INTERVAL', 5))  # segundos
+    app.config['LAST_LOGIN_FLUSH_THRESHOLD'] = int(os.environ.get('LAST_LOGIN_FLUSH_THRESHOLD', 1000))
+    
+    # Índice de sugestões (autocompletar) construído em segundo plano na inicialização
+    app.config['SUGGEST_PRELOAD'] = os.environ.get('SUGGEST_PRELOAD', 'true').lower() == 'true'
+    app.config['SUGGEST_REBUILD_INTERVAL'] = float(os.environ.get('SUGGEST_REBUILD_INTERVAL', 600))  # segundos (0 desativa)
+    
+    # Busca aproximada sem pg_trgm: reconstrução periódica do índice em memória
+    app.config['FUZZY_REBUILD_INTERVAL'] = float(os.environ.get('FUZZY_REBUILD_INTERVAL', 600))  # segundos (0 desativa)
+    
+    # Revogação de tokens: atraso máximo (s) para um logout valer nos demais workers
+    app.config['TOKEN_BLOCKLIST_SYNC_INTERVAL'] = float(os.environ.get('TOKEN_BLOCKLIST_SYNC_INTERVAL', 5))
+    app.config['TOKEN_BLOCKLIST_RELOAD_INTERVAL'] = float(os.environ.get('TOKEN_BLOCKLIST_RELOAD_INTERVAL', 3600))
+    
+    # Hash de senhas: bcrypt, pbkdf2 ou scrypt; custo padrão do algoritmo se vazio
+    app.config['PASSWORD_HASH_ALGORITHM'] = os.environ.get('PASSWORD_HASH_ALGORITHM', 'bcrypt')
+    app.config['PASSWORD_HASH_COST'] = int(os.environ['PASSWORD_HASH_COST']) if os.environ.get('PASSWORD_HASH_COST') else None
+    app.config['PASSWORD_HASH_POOL'] = os.environ.get('PASSWORD_HASH_POOL', 'thread')
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 0)) or None
+    
+    # Usuário do token: cache por processo (s, 0 desativa) e claims is_admin/is_active no token
+    app.config['CURRENT_USER_CACHE_TTL'] = float(os.environ.get('CURRENT_USER_CACHE_TTL', 5))
+    app.config['JWT_USER_CLAIMS'] = os.environ.get('JWT_USER_CLAIMS', 'false').lower() == 'true'
+    
     # Configurar diretório de uploads
     app.config['UPLOAD_FOLDER'] = os.path.join(app.root_path, '..', 'static', 'uploads')
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -47,12 +77,46 @@ def create_app(config_name=None):
     migrate.init_app(app, db)
     jwt.init_app(app)
     
+    from app.services.play_counter import play_counter
+    play_counter.init_app(app)
+    
+    from app.services.last_login import last_login_recorder
+    last_login_recorder.init_app(app)
+    
+    from app.services.password_hasher import password_hasher
+    password_hasher.init_app(app)
+    
     # Configurar CORS
     cors_origins = os.environ.get('CORS_ORIGINS', 'http://localhost:3000').split(',')
     CORS(app, origins=cors_origins, supports_credentials=True)
     
     # Importar modelos (para migrations)
-    from app.models import user, music, playlist, task_list, task
+    from app.models import user, music, playlist, task_list, task, revoked_token
+    
+    # Busca textual de músicas (FTS5 no SQLite, tsvector no PostgreSQL)
+    from app.services.music_search import music_search
+    music_search.init_app(app)
+    
+    from app.services.fuzzy_search import fuzzy_search
+    fuzzy_search.init_app(app)
+    
+    from app.services.suggest_index import suggest_index
+    suggest_index.init_app(app)
+    
+    from app.services.current_user import current_user_loader
+    current_user_loader.init_app(app)
+    
+    # Tokens revogados (logout), verificados em todas as rotas protegidas
+    from app.services.token_blocklist import token_blocklist
+    token_blocklist.init_app(app)
+    
+    @jwt.token_in_blocklist_loader
+    def check_if_token_revoked(jwt_header, jwt_payload):
+        return token_blocklist.is_revoked(jwt_payload['jti'])
+    
+    @jwt.revoked_token_loader
+    def revoked_token_response(jwt_header, jwt_payload):
+        return {'error': 'Token foi revogado'}, 401
     
     # Registrar blueprints
     from app.routes.auth import auth_bp
@@ -90,6 +154,8 @@ def create_app(config_name=None):
         }
     
     # Rotas de saúde e informações
+    from app.services.spotify_service import spotify_service
+    
     @app.route('/api/health')
     def health():
         try:
@@ -103,7 +169,11 @@ def create_app(config_name=None):
         return {
             'status': 'healthy', 
             'message': 'TO-DO List API is running',
-            'database': db_status
+            'database': db_status,
+            'play_counter': play_counter.metrics(),
+            'last_login': last_login_recorder.metrics(),
+            'spotify_cache': spotify_service.cache.stats(),
+            'token_blocklist': token_blocklist.stats()
         }
     
     @app.route('/api')
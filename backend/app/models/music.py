@@ -1,5 +1,7 @@
 from datetime import datetime
+from sqlalchemy import func
 from app import db
+from app.services.play_counter import play_counter
 
 
 # Tabela de associação para many-to-many entre Playlist e Music
@@ -7,7 +9,8 @@ playlist_music = db.Table('playlist_music',
     db.Column('playlist_id', db.Integer, db.ForeignKey('playlists.id'), primary_key=True),
     db.Column('music_id', db.Integer, db.ForeignKey('music.id'), primary_key=True),
     db.Column('added_at', db.DateTime, default=datetime.utcnow, nullable=False),
-    db.Column('position', db.Integer, nullable=True)  # Para ordenação na playlist
+    db.Column('position', db.Integer, nullable=True),  # Para ordenação na playlist
+    db.Index('ix_playlist_music_playlist_id_position', 'playlist_id', 'position')
 )
 
 
@@ -18,7 +21,7 @@ class Music(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False, index=True)
     artist = db.Column(db.String(200), nullable=False, index=True)
-    album = db.Column(db.String(200), nullable=True)
+    album = db.Column(db.String(200), nullable=True, index=True)
     genre = db.Column(db.String(100), nullable=True)
     year = db.Column(db.Integer, nullable=True)
     duration = db.Column(db.Integer, nullable=True)  # duração em segundos
@@ -48,10 +51,21 @@ class Music(db.Model):
     # Relacionamento many-to-many com playlists
     playlists = db.relationship('Playlist', secondary=playlist_music, back_populates='music_tracks')
     
+    __table_args__ = (
+        # Listagem (mais recentes primeiro, cursor em created_at, id)
+        db.Index('ix_music_created_at_id', 'created_at', 'id'),
+        # Uploads de um usuário e filtro uploader_id
+        db.Index('ix_music_uploaded_by_id_created_at', 'uploaded_by_id', 'created_at'),
+    )
+    
     def increment_play_count(self):
-        """Incrementa o contador de reproduções"""
-        self.play_count += 1
-        db.session.commit()
+        """Incrementa o contador de reproduções (gravado em lote pelo play_counter)"""
+        play_counter.record('music', self.id)
+    
+    @property
+    def current_play_count(self):
+        """Contador gravado somado às reproduções ainda no buffer"""
+        return self.play_count + play_counter.pending('music', self.id)
     
     @property
     def duration_formatted(self):
@@ -76,8 +90,40 @@ class Music(db.Model):
         else:
             return f"{self.file_size / (1024 * 1024):.1f} MB"
     
-    def to_dict(self, include_file_info=False):
+    @staticmethod
+    def with_uploader(query):
+        """Inclui o username do uploader na query (evita um lazy load por linha)"""
+        from .user import User
+        return query.outerjoin(User, User.id == Music.uploaded_by_id).add_columns(User.username)
+    
+    @staticmethod
+    def playlists_counts(music_ids):
+        """Conta em quantas playlists cada música está, em uma única query agrupada"""
+        if not music_ids:
+            return {}
+        
+        rows = db.session.query(playlist_music.c.music_id, func.count()).filter(
+            playlist_music.c.music_id.in_(music_ids)
+        ).group_by(playlist_music.c.music_id).all()
+        return dict(rows)
+    
+    @staticmethod
+    def list_to_dict(rows, include_file_info=False):
+        """Serializa as linhas (Music, username) de uma query montada com with_uploader"""
+        counts = Music.playlists_counts([music.id for music, _ in rows])
+        return [
+            music.to_dict(include_file_info, uploader=username,
+                          playlists_count=counts.get(music.id, 0))
+            for music, username in rows
+        ]
+    
+    def to_dict(self, include_file_info=False, uploader=None, playlists_count=None):
         """Converte a música para dicionário"""
+        if uploader is None and self.uploaded_by_id is not None:
+            uploader = self.uploader.username if self.uploader else None
+        if playlists_count is None:
+            playlists_count = len(self.playlists)
+        
         data = {
             'id': self.id,
             'title': self.title,
@@ -94,12 +140,12 @@ class Music(db.Model):
             'cover_image_url': self.cover_image_url,
             'is_local': self.is_local,
             'is_public': self.is_public,
-            'play_count': self.play_count,
+            'play_count': self.current_play_count,
             'uploaded_by_id': self.uploaded_by_id,
-            'uploader': self.uploader.username if self.uploader else None,
+            'uploader': uploader,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'playlists_count': len(self.playlists)
+            'playlists_count': playlists_count
         }
         
         if include_file_info:
@@ -1,6 +1,13 @@
 from datetime import datetime
+from sqlalchemy import func, literal, select
 from app import db
-from .music import playlist_music
+from app.services.play_counter import play_counter
+from .music import Music, playlist_music
+
+# Espaçamento entre posições consecutivas de playlist_music: inserir entre
+# duas músicas usa o ponto médio, e só quando o espaço se esgota a playlist
+# inteira é renumerada.
+POSITION_GAP = 1024
 
 
 class Playlist(db.Model):
@@ -21,7 +28,7 @@ class Playlist(db.Model):
     play_count = db.Column(db.Integer, default=0, nullable=False)
     
     # Relacionamentos
-    owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
@@ -29,17 +36,97 @@ class Playlist(db.Model):
     music_tracks = db.relationship('Music', secondary=playlist_music, back_populates='playlists', 
                                  order_by='playlist_music.c.position')
     
+    def has_music(self, music_id):
+        """Verifica se a música está na playlist (sem carregar as faixas)"""
+        return db.session.query(
+            db.session.query(playlist_music).filter(
+                playlist_music.c.playlist_id == self.id,
+                playlist_music.c.music_id == music_id
+            ).exists()
+        ).scalar()
+    
+    def _ordered_positions(self, exclude_music_id=None):
+        """Query das posições da playlist na ordem de exibição"""
+        query = db.session.query(playlist_music.c.position).filter(
+            playlist_music.c.playlist_id == self.id
+        )
+        if exclude_music_id is not None:
+            query = query.filter(playlist_music.c.music_id != exclude_music_id)
+        return query.order_by(playlist_music.c.position, playlist_music.c.music_id)
+    
+    def _positions_for_index(self, index=None, count=1, exclude_music_id=None):
+        """Calcula as posições (ranks) para inserir count músicas no índice dado.
+        
+        index é 0-based; None significa o fim da playlist. Apenas os vizinhos
+        do ponto de inserção são lidos. Quando não há mais espaço entre eles,
+        a playlist é renumerada com rebalance_positions().
+        """
+        if index is None:
+            last = self._ordered_positions(exclude_music_id).order_by(None).with_entities(
+                func.max(playlist_music.c.position)
+            ).scalar()
+            return [(last or 0) + (i + 1) * POSITION_GAP for i in range(count)]
+        
+        index = max(index, 0)
+        offset = max(index - 1, 0)
+        neighbours = [row.position for row in
+                      self._ordered_positions(exclude_music_id).offset(offset).limit(2)]
+        
+        if None in neighbours:
+            # Posições vazias (dados antigos): normalizar antes de calcular
+            self.rebalance_positions()
+            return self._positions_for_index(index, count, exclude_music_id)
+        
+        if index == 0:
+            before, after = 0, neighbours[0] if neighbours else None
+        else:
+            before = neighbours[0] if neighbours else None
+            after = neighbours[1] if len(neighbours) > 1 else None
+        
+        if before is None or after is None:
+            return self._positions_for_index(None, count, exclude_music_id)
+        
+        if after - before <= count:
+            self.rebalance_positions(gap=max(POSITION_GAP, count + 1))
+            return self._positions_for_index(index, count, exclude_music_id)
+        
+        return [before + (after - before) * (i + 1) // (count + 1) for i in range(count)]
+    
+    def rebalance_positions(self, gap=POSITION_GAP):
+        """Renumera as posições da playlist com espaçamento uniforme"""
+        rows = db.session.query(playlist_music.c.music_id).filter(
+            playlist_music.c.playlist_id == self.id
+        ).order_by(playlist_music.c.position, playlist_music.c.music_id).all()
+        
+        self._set_positions([
+            (row.music_id, (i + 1) * gap) for i, row in enumerate(rows)
+        ])
+    
+    def _set_positions(self, positions):
+        """Atualiza várias posições com um único executemany"""
+        if not positions:
+            return
+        
+        stmt = playlist_music.update().where(
+            playlist_music.c.playlist_id == self.id,
+            playlist_music.c.music_id == db.bindparam('b_music_id')
+        ).values(position=db.bindparam('b_position'))
+        
+        db.session.execute(stmt, [
+            {'b_music_id': music_id, 'b_position': position}
+            for music_id, position in positions
+        ])
+    
     def add_music(self, music, position=None):
-        """Adiciona uma música à playlist"""
-        if music not in self.music_tracks:
-            if position is None:
-                position = len(self.music_tracks) + 1
+        """Adiciona uma música à playlist (position é 1-based; None = final)"""
+        if not self.has_music(music.id):
+            index = position - 1 if position is not None else None
             
             # Inserir na tabela de associação com posição
             stmt = playlist_music.insert().values(
                 playlist_id=self.id,
                 music_id=music.id,
-                position=position,
+                position=self._positions_for_index(index)[0],
                 added_at=datetime.utcnow()
             )
             db.session.execute(stmt)
@@ -54,14 +141,13 @@ class Playlist(db.Model):
     
     def remove_music(self, music):
         """Remove uma música da playlist"""
-        if music in self.music_tracks:
-            # Remover da tabela de associação
-            stmt = playlist_music.delete().where(
-                playlist_music.c.playlist_id == self.id,
-                playlist_music.c.music_id == music.id
-            )
-            db.session.execute(stmt)
-            
+        # Remover da tabela de associação
+        stmt = playlist_music.delete().where(
+            playlist_music.c.playlist_id == self.id,
+            playlist_music.c.music_id == music.id
+        )
+        
+        if db.session.execute(stmt).rowcount:
             # Atualizar duração total
             if music.duration:
                 self.total_duration -= music.duration
@@ -72,22 +158,141 @@ class Playlist(db.Model):
             return True
         return False
     
-    def reorder_music(self, music_id, new_position):
-        """Reordena uma música na playlist"""
-        # Implementar lógica de reordenação
-        # Por simplicidade, vamos apenas atualizar a posição
-        stmt = playlist_music.update().where(
+    def add_music_bulk(self, music_ids, user_id, position=None):
+        """Adiciona várias músicas de uma vez, em uma única transação.
+        
+        As músicas entram na ordem recebida, a partir de position (1-based;
+        None = final). Retorna os ids adicionados, os que já estavam na
+        playlist e os inexistentes ou inacessíveis ao usuário.
+        """
+        music_ids = list(dict.fromkeys(music_ids))
+        
+        # Músicas acessíveis (públicas ou do próprio usuário) em uma query
+        accessible = dict(db.session.query(Music.id, Music.duration).filter(
+            Music.id.in_(music_ids),
+            (Music.is_public == True) | (Music.uploaded_by_id == user_id)
+        ).all())
+        
+        # Músicas que já estão na playlist em outra query
+        existing = {row.music_id for row in db.session.query(playlist_music.c.music_id).filter(
             playlist_music.c.playlist_id == self.id,
-            playlist_music.c.music_id == music_id
-        ).values(position=new_position)
+            playlist_music.c.music_id.in_(list(accessible))
+        )}
         
-        db.session.execute(stmt)
+        added = [music_id for music_id in music_ids if music_id in accessible and music_id not in existing]
+        result = {
+            'added': added,
+            'already_in_playlist': [music_id for music_id in music_ids if music_id in existing],
+            'not_found': [music_id for music_id in music_ids if music_id not in accessible]
+        }
+        if not added:
+            return result
+        
+        index = position - 1 if position is not None else None
+        positions = self._positions_for_index(index, count=len(added))
+        now = datetime.utcnow()
+        
+        db.session.execute(playlist_music.insert(), [
+            {'playlist_id': self.id, 'music_id': music_id, 'position': rank, 'added_at': now}
+            for music_id, rank in zip(added, positions)
+        ])
+        
+        self.total_duration += sum(accessible[music_id] or 0 for music_id in added)
         db.session.commit()
+        return result
     
-    def increment_play_count(self):
-        """Incrementa o contador de reproduções da playlist"""
-        self.play_count += 1
+    def remove_music_bulk(self, music_ids):
+        """Remove várias músicas de uma vez; retorna os ids removidos"""
+        rows = db.session.query(Music.id, Music.duration).join(
+            playlist_music, playlist_music.c.music_id == Music.id
+        ).filter(
+            playlist_music.c.playlist_id == self.id,
+            playlist_music.c.music_id.in_(music_ids)
+        ).all()
+        
+        if not rows:
+            return []
+        
+        removed = [row.id for row in rows]
+        db.session.execute(playlist_music.delete().where(
+            playlist_music.c.playlist_id == self.id,
+            playlist_music.c.music_id.in_(removed)
+        ))
+        
+        self.total_duration = max(self.total_duration - sum(row.duration or 0 for row in rows), 0)
         db.session.commit()
+        return removed
+    
+    def copy_tracks_from(self, source, user_id):
+        """Copia as músicas de outra playlist com um único INSERT ... SELECT.
+        
+        Apenas músicas acessíveis ao usuário (públicas ou enviadas por ele)
+        são copiadas, mantendo as posições. Não faz commit.
+        """
+        accessible = (Music.is_public == True) | (Music.uploaded_by_id == user_id)
+        source_tracks = select(
+            literal(self.id), playlist_music.c.music_id, playlist_music.c.position, literal(datetime.utcnow())
+        ).select_from(
+            playlist_music.join(Music, Music.id == playlist_music.c.music_id)
+        ).where(playlist_music.c.playlist_id == source.id, accessible)
+        
+        db.session.execute(playlist_music.insert().from_select(
+            ['playlist_id', 'music_id', 'position', 'added_at'], source_tracks
+        ))
+        
+        # Duração total calculada no banco, no UPDATE da própria playlist
+        self.total_duration = select(func.coalesce(func.sum(Music.duration), 0)).select_from(
+            playlist_music.join(Music, Music.id == playlist_music.c.music_id)
+        ).where(playlist_music.c.playlist_id == self.id).scalar_subquery()
+    
+    def reorder_music(self, music_id, new_position):
+        """Move uma música para a posição indicada (1-based)"""
+        if not self.has_music(music_id):
+            return False
+        
+        self._set_positions([
+            (music_id, self._positions_for_index(new_position - 1, exclude_music_id=music_id)[0])
+        ])
+        db.session.commit()
+        return True
+    
+    def reorder_tracks(self, music_ids):
+        """Reordena várias músicas em uma única transação.
+        
+        As músicas informadas trocam de lugar entre si, ocupando as mesmas
+        posições que já ocupavam, na ordem da lista recebida. Com todas as
+        músicas da playlist, isso equivale a uma permutação completa.
+        """
+        if len(set(music_ids)) != len(music_ids):
+            return False
+        
+        def current_slots():
+            return db.session.query(playlist_music.c.position).filter(
+                playlist_music.c.playlist_id == self.id,
+                playlist_music.c.music_id.in_(music_ids)
+            ).all()
+        
+        slots = sorted(row.position for row in current_slots())
+        if len(slots) != len(music_ids):
+            return False
+        
+        # Posições repetidas ou vazias (dados antigos) impedem a troca direta
+        if None in slots or len(set(slots)) != len(slots):
+            self.rebalance_positions()
+            slots = sorted(row.position for row in current_slots())
+        
+        self._set_positions(list(zip(music_ids, slots)))
+        db.session.commit()
+        return True
+    
+    def increment_play_count(self):
+        """Incrementa o contador de reproduções da playlist (gravado em lote pelo play_counter)"""
+        play_counter.record('playlist', self.id)
+    
+    @property
+    def current_play_count(self):
+        """Contador gravado somado às reproduções ainda no buffer"""
+        return self.play_count + play_counter.pending('playlist', self.id)
     
     def calculate_total_duration(self):
         """Recalcula a duração total da playlist"""
@@ -100,6 +305,13 @@ class Playlist(db.Model):
         db.session.commit()
         return total
     
+    def tracks_query(self):
+        """Query das músicas da playlist, em ordem, com o username do uploader"""
+        query = Music.query.join(
+            playlist_music, playlist_music.c.music_id == Music.id
+        ).filter(playlist_music.c.playlist_id == self.id)
+        return Music.with_uploader(query).order_by(playlist_music.c.position, Music.id)
+    
     @property
     def total_duration_formatted(self):
         """Retorna a duração total formatada em HH:MM:SS"""
@@ -118,7 +330,9 @@ class Playlist(db.Model):
     @property
     def tracks_count(self):
         """Retorna o número de músicas na playlist"""
-        return len(self.music_tracks)
+        return db.session.query(func.count()).select_from(playlist_music).filter(
+            playlist_music.c.playlist_id == self.id
+        ).scalar()
     
     def to_dict(self, include_tracks=False):
         """Converte a playlist para dicionário"""
@@ -131,7 +345,7 @@ class Playlist(db.Model):
             'is_collaborative': self.is_collaborative,
             'total_duration': self.total_duration,
             'total_duration_formatted': self.total_duration_formatted,
-            'play_count': self.play_count,
+            'play_count': self.current_play_count,
             'tracks_count': self.tracks_count,
             'owner_id': self.owner_id,
             'owner': self.owner.username if self.owner else None,
@@ -140,7 +354,7 @@ class Playlist(db.Model):
         }
         
         if include_tracks:
-            data['tracks'] = [music.to_dict() for music in self.music_tracks]
+            data['tracks'] = Music.list_to_dict(self.tracks_query().all())
             
         return data
     
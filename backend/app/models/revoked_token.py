@@ -0,0 +1,18 @@
+from datetime import datetime
+from app import db
+
+
+class RevokedToken(db.Model):
+    """Tokens JWT revogados (logout), compartilhados entre os workers
+    
+    Cada linha vale até o token expirar; depois disso o próprio JWT é
+    recusado e a linha é apagada pela limpeza periódica do token_blocklist.
+    """
+    __tablename__ = 'revoked_tokens'
+    
+    jti = db.Column(db.String(36), primary_key=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<RevokedToken {self.jti}>'
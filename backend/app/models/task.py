@@ -25,6 +25,16 @@ class Task(db.Model):
     # Relacionamentos
     user = db.relationship('User', backref=db.backref('tasks', lazy=True))
     
+    __table_args__ = (
+        # Listagem e dashboard: sempre por usuário, opcionalmente por lista e status
+        db.Index('ix_tasks_user_id_task_list_id_completed_due_date',
+                 'user_id', 'task_list_id', 'completed', 'due_date'),
+        # Próximas tarefas e atrasadas, sem filtro de lista
+        db.Index('ix_tasks_user_id_completed_due_date', 'user_id', 'completed', 'due_date'),
+        # Tarefas de uma lista (detalhe da lista e contadores)
+        db.Index('ix_tasks_task_list_id_completed', 'task_list_id', 'completed'),
+    )
+    
     def __repr__(self):
         return f'<Task {self.title}>'
     
@@ -1,5 +1,7 @@
 from datetime import datetime
+from sqlalchemy import event, func, inspect, or_, select
 from app import db
+from .task import Task
 
 
 class TaskList(db.Model):
@@ -15,10 +17,19 @@ class TaskList(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Contadores desnormalizados (mantidos pelos eventos de Task abaixo)
+    task_count = db.Column(db.Integer, default=0, nullable=False)
+    completed_count = db.Column(db.Integer, default=0, nullable=False)
+    
     # Relacionamentos
     user = db.relationship('User', backref=db.backref('task_lists', lazy=True, cascade='all, delete-orphan'))
     tasks = db.relationship('Task', backref='task_list', lazy=True, cascade='all, delete-orphan')
     
+    __table_args__ = (
+        # Listas do usuário (ativas ou todas), mais recentes primeiro
+        db.Index('ix_task_lists_user_id_is_archived_created_at', 'user_id', 'is_archived', 'created_at'),
+    )
+    
     def __repr__(self):
         return f'<TaskList {self.title}>'
     
@@ -33,11 +44,43 @@ class TaskList(db.Model):
             'is_archived': self.is_archived,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'task_count': len(self.tasks),
-            'completed_count': len([t for t in self.tasks if t.completed]),
-            'pending_count': len([t for t in self.tasks if not t.completed])
+            'task_count': self.task_count,
+            'completed_count': self.completed_count,
+            'pending_count': self.pending_count
         }
     
+    @property
+    def pending_count(self):
+        """Número de tarefas não concluídas"""
+        return (self.task_count or 0) - (self.completed_count or 0)
+    
+    @staticmethod
+    def reconcile_counters():
+        """Recalcula os contadores a partir da tabela de tarefas.
+        
+        Retorna o número de listas cujos contadores estavam divergentes.
+        """
+        actual_total = select(func.count(Task.id)).where(
+            Task.task_list_id == TaskList.id
+        ).scalar_subquery()
+        actual_completed = select(func.count(Task.id)).where(
+            Task.task_list_id == TaskList.id,
+            Task.completed == True
+        ).scalar_subquery()
+        
+        stmt = TaskList.__table__.update().where(or_(
+            TaskList.task_count != actual_total,
+            TaskList.completed_count != actual_completed
+        )).values(
+            task_count=actual_total,
+            completed_count=actual_completed,
+            updated_at=TaskList.updated_at
+        )
+        
+        result = db.session.execute(stmt)
+        db.session.commit()
+        return result.rowcount
+    
     @staticmethod
     def create_default_list(user_id):
         """Cria uma lista padrão para novo usuário"""
@@ -49,4 +92,53 @@ class TaskList(db.Model):
         )
         db.session.add(default_list)
         db.session.commit()
-        return default_list 
\ No newline at end of file
+        return default_list 
+
+
+def _apply_counter_delta(connection, task_list_id, total, completed):
+    """Ajusta os contadores de uma lista com um UPDATE atômico"""
+    if task_list_id is None or (total == 0 and completed == 0):
+        return
+    
+    table = TaskList.__table__
+    connection.execute(
+        table.update().where(table.c.id == task_list_id).values(
+            task_count=table.c.task_count + total,
+            completed_count=table.c.completed_count + completed,
+            updated_at=table.c.updated_at  # não conta como edição da lista
+        )
+    )
+
+
+def _previous_value(state, attribute):
+    """Valor do atributo antes das alterações pendentes no flush"""
+    history = state.attrs[attribute].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(state.object, attribute)
+
+
+@event.listens_for(Task, 'after_insert')
+def _task_inserted(mapper, connection, target):
+    _apply_counter_delta(connection, target.task_list_id, 1, int(bool(target.completed)))
+
+
+@event.listens_for(Task, 'after_delete')
+def _task_deleted(mapper, connection, target):
+    state = inspect(target)
+    completed = bool(_previous_value(state, 'completed'))
+    _apply_counter_delta(connection, _previous_value(state, 'task_list_id'), -1, -int(completed))
+
+
+@event.listens_for(Task, 'after_update')
+def _task_updated(mapper, connection, target):
+    state = inspect(target)
+    old_list_id = _previous_value(state, 'task_list_id')
+    old_completed = int(bool(_previous_value(state, 'completed')))
+    new_completed = int(bool(target.completed))
+    
+    if old_list_id == target.task_list_id:
+        _apply_counter_delta(connection, target.task_list_id, 0, new_completed - old_completed)
+    else:
+        _apply_counter_delta(connection, old_list_id, -1, -old_completed)
+        _apply_counter_delta(connection, target.task_list_id, 1, new_completed)
@@ -1,6 +1,12 @@
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import func, select
+from sqlalchemy.orm import column_property, deferred
+from sqlalchemy.orm.attributes import set_committed_value
 from app import db
+from .music import Music
+from .playlist import Playlist
+from app.services.password_hasher import password_hasher
+from app.services.last_login import last_login_recorder
 
 
 class User(db.Model):
@@ -25,26 +31,110 @@ class User(db.Model):
     music_uploads = db.relationship('Music', backref='uploader', lazy=True, 
                                    foreign_keys='Music.uploaded_by_id')
     
+    # Contagens para serializar um único usuário: os dois COUNT vêm juntos,
+    # em uma query, no primeiro acesso (listagens usam User.counts)
+    playlists_count = column_property(
+        select(func.count(Playlist.id)).where(Playlist.owner_id == id).scalar_subquery(),
+        deferred=True, group='counts'
+    )
+    uploads_count = column_property(
+        select(func.count(Music.id)).where(Music.uploaded_by_id == id).scalar_subquery(),
+        deferred=True, group='counts'
+    )
+    
+    __table_args__ = (
+        # Login por email sem diferenciar maiúsculas: um email por conta
+        db.Index('ix_users_email_lower', func.lower(email), unique=True),
+    )
+    
+    @staticmethod
+    def counts(user_ids):
+        """{id: (playlists, uploads)} dos usuários, em uma query agrupada por relacionamento"""
+        if not user_ids:
+            return {}
+        
+        playlists = dict(db.session.query(Playlist.owner_id, func.count()).filter(
+            Playlist.owner_id.in_(user_ids)
+        ).group_by(Playlist.owner_id).all())
+        uploads = dict(db.session.query(Music.uploaded_by_id, func.count()).filter(
+            Music.uploaded_by_id.in_(user_ids)
+        ).group_by(Music.uploaded_by_id).all())
+        return {user_id: (playlists.get(user_id, 0), uploads.get(user_id, 0)) for user_id in user_ids}
+    
+    @staticmethod
+    def list_to_dict(users):
+        """Serializa uma página de usuários com as contagens de User.counts"""
+        counts = User.counts([user.id for user in users])
+        return [user.to_dict(counts=counts[user.id]) for user in users]
+    
+    @staticmethod
+    def normalize_email(email):
+        """Email como é gravado: sem espaços nas pontas e em minúsculas"""
+        return email.strip().lower()
+    
+    @staticmethod
+    def find_by_email(email):
+        """Busca pelo email sem diferenciar maiúsculas (índice ix_users_email_lower)"""
+        return User.query.filter(func.lower(User.email) == User.normalize_email(email)).first()
+    
+    @staticmethod
+    def find_by_login(login):
+        """Busca pelo email (com @, sem diferenciar maiúsculas) ou pelo username
+        
+        Cada caso consulta uma única coluna indexada, em vez de um OR entre
+        username e email.
+        """
+        login = login.strip()
+        if '@' in login:
+            user = User.find_by_email(login)
+            if user:
+                return user
+        return User.query.filter_by(username=login).first()
+    
     def set_password(self, password):
         """Define a senha do usuário (com hash)"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        """Verifica se a senha está correta"""
-        return check_password_hash(self.password_hash, password)
+        """Verifica se a senha está correta
+        
+        Se o hash gravado usa outro algoritmo ou custo que o configurado,
+        ele é refeito em segundo plano e gravado em lote pelo
+        last_login_recorder (o login não espera o novo hash).
+        """
+        if not password_hasher.verify(password, self.password_hash):
+            return False
+        if password_hasher.needs_rehash(self.password_hash):
+            user_id, old_hash = self.id, self.password_hash
+            password_hasher.rehash_later(
+                user_id, password,
+                lambda new_hash: last_login_recorder.record_rehash(user_id, old_hash, new_hash)
+            )
+        return True
     
     def update_last_login(self):
-        """Atualiza o timestamp do último login"""
-        self.last_login = datetime.utcnow()
-        db.session.commit()
+        """Atualiza o timestamp do último login (gravado em lote pelo last_login_recorder)"""
+        now = datetime.utcnow()
+        last_login_recorder.record(self.id, now)
+        set_committed_value(self, 'last_login', now)
+    
+    @property
+    def current_last_login(self):
+        """Último login, incluindo o ainda não gravado"""
+        return last_login_recorder.pending(self.id) or self.last_login
     
     @property
     def full_name(self):
         """Retorna o nome completo do usuário"""
         return f"{self.first_name} {self.last_name}"
     
-    def to_dict(self, include_sensitive=False):
-        """Converte o usuário para dicionário"""
+    def to_dict(self, include_sensitive=False, include_counts=True, counts=None):
+        """Converte o usuário para dicionário
+        
+        counts: (playlists, uploads) já calculados (User.list_to_dict); sem
+        eles as contagens vêm das column_property.
+        """
+        last_login = self.current_last_login
         data = {
             'id': self.id,
             'username': self.username,
@@ -57,11 +147,14 @@ class User(db.Model):
             'is_admin': self.is_admin,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'last_login': self.last_login.isoformat() if self.last_login else None,
-            'playlists_count': len(self.playlists),
-            'uploads_count': len(self.music_uploads)
+            'last_login': last_login.isoformat() if last_login else None
         }
         
+        if include_counts:
+            data['playlists_count'], data['uploads_count'] = counts or (
+                self.playlists_count, self.uploads_count
+            )
+        
         if include_sensitive:
             data['password_hash'] = self.password_hash
             
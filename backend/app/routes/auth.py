@@ -2,17 +2,17 @@ from datetime import timedelta
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import (
     create_access_token, create_refresh_token, 
-    jwt_required, get_jwt_identity, get_jwt
+    jwt_required, get_jwt
 )
 from email_validator import validate_email, EmailNotValidError
 from app import db
 from app.models.user import User
+from app.services.token_blocklist import token_blocklist
+from app.services.current_user import current_user_loader
+from app.services.password_hasher import is_valid_password
 
 auth_bp = Blueprint('auth', __name__)
 
-# Blacklist para tokens inválidos (em produção, use Redis)
-blacklisted_tokens = set()
-
 
 @auth_bp.route('/register', methods=['POST'])
 def register():
@@ -29,7 +29,7 @@ def register():
         # Validar email
         try:
             validated_email = validate_email(data['email'])
-            email = validated_email.email
+            email = User.normalize_email(validated_email.email)
         except EmailNotValidError:
             return jsonify({'error': 'Email inválido'}), 400
         
@@ -37,10 +37,13 @@ def register():
         if User.query.filter_by(username=data['username']).first():
             return jsonify({'error': 'Nome de usuário já existe'}), 409
         
-        if User.query.filter_by(email=email).first():
+        if User.find_by_email(email):
             return jsonify({'error': 'Email já cadastrado'}), 409
         
         # Validar senha
+        if not is_valid_password(data['password']):
+            return jsonify({'error': 'Senha contém caracteres inválidos'}), 400
+        
         if len(data['password']) < 6:
             return jsonify({'error': 'Senha deve ter pelo menos 6 caracteres'}), 400
         
@@ -59,7 +62,8 @@ def register():
         # Criar tokens
         access_token = create_access_token(
             identity=user.id,
-            expires_delta=timedelta(hours=1)
+            expires_delta=timedelta(hours=1),
+            additional_claims=current_user_loader.claims_for(user)
         )
         refresh_token = create_refresh_token(
             identity=user.id,
@@ -89,9 +93,7 @@ def login():
             return jsonify({'error': 'Login e senha são obrigatórios'}), 400
         
         # Buscar usuário (por username ou email)
-        user = User.query.filter(
-            (User.username == data['login']) | (User.email == data['login'])
-        ).first()
+        user = User.find_by_login(data['login'])
         
         if not user or not user.check_password(data['password']):
             return jsonify({'error': 'Credenciais inválidas'}), 401
@@ -99,22 +101,26 @@ def login():
         if not user.is_active:
             return jsonify({'error': 'Conta desativada'}), 403
         
-        # Atualizar último login
+        # Último login (e hash refeito) gravados em lote, sem commit aqui
         user.update_last_login()
         
         # Criar tokens
         access_token = create_access_token(
             identity=user.id,
-            expires_delta=timedelta(hours=1)
+            expires_delta=timedelta(hours=1),
+            additional_claims=current_user_loader.claims_for(user)
         )
         refresh_token = create_refresh_token(
             identity=user.id,
             expires_delta=timedelta(days=30)
         )
         
+        # Contadores só quando pedidos (?include_counts=true)
+        include_counts = request.args.get('include_counts', 'false').lower() == 'true'
+        
         return jsonify({
             'message': 'Login realizado com sucesso',
-            'user': user.to_dict(),
+            'user': user.to_dict(include_counts=include_counts),
             'access_token': access_token,
             'refresh_token': refresh_token
         })
@@ -128,8 +134,7 @@ def login():
 def refresh():
     """Atualiza o token de acesso"""
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = current_user_loader.user()
         
         if not user or not user.is_active:
             return jsonify({'error': 'Usuário não encontrado ou inativo'}), 404
@@ -137,7 +142,8 @@ def refresh():
         # Criar novo token de acesso
         access_token = create_access_token(
             identity=user.id,
-            expires_delta=timedelta(hours=1)
+            expires_delta=timedelta(hours=1),
+            additional_claims=current_user_loader.claims_for(user)
         )
         
         return jsonify({
@@ -154,8 +160,8 @@ def refresh():
 def logout():
     """Faz logout do usuário"""
     try:
-        jti = get_jwt()['jti']  # JWT ID
-        blacklisted_tokens.add(jti)
+        token = get_jwt()
+        token_blocklist.revoke(token['jti'], token['exp'])
         
         return jsonify({'message': 'Logout realizado com sucesso'})
         
@@ -168,8 +174,7 @@ def logout():
 def get_current_user():
     """Retorna dados do usuário atual"""
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = current_user_loader.user()
         
         if not user:
             return jsonify({'error': 'Usuário não encontrado'}), 404
@@ -186,8 +191,7 @@ def change_password():
     """Altera a senha do usuário"""
     try:
         data = request.get_json()
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = current_user_loader.user()
         
         if not user:
             return jsonify({'error': 'Usuário não encontrado'}), 404
@@ -199,6 +203,9 @@ def change_password():
         if not user.check_password(data['current_password']):
             return jsonify({'error': 'Senha atual incorreta'}), 400
         
+        if not is_valid_password(data['new_password']):
+            return jsonify({'error': 'Nova senha contém caracteres inválidos'}), 400
+        
         if len(data['new_password']) < 6:
             return jsonify({'error': 'Nova senha deve ter pelo menos 6 caracteres'}), 400
         
@@ -211,21 +218,3 @@ def change_password():
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Erro interno do servidor'}), 500
-
-
-# Callback para verificar se token está na blacklist
-@auth_bp.before_app_request
-def check_if_token_revoked():
-    """Verifica se o token foi revogado"""
-    try:
-        # Só verificar se estiver em uma rota que requer autenticação
-        from flask import request as flask_request
-        if flask_request.endpoint and 'auth' in flask_request.endpoint:
-            jti = get_jwt().get('jti')
-            if jti in blacklisted_tokens:
-                return jsonify({'error': 'Token foi revogado'}), 401
-        # Não retornar nada se o token for válido ou não estiver em rota protegida
-        return None
-    except:
-        # Se não conseguir verificar o token, não bloquear a requisição
-        return None 
\ No newline at end of file
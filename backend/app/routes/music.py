@@ -3,16 +3,36 @@ from flask import Blueprint, request, jsonify, current_app, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 from mutagen import File as MutagenFile
+from sqlalchemy.exc import IntegrityError
 from app import db
 from app.models.user import User
 from app.models.music import Music
 from app.services.spotify_service import spotify_service
+from app.services.async_spotify_service import async_spotify_service
+from app.services.play_counter import play_counter
+from app.services.music_search import music_search
+from app.services.fuzzy_search import fuzzy_search, DEFAULT_THRESHOLD, SEARCH_MODES
+from app.services.suggest_index import suggest_index
+from app.services.current_user import current_user_loader
+from app.utils.pagination import InvalidPagination, paginate
 
 music_bp = Blueprint('music', __name__)
 
 # Extensões permitidas para upload
 ALLOWED_EXTENSIONS = {'mp3', 'wav', 'flac', 'aac', 'ogg'}
 
+# Content-Type de cada formato aceito (audio/mp3 não é um tipo registrado)
+AUDIO_MIMETYPES = {
+    'mp3': 'audio/mpeg',
+    'wav': 'audio/wav',
+    'flac': 'audio/flac',
+    'aac': 'audio/aac',
+    'ogg': 'audio/ogg'
+}
+
+# Máximo de ids do Spotify por importação em lote
+MAX_IMPORT_BATCH = 500
+
 
 def allowed_file(filename):
     """Verifica se o arquivo tem extensão permitida"""
@@ -20,6 +40,25 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def music_from_spotify(track_data):
+    """Cria a música (ainda não persistida) a partir dos dados do Spotify"""
+    return Music(
+        title=track_data['title'],
+        artist=track_data['artist'],
+        album=track_data['album'],
+        genre=track_data['genre'],
+        year=track_data['year'],
+        duration=track_data['duration'],
+        track_number=track_data['track_number'],
+        spotify_id=track_data['spotify_id'],
+        external_url=track_data['external_url'],
+        preview_url=track_data['preview_url'],
+        cover_image_url=track_data['cover_image_url'],
+        is_local=False,
+        is_public=True
+    )
+
+
 def extract_metadata(file_path):
     """Extrai metadados de um arquivo de música usando mutagen"""
     try:
@@ -138,21 +177,7 @@ def import_from_spotify():
             return jsonify({'error': 'Música não encontrada no Spotify'}), 404
         
         # Criar entrada no banco
-        music = Music(
-            title=track_data['title'],
-            artist=track_data['artist'],
-            album=track_data['album'],
-            genre=track_data['genre'],
-            year=track_data['year'],
-            duration=track_data['duration'],
-            track_number=track_data['track_number'],
-            spotify_id=track_data['spotify_id'],
-            external_url=track_data['external_url'],
-            preview_url=track_data['preview_url'],
-            cover_image_url=track_data['cover_image_url'],
-            is_local=False,
-            is_public=True
-        )
+        music = music_from_spotify(track_data)
         
         db.session.add(music)
         db.session.commit()
@@ -167,6 +192,78 @@ def import_from_spotify():
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
 
+@music_bp.route('/import/batch', methods=['POST'])
+@jwt_required()
+def import_batch_from_spotify():
+    """Importa várias músicas do Spotify de uma vez
+    
+    As músicas já importadas são encontradas com uma única consulta, as
+    demais são buscadas no Spotify em blocos de 50 (em paralelo) e
+    inseridas em uma única transação. Retorna o status de cada id
+    (unavailable quando o Spotify não respondeu por ele).
+    """
+    try:
+        data = request.get_json() or {}
+        
+        spotify_ids = data.get('spotify_ids')
+        if not isinstance(spotify_ids, list) or not spotify_ids:
+            return jsonify({'error': 'spotify_ids deve ser uma lista não vazia'}), 400
+        if not all(isinstance(spotify_id, str) and spotify_id.strip() for spotify_id in spotify_ids):
+            return jsonify({'error': 'spotify_ids deve conter apenas ids válidos'}), 400
+        
+        # Remover duplicados mantendo a ordem
+        spotify_ids = list(dict.fromkeys(spotify_id.strip() for spotify_id in spotify_ids))
+        if len(spotify_ids) > MAX_IMPORT_BATCH:
+            return jsonify({'error': f'Máximo de {MAX_IMPORT_BATCH} músicas por importação'}), 400
+        
+        existing = dict(
+            db.session.query(Music.spotify_id, Music.id)
+            .filter(Music.spotify_id.in_(spotify_ids))
+            .all()
+        )
+        
+        missing = [spotify_id for spotify_id in spotify_ids if spotify_id not in existing]
+        tracks = async_spotify_service.get_tracks(missing) if missing else {}
+        
+        new_music = {
+            spotify_id: music_from_spotify(tracks[spotify_id])
+            for spotify_id in missing if tracks.get(spotify_id)
+        }
+        unavailable = [spotify_id for spotify_id in missing
+                       if spotify_id in tracks and tracks[spotify_id] is None]
+        if new_music:
+            db.session.add_all(new_music.values())
+            db.session.commit()
+        
+        results = []
+        for spotify_id in spotify_ids:
+            if spotify_id in existing:
+                results.append({'spotify_id': spotify_id, 'status': 'already_exists', 'music_id': existing[spotify_id]})
+            elif spotify_id in new_music:
+                results.append({'spotify_id': spotify_id, 'status': 'imported', 'music_id': new_music[spotify_id].id})
+            elif spotify_id in unavailable:
+                results.append({'spotify_id': spotify_id, 'status': 'unavailable', 'music_id': None})
+            else:
+                results.append({'spotify_id': spotify_id, 'status': 'not_found', 'music_id': None})
+        
+        return jsonify({
+            'message': f'{len(new_music)} música(s) importada(s)',
+            'imported': len(new_music),
+            'already_exists': len(existing),
+            'not_found': len(spotify_ids) - len(existing) - len(new_music) - len(unavailable),
+            'unavailable': len(unavailable),
+            'results': results
+        }), 201 if new_music else 503 if unavailable else 200
+        
+    except IntegrityError:
+        # Outra requisição importou alguma das músicas ao mesmo tempo
+        db.session.rollback()
+        return jsonify({'error': 'Importação concorrente das mesmas músicas, tente novamente'}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+
 @music_bp.route('/upload', methods=['POST'])
 @jwt_required()
 def upload_music():
@@ -238,36 +335,53 @@ def upload_music():
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
 
+@music_bp.route('/suggest', methods=['GET'])
+@jwt_required()
+def suggest_music():
+    """Sugestões de títulos, artistas e álbuns para autocompletar"""
+    try:
+        current_user_id = get_jwt_identity()
+        q = request.args.get('q', '')
+        limit = request.args.get('limit', 10, type=int)
+        
+        suggest_index.ensure_built()
+        
+        return jsonify({
+            'query': q,
+            'suggestions': suggest_index.suggest(q, current_user_id, limit)
+        })
+        
+    except Exception as e:
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+
 @music_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_music_list():
     """Lista músicas com filtros e paginação"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
         
         # Parâmetros de consulta
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 20, type=int), 100)
         search = request.args.get('search', '')
+        mode = request.args.get('mode', 'text')
+        similarity = request.args.get('similarity', DEFAULT_THRESHOLD, type=float)
         genre = request.args.get('genre', '')
         year = request.args.get('year', type=int)
         is_local = request.args.get('is_local', type=bool)
         uploader_id = request.args.get('uploader_id', type=int)
         
+        if mode not in SEARCH_MODES:
+            return jsonify({'error': f"mode deve ser um de: {', '.join(SEARCH_MODES)}"}), 400
+        if not 0 < similarity <= 1:
+            return jsonify({'error': 'similarity deve estar entre 0 e 1'}), 400
+        
         # Query base - músicas públicas ou do usuário atual
         query = Music.query.filter(
             (Music.is_public == True) | (Music.uploaded_by_id == current_user_id)
         )
         
         # Filtros
-        if search:
-            query = query.filter(
-                (Music.title.ilike(f'%{search}%')) |
-                (Music.artist.ilike(f'%{search}%')) |
-                (Music.album.ilike(f'%{search}%'))
-            )
-        
         if genre:
             query = query.filter(Music.genre.ilike(f'%{genre}%'))
         
@@ -280,21 +394,25 @@ def get_music_list():
         if uploader_id:
             query = query.filter(Music.uploaded_by_id == uploader_id)
         
-        # Paginação
-        music_list = query.order_by(Music.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
+        # Busca por último: a aproximada escolhe os candidatos já com os
+        # filtros acima (com busca, os mais relevantes vêm primeiro)
+        order_by = []
+        if search and mode == 'fuzzy':
+            query, relevance = fuzzy_search.search(query, 'music', search, similarity)
+            order_by.append(relevance)
+        elif search:
+            query, relevance = music_search.search(query, search)
+            order_by.append(relevance)
+        
+        # Paginação (por página ou por cursor)
+        rows, meta = paginate(
+            Music.with_uploader(query), (Music.created_at, Music.id), request.args, order_by
         )
         
-        return jsonify({
-            'music': [music.to_dict() for music in music_list.items],
-            'total': music_list.total,
-            'pages': music_list.pages,
-            'current_page': page,
-            'per_page': per_page,
-            'has_next': music_list.has_next,
-            'has_prev': music_list.has_prev
-        })
+        return jsonify({'music': Music.list_to_dict(rows), **meta})
         
+    except InvalidPagination as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
@@ -326,7 +444,7 @@ def update_music(music_id):
     """Atualiza informações de uma música"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = current_user_loader.principal()
         
         music = Music.query.get(music_id)
         if not music:
@@ -378,7 +496,7 @@ def delete_music(music_id):
     """Deleta uma música"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = current_user_loader.principal()
         
         music = Music.query.get(music_id)
         if not music:
@@ -428,15 +546,38 @@ def stream_music(music_id):
         if not os.path.exists(music.file_path):
             return jsonify({'error': 'Arquivo não encontrado'}), 404
         
-        # Incrementar contador de reproduções
-        music.increment_play_count()
-        
-        # Enviar arquivo
-        return send_file(
+        # Enviar arquivo com suporte a Range (206), ETag e Last-Modified. O
+        # corpo sai pelo wsgi.file_wrapper do servidor (sendfile no gunicorn)
+        updated_at = music.updated_at or music.created_at
+        response = send_file(
             music.file_path,
             as_attachment=False,
-            mimetype=f'audio/{music.file_format}'
+            mimetype=AUDIO_MIMETYPES.get(music.file_format, f'audio/{music.file_format}'),
+            conditional=True,
+            etag=f'{music.id}-{music.file_size}-{int(updated_at.timestamp())}',
+            last_modified=updated_at
         )
+        response.headers['Accept-Ranges'] = 'bytes'
+        response.headers['Cache-Control'] = 'private, max-age=3600'
+        
+        # Contar a reprodução só quando o áudio é enviado desde o início (GET
+        # com 200 ou 206 a partir do byte 0): HEAD, 304 e buscas (seek) não
+        # contam. Com playback_id, conta uma vez por sessão de reprodução;
+        # sem ele, uma vez por usuário e música a cada replay_window segundos
+        # (players pedem o início de novo). Deduplicado por processo: ver
+        # PlayCounter.record_once
+        if request.method == 'GET' and (
+            response.status_code == 200 or
+            (response.status_code == 206 and response.content_range and response.content_range.start == 0)
+        ):
+            playback_id = request.args.get('playback_id')
+            if playback_id:
+                play_counter.record_once('music', music.id, (current_user_id, playback_id))
+            else:
+                play_counter.record_once('music', music.id, (current_user_id, None),
+                                         ttl=play_counter.replay_window)
+        
+        return response
         
     except Exception as e:
         return jsonify({'error': 'Erro interno do servidor'}), 500
@@ -461,7 +602,7 @@ def increment_play_count(music_id):
         
         return jsonify({
             'message': 'Reprodução registrada',
-            'play_count': music.play_count
+            'play_count': music.current_play_count
         })
         
     except Exception as e:
@@ -3,10 +3,26 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models.user import User
 from app.models.music import Music
+from app.services.current_user import current_user_loader
 from app.models.playlist import Playlist
+from app.services.fuzzy_search import fuzzy_search, DEFAULT_THRESHOLD, SEARCH_MODES
+from app.utils.pagination import InvalidPagination, paginate
 
 playlists_bp = Blueprint('playlists', __name__)
 
+# Limite de músicas por requisição nas operações em lote
+MAX_BULK_TRACKS = 1000
+
+
+def is_id(value):
+    """Se o valor do JSON é um inteiro (True/False não contam)"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def is_id_list(value):
+    """Se o valor do JSON é uma lista não vazia de inteiros"""
+    return isinstance(value, list) and bool(value) and all(is_id(item) for item in value)
+
 
 @playlists_bp.route('/', methods=['GET'])
 @jwt_required()
@@ -16,45 +32,53 @@ def get_playlists():
         current_user_id = get_jwt_identity()
         
         # Parâmetros de consulta
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 20, type=int), 100)
         search = request.args.get('search', '')
+        mode = request.args.get('mode', 'text')
+        similarity = request.args.get('similarity', DEFAULT_THRESHOLD, type=float)
         owner_id = request.args.get('owner_id', type=int)
         is_public = request.args.get('is_public', type=bool)
         
+        if mode not in SEARCH_MODES:
+            return jsonify({'error': f"mode deve ser um de: {', '.join(SEARCH_MODES)}"}), 400
+        if not 0 < similarity <= 1:
+            return jsonify({'error': 'similarity deve estar entre 0 e 1'}), 400
+        
         # Query base - playlists públicas ou do usuário atual
         query = Playlist.query.filter(
             (Playlist.is_public == True) | (Playlist.owner_id == current_user_id)
         )
         
         # Filtros
-        if search:
-            query = query.filter(
-                (Playlist.name.ilike(f'%{search}%')) |
-                (Playlist.description.ilike(f'%{search}%'))
-            )
-        
         if owner_id:
             query = query.filter(Playlist.owner_id == owner_id)
         
         if is_public is not None:
             query = query.filter(Playlist.is_public == is_public)
         
-        # Paginação
-        playlists = query.order_by(Playlist.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
+        # Busca por último: a aproximada escolhe os candidatos já com os
+        # filtros acima (os mais parecidos vêm primeiro)
+        order_by = []
+        if search and mode == 'fuzzy':
+            query, relevance = fuzzy_search.search(query, 'playlists', search, similarity)
+            order_by.append(relevance)
+        elif search:
+            query = query.filter(
+                (Playlist.name.ilike(f'%{search}%')) |
+                (Playlist.description.ilike(f'%{search}%'))
+            )
+        
+        # Paginação (por página ou por cursor)
+        playlists, meta = paginate(
+            query, (Playlist.created_at, Playlist.id), request.args, order_by
         )
         
         return jsonify({
-            'playlists': [playlist.to_dict() for playlist in playlists.items],
-            'total': playlists.total,
-            'pages': playlists.pages,
-            'current_page': page,
-            'per_page': per_page,
-            'has_next': playlists.has_next,
-            'has_prev': playlists.has_prev
+            'playlists': [playlist.to_dict() for playlist in playlists],
+            **meta
         })
         
+    except InvalidPagination as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
@@ -125,7 +149,7 @@ def update_playlist(playlist_id):
     """Atualiza uma playlist"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = current_user_loader.principal()
         
         playlist = Playlist.query.get(playlist_id)
         if not playlist:
@@ -174,7 +198,7 @@ def delete_playlist(playlist_id):
     """Deleta uma playlist"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = current_user_loader.principal()
         
         playlist = Playlist.query.get(playlist_id)
         if not playlist:
@@ -213,15 +237,14 @@ def get_playlist_tracks(playlist_id):
         page = request.args.get('page', 1, type=int)
         per_page = min(request.args.get('per_page', 50, type=int), 100)
         
-        # Simular paginação das músicas
-        tracks = [music.to_dict() for music in playlist.music_tracks]
-        start = (page - 1) * per_page
-        end = start + per_page
-        paginated_tracks = tracks[start:end]
+        # Paginação no banco (índice em playlist_id, position)
+        tracks = playlist.tracks_query().paginate(
+            page=page, per_page=per_page, error_out=False
+        )
         
         return jsonify({
-            'tracks': paginated_tracks,
-            'total': len(tracks),
+            'tracks': Music.list_to_dict(tracks.items),
+            'total': tracks.total,
             'current_page': page,
             'per_page': per_page,
             'playlist': playlist.to_dict()
@@ -314,6 +337,86 @@ def remove_track_from_playlist(playlist_id, music_id):
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
 
+@playlists_bp.route('/<int:playlist_id>/tracks/bulk', methods=['POST'])
+@jwt_required()
+def add_tracks_to_playlist(playlist_id):
+    """Adiciona várias músicas à playlist em uma única operação"""
+    try:
+        current_user_id = get_jwt_identity()
+        data = request.get_json()
+        
+        playlist = Playlist.query.get(playlist_id)
+        if not playlist:
+            return jsonify({'error': 'Playlist não encontrada'}), 404
+        
+        # Verificar permissões (dono ou colaborativo)
+        if (playlist.owner_id != current_user_id and 
+            not playlist.is_collaborative):
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        music_ids = data.get('music_ids')
+        if not is_id_list(music_ids):
+            return jsonify({'error': 'music_ids deve ser uma lista de ids'}), 400
+        
+        if len(music_ids) > MAX_BULK_TRACKS:
+            return jsonify({'error': f'Máximo de {MAX_BULK_TRACKS} músicas por operação'}), 400
+        
+        position = data.get('position')
+        if position is not None and not is_id(position):
+            return jsonify({'error': 'position deve ser um número inteiro'}), 400
+        
+        result = playlist.add_music_bulk(music_ids, current_user_id, position)
+        
+        return jsonify({
+            'message': f"{len(result['added'])} música(s) adicionada(s) à playlist",
+            **result,
+            'playlist': playlist.to_dict()
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+
+@playlists_bp.route('/<int:playlist_id>/tracks/bulk', methods=['DELETE'])
+@jwt_required()
+def remove_tracks_from_playlist(playlist_id):
+    """Remove várias músicas da playlist em uma única operação"""
+    try:
+        current_user_id = get_jwt_identity()
+        data = request.get_json()
+        
+        playlist = Playlist.query.get(playlist_id)
+        if not playlist:
+            return jsonify({'error': 'Playlist não encontrada'}), 404
+        
+        # Verificar permissões (dono ou colaborativo)
+        if (playlist.owner_id != current_user_id and 
+            not playlist.is_collaborative):
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        music_ids = data.get('music_ids')
+        if not is_id_list(music_ids):
+            return jsonify({'error': 'music_ids deve ser uma lista de ids'}), 400
+        
+        if len(music_ids) > MAX_BULK_TRACKS:
+            return jsonify({'error': f'Máximo de {MAX_BULK_TRACKS} músicas por operação'}), 400
+        
+        removed = playlist.remove_music_bulk(music_ids)
+        removed_ids = set(removed)
+        
+        return jsonify({
+            'message': f'{len(removed)} música(s) removida(s) da playlist',
+            'removed': removed,
+            'not_in_playlist': [music_id for music_id in music_ids if music_id not in removed_ids],
+            'playlist': playlist.to_dict()
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+
 @playlists_bp.route('/<int:playlist_id>/tracks/reorder', methods=['POST'])
 @jwt_required()
 def reorder_playlist_tracks(playlist_id):
@@ -331,6 +434,20 @@ def reorder_playlist_tracks(playlist_id):
             not playlist.is_collaborative):
             return jsonify({'error': 'Acesso negado'}), 403
         
+        # Reordenação em lote: lista de music_ids na nova ordem
+        order = data.get('order')
+        if order is not None:
+            if not is_id_list(order):
+                return jsonify({'error': 'order deve ser uma lista de music_id'}), 400
+            
+            if not playlist.reorder_tracks(order):
+                return jsonify({'error': 'order contém músicas repetidas ou fora da playlist'}), 400
+            
+            return jsonify({
+                'message': 'Músicas reordenadas com sucesso',
+                'playlist': playlist.to_dict()
+            })
+        
         music_id = data.get('music_id')
         new_position = data.get('new_position')
         
@@ -338,7 +455,8 @@ def reorder_playlist_tracks(playlist_id):
             return jsonify({'error': 'music_id e new_position são obrigatórios'}), 400
         
         # Reordenar música
-        playlist.reorder_music(music_id, new_position)
+        if not playlist.reorder_music(music_id, new_position):
+            return jsonify({'error': 'Música não está na playlist'}), 404
         
         return jsonify({
             'message': 'Música reordenada com sucesso',
@@ -369,7 +487,7 @@ def increment_playlist_play_count(playlist_id):
         
         return jsonify({
             'message': 'Reprodução de playlist registrada',
-            'play_count': playlist.play_count
+            'play_count': playlist.current_play_count
         })
         
     except Exception as e:
@@ -406,11 +524,8 @@ def duplicate_playlist(playlist_id):
         db.session.add(new_playlist)
         db.session.flush()  # Para obter o ID
         
-        # Copiar músicas
-        for music in original_playlist.music_tracks:
-            # Verificar se usuário tem acesso à música
-            if music.is_public or music.uploaded_by_id == current_user_id:
-                new_playlist.add_music(music)
+        # Copiar músicas acessíveis ao usuário
+        new_playlist.copy_tracks_from(original_playlist, current_user_id)
         
         db.session.commit()
         
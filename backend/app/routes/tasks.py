@@ -1,12 +1,30 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from datetime import datetime
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_, case, func
+from sqlalchemy.orm import joinedload
 from app import db
 from app.models.task import Task
 from app.models.task_list import TaskList
+from app.utils.pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_filter
 
 tasks_bp = Blueprint('tasks', __name__)
 
+# Tamanho de página da listagem de tarefas
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def task_sort_key():
+    """Colunas (todas ascendentes) que definem a ordem da listagem de tarefas"""
+    priority_rank = {'urgent': 0, 'high': 1, 'medium': 2, 'low': 3}
+    return (
+        case((Task.completed == True, 1), else_=0).label('sort_completed'),
+        case(priority_rank, value=Task.priority, else_=len(priority_rank)).label('sort_priority'),
+        func.coalesce(Task.due_date, datetime.max).label('sort_due_date'),
+        Task.id.label('sort_id')
+    )
+
 
 @tasks_bp.route('/', methods=['GET'])
 @jwt_required()
@@ -21,6 +39,8 @@ def get_tasks():
         priority = request.args.get('priority')
         search = request.args.get('search', '').strip()
         overdue_only = request.args.get('overdue_only', 'false').lower() == 'true'
+        limit = max(1, min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+        cursor = request.args.get('cursor')
         
         # Query base
         query = Task.query.filter_by(user_id=current_user_id)
@@ -42,23 +62,35 @@ def get_tasks():
                 Task.description.ilike(f'%{search}%')
             )
         
-        # Executar query
-        tasks = query.all()
-        
-        # Filtrar vencidas (não pode ser feito direto no SQL facilmente)
         if overdue_only:
-            tasks = [task for task in tasks if task.is_overdue()]
+            query = query.filter(
+                Task.due_date < datetime.utcnow(),
+                or_(Task.completed == False, Task.completed.is_(None))
+            )
         
-        # Ordenar
-        tasks.sort(key=lambda t: (
-            t.completed,  # Não concluídas primeiro
-            -{'urgent': 4, 'high': 3, 'medium': 2, 'low': 1}.get(t.priority, 0),  # Por prioridade
-            t.due_date or datetime.max  # Por data de vencimento
-        ))
+        total = query.order_by(None).count()
+        
+        # Ordenação: não concluídas primeiro, por prioridade e por vencimento
+        sort_key = task_sort_key()
+        if cursor:
+            try:
+                query = query.filter(keyset_filter(sort_key, decode_cursor(cursor, len(sort_key))))
+            except InvalidCursor:
+                return jsonify({'error': 'Cursor inválido'}), 400
+        
+        rows = query.options(joinedload(Task.task_list)).add_columns(*sort_key) \
+            .order_by(*sort_key).limit(limit + 1).all()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][1:]) if has_more else None
         
         return jsonify({
-            'tasks': [task.to_dict() for task in tasks],
-            'total': len(tasks)
+            'tasks': [row[0].to_dict() for row in rows],
+            'total': total,
+            'limit': limit,
+            'has_more': has_more,
+            'next_cursor': next_cursor
         })
         
     except Exception as e:
@@ -291,34 +323,40 @@ def get_dashboard_stats():
     try:
         current_user_id = get_jwt_identity()
         
-        # Tarefas do usuário
-        all_tasks = Task.query.filter_by(user_id=current_user_id).all()
+        now = datetime.utcnow()
+        week_ago = now - timedelta(days=7)
+        next_week = now + timedelta(days=7)
+        
+        # Condições reutilizadas nas agregações
+        is_completed = Task.completed == True
+        is_pending = or_(Task.completed == False, Task.completed.is_(None))
+        
+        def count_if(*conditions):
+            return func.coalesce(func.sum(case((and_(*conditions), 1), else_=0)), 0)
         
-        # Estatísticas gerais
-        total_tasks = len(all_tasks)
-        completed_tasks = len([t for t in all_tasks if t.completed])
+        priorities = [p['value'] for p in Task.get_priorities()]
+        
+        # Estatísticas calculadas em uma única query agregada
+        row = db.session.query(
+            func.count(Task.id),
+            count_if(is_completed),
+            count_if(is_pending, Task.due_date.isnot(None), Task.due_date < now),
+            count_if(Task.created_at >= week_ago),
+            count_if(is_pending, Task.due_date.isnot(None), Task.due_date <= next_week),
+            *[count_if(is_pending, Task.priority == priority) for priority in priorities]
+        ).filter(Task.user_id == current_user_id).one()
+        
+        total_tasks, completed_tasks, overdue_tasks, recent_tasks_count, upcoming_tasks_count = row[:5]
         pending_tasks = total_tasks - completed_tasks
-        overdue_tasks = len([t for t in all_tasks if t.is_overdue()])
-        
-        # Tarefas por prioridade
-        priority_stats = {}
-        for priority_info in Task.get_priorities():
-            priority = priority_info['value']
-            priority_tasks = [t for t in all_tasks if t.priority == priority and not t.completed]
-            priority_stats[priority] = len(priority_tasks)
-        
-        # Tarefas recentes (últimos 7 dias)
-        from datetime import timedelta
-        week_ago = datetime.utcnow() - timedelta(days=7)
-        recent_tasks = [t for t in all_tasks if t.created_at >= week_ago]
-        
-        # Próximas tarefas (próximos 7 dias)
-        next_week = datetime.utcnow() + timedelta(days=7)
-        upcoming_tasks = [
-            t for t in all_tasks 
-            if t.due_date and not t.completed and t.due_date <= next_week
-        ]
-        upcoming_tasks.sort(key=lambda t: t.due_date)
+        priority_stats = dict(zip(priorities, row[5:]))
+        
+        # Próximas 5 tarefas (com a lista carregada no mesmo SELECT)
+        upcoming_tasks = Task.query.options(joinedload(Task.task_list)).filter(
+            Task.user_id == current_user_id,
+            is_pending,
+            Task.due_date.isnot(None),
+            Task.due_date <= next_week
+        ).order_by(Task.due_date.asc(), Task.id.asc()).limit(5).all()
         
         return jsonify({
             'stats': {
@@ -328,10 +366,10 @@ def get_dashboard_stats():
                 'overdue_tasks': overdue_tasks,
                 'completion_rate': round((completed_tasks / total_tasks * 100) if total_tasks > 0 else 0, 2),
                 'priority_breakdown': priority_stats,
-                'recent_tasks_count': len(recent_tasks),
-                'upcoming_tasks_count': len(upcoming_tasks)
+                'recent_tasks_count': recent_tasks_count,
+                'upcoming_tasks_count': upcoming_tasks_count
             },
-            'upcoming_tasks': [task.to_dict() for task in upcoming_tasks[:5]]  # Próximas 5
+            'upcoming_tasks': [task.to_dict() for task in upcoming_tasks]
         })
         
     except Exception as e:
@@ -3,6 +3,9 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from email_validator import validate_email, EmailNotValidError
 from app import db
 from app.models.user import User
+from app.models.music import Music
+from app.services.current_user import current_user_loader
+from app.utils.pagination import InvalidPagination, paginate
 
 users_bp = Blueprint('users', __name__)
 
@@ -13,14 +16,12 @@ def get_users():
     """Lista todos os usuários (apenas admins)"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = current_user_loader.principal()
         
         if not current_user or not current_user.is_admin:
             return jsonify({'error': 'Acesso negado'}), 403
         
         # Parâmetros de consulta
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 10, type=int), 100)
         search = request.args.get('search', '')
         
         # Query base
@@ -35,21 +36,18 @@ def get_users():
                 (User.last_name.ilike(f'%{search}%'))
             )
         
-        # Paginação
-        users = query.order_by(User.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
+        # Paginação (por página ou por cursor)
+        users, meta = paginate(
+            query, (User.created_at, User.id), request.args, default_per_page=10
         )
         
         return jsonify({
-            'users': [user.to_dict() for user in users.items],
-            'total': users.total,
-            'pages': users.pages,
-            'current_page': page,
-            'per_page': per_page,
-            'has_next': users.has_next,
-            'has_prev': users.has_prev
+            'users': User.list_to_dict(users),
+            **meta
         })
         
+    except InvalidPagination as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
@@ -60,7 +58,7 @@ def get_user(user_id):
     """Obtém um usuário específico"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = current_user_loader.principal()
         
         if not current_user:
             return jsonify({'error': 'Usuário não encontrado'}), 404
@@ -85,7 +83,7 @@ def update_user(user_id):
     """Atualiza um usuário"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = current_user_loader.principal()
         
         if not current_user:
             return jsonify({'error': 'Usuário não encontrado'}), 404
@@ -111,10 +109,10 @@ def update_user(user_id):
             # Validar email
             try:
                 validated_email = validate_email(data['email'])
-                email = validated_email.email
+                email = User.normalize_email(validated_email.email)
                 
                 # Verificar se email já existe (exceto o atual)
-                existing_user = User.query.filter_by(email=email).first()
+                existing_user = User.find_by_email(email)
                 if existing_user and existing_user.id != user.id:
                     return jsonify({'error': 'Email já cadastrado'}), 409
                 
@@ -151,7 +149,7 @@ def delete_user(user_id):
     """Deleta um usuário"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = current_user_loader.principal()
         
         if not current_user:
             return jsonify({'error': 'Usuário não encontrado'}), 404
@@ -187,7 +185,7 @@ def get_user_playlists(user_id):
     """Obtém playlists de um usuário"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = current_user_loader.principal()
         
         if not current_user:
             return jsonify({'error': 'Usuário não encontrado'}), 404
@@ -231,7 +229,7 @@ def get_user_uploads(user_id):
     """Obtém músicas enviadas por um usuário"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = current_user_loader.principal()
         
         if not current_user:
             return jsonify({'error': 'Usuário não encontrado'}), 404
@@ -245,21 +243,18 @@ def get_user_uploads(user_id):
         per_page = min(request.args.get('per_page', 10, type=int), 100)
         
         # Filtrar uploads públicos ou do próprio usuário
-        query = user.music_uploads
+        query = Music.query.filter(Music.uploaded_by_id == user_id)
         if current_user_id != user_id:
-            query = [m for m in user.music_uploads if m.is_public]
+            query = query.filter(Music.is_public == True)
         
-        # Converter para dicionário
-        uploads = [music.to_dict() for music in query]
-        
-        # Simular paginação
-        start = (page - 1) * per_page
-        end = start + per_page
-        paginated_uploads = uploads[start:end]
+        # Paginação
+        uploads = Music.with_uploader(query).order_by(Music.created_at.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
         
         return jsonify({
-            'uploads': paginated_uploads,
-            'total': len(uploads),
+            'uploads': Music.list_to_dict(uploads.items),
+            'total': uploads.total,
             'current_page': page,
             'per_page': per_page,
             'user': user.to_dict()
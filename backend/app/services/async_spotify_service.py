@@ -0,0 +1,286 @@
+import os
+import time
+import atexit
+import asyncio
+import threading
+import concurrent.futures
+import httpx
+from app.services.spotify_service import SpotifyService, spotify_service
+
+
+class AsyncSpotifyService(SpotifyService):
+    """Variante assíncrona (httpx + asyncio) do serviço do Spotify
+
+    Usada quando uma requisição precisa de várias chamadas ao Spotify: as
+    chamadas são feitas em paralelo, limitadas por max_concurrency, em vez
+    de uma após a outra. Reaproveita a formatação e as regras de
+    retentativa do serviço síncrono; com sync_service, também o cache, o
+    token de acesso e o disjuntor dele, de modo que os dois caminhos pedem
+    um único token e veem o Spotify fora do ar ao mesmo tempo.
+
+    As views do Flask são síncronas, então os métodos sem sufixo _async
+    são uma fachada: executam a corrotina em um event loop próprio, que
+    roda em uma thread de fundo e mantém o pool de conexões entre as
+    requisições, e esperam no máximo run_timeout segundos por ela.
+    """
+
+    def __init__(self, cache=None, sync_service=None):
+        super().__init__(cache or (sync_service.cache if sync_service else None))
+        if sync_service is not None:
+            self.circuit_breaker = sync_service.circuit_breaker
+        # Serviço que obtém e guarda o token (o síncrono, se compartilhado)
+        self._token_service = sync_service or self
+        self.max_concurrency = int(os.environ.get('SPOTIFY_MAX_CONCURRENCY', 10))
+        self.run_timeout = float(os.environ.get('SPOTIFY_ASYNC_TIMEOUT', 30))
+        self._loop = None
+        self._loop_thread = None
+        self._loop_lock = threading.Lock()
+        self._client = None
+        self._registered = False
+
+    # Event loop de fundo
+
+    def run(self, coroutine, timeout=None):
+        """Executa a corrotina no event loop do serviço e aguarda o resultado
+
+        Passados timeout segundos (run_timeout por padrão) a corrotina é
+        cancelada e TimeoutError é lançado, em vez de prender a thread da
+        requisição a um event loop travado.
+        """
+        future = asyncio.run_coroutine_threadsafe(coroutine, self._ensure_loop())
+        try:
+            return future.result(timeout=timeout or self.run_timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError('Chamadas ao Spotify não terminaram no prazo')
+
+    def _ensure_loop(self):
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(
+                    target=self._loop.run_forever, name='spotify-async', daemon=True
+                )
+                self._loop_thread.start()
+                if not self._registered:
+                    atexit.register(self.close)
+                    self._registered = True
+            return self._loop
+
+    def close(self):
+        """Fecha as conexões e para o event loop"""
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), loop).result(timeout=5)
+            self._client = None
+        loop.call_soon_threadsafe(loop.stop)
+        self._loop_thread.join(timeout=5)
+        loop.close()
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.pool_size,
+                                    max_keepalive_connections=self.pool_size)
+            )
+        return self._client
+
+    async def gather_limited(self, coroutines, limit=None):
+        """asyncio.gather com no máximo limit corrotinas em andamento"""
+        semaphore = asyncio.Semaphore(limit or self.max_concurrency)
+
+        async def limited(coroutine):
+            async with semaphore:
+                return await coroutine
+
+        return await asyncio.gather(*(limited(coroutine) for coroutine in coroutines))
+
+    async def _off_loop(self, function, *args):
+        """Executa uma chamada bloqueante fora do event loop"""
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    async def _cache_get(self, endpoint, params=None):
+        if self.cache.backend.blocking:
+            return await self._off_loop(self.cache.get, endpoint, params)
+        return self.cache.get(endpoint, params)
+
+    async def _cache_set(self, endpoint, data, params=None):
+        if self.cache.backend.blocking:
+            return await self._off_loop(self.cache.set, endpoint, data, params)
+        return self.cache.set(endpoint, data, params)
+
+    # Requisições
+
+    async def _send_async(self, method, url, **kwargs):
+        """Equivalente assíncrono de _send (timeouts, retentativas e disjuntor)"""
+        if not self.circuit_breaker.allow():
+            print("⚠️  Spotify indisponível, requisição ignorada (circuito aberto)")
+            return None
+
+        deadline = time.monotonic() + self.deadline
+        error = None
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            timeout = httpx.Timeout(min(self.read_timeout, remaining),
+                                    connect=min(self.connect_timeout, remaining))
+            try:
+                response = await self._get_client().request(method, url, timeout=timeout, **kwargs)
+            except httpx.HTTPError as e:
+                error, delay = str(e) or type(e).__name__, self._backoff(attempt)
+            else:
+                retry = self._retry_delay(response, attempt)
+                if retry is None:
+                    self.circuit_breaker.record_success()
+                    return response
+                error, delay = retry
+                if delay is None:
+                    break
+
+            if attempt < self.max_retries:
+                if time.monotonic() + delay >= deadline:
+                    error = f'{error} (prazo de {self.deadline:g}s esgotado)'
+                    break
+                await asyncio.sleep(delay)
+
+        self.circuit_breaker.record_failure()
+        print(f"❌ Spotify indisponível após {attempt + 1} tentativa(s): {error}")
+        return None
+
+    async def _get_access_token_async(self):
+        """Token do serviço dono do token, renovado fora do event loop
+
+        A renovação é a do serviço síncrono (uma por vez para todas as
+        threads), feita em uma thread do executor.
+        """
+        service = self._token_service
+        if service._token_is_valid():
+            return service.access_token
+        return await self._off_loop(service._get_access_token)
+
+    async def _make_request_async(self, endpoint, params=None):
+        """Equivalente assíncrono de _make_request, com o mesmo cache"""
+        cached = await self._cache_get(endpoint, params)
+        if cached is not None:
+            return cached
+
+        token = await self._get_access_token_async()
+        if not token:
+            return None
+
+        headers = {
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/json'
+        }
+
+        try:
+            url = f"{self.base_url}/{endpoint}"
+            response = await self._send_async('GET', url, headers=headers, params=params)
+            if response is None:
+                return None
+
+            if response.status_code == 200:
+                data = response.json()
+                await self._cache_set(endpoint, data, params)
+                return data
+            print(f"❌ Erro na requisição Spotify: {response.status_code}")
+            return None
+
+        except Exception as e:
+            print(f"❌ Erro na requisição Spotify: {str(e)}")
+            return None
+
+    async def get_track_async(self, track_id):
+        data = await self._make_request_async(f'tracks/{track_id}')
+        return self._format_track_data(data) if data else None
+
+    async def search_tracks_async(self, query, limit=20, offset=0):
+        if not query:
+            return []
+
+        params = {
+            'q': query,
+            'type': 'track',
+            'limit': min(limit, 50),
+            'offset': offset,
+            'market': 'BR'
+        }
+
+        data = await self._make_request_async('search', params)
+        if not data or 'tracks' not in data:
+            return []
+
+        tracks = [self._format_track_data(track) for track in data['tracks']['items']]
+        return [track for track in tracks if track]
+
+    async def get_tracks_async(self, track_ids):
+        """get_tracks com os blocos de 50 ids buscados em paralelo"""
+        tracks = {}
+        chunks = self._track_chunks(track_ids)
+        if self.cache.backend.blocking:
+            pending = await self._off_loop(
+                lambda: [self._tracks_from_cache(chunk, tracks) for chunk in chunks]
+            )
+        else:
+            pending = [self._tracks_from_cache(chunk, tracks) for chunk in chunks]
+        pending = [missing for missing in pending if missing]
+
+        responses = await self.gather_limited(
+            self._make_request_async('tracks', {'ids': ','.join(missing)}) for missing in pending
+        )
+        for missing, data in zip(pending, responses):
+            if self.cache.backend.blocking:
+                await self._off_loop(self._add_tracks, data, tracks, missing)
+            else:
+                self._add_tracks(data, tracks, missing)
+        return tracks
+
+    async def get_track_features_async(self, track_id):
+        return await self._make_request_async(f'audio-features/{track_id}')
+
+    async def get_artist_top_tracks_async(self, artist_id, limit=10):
+        data = await self._make_request_async(f'artists/{artist_id}/top-tracks', {'market': 'BR'})
+        if not data or 'tracks' not in data:
+            return []
+
+        tracks = [self._format_track_data(track) for track in data['tracks'][:limit]]
+        return [track for track in tracks if track]
+
+    # Fachada síncrona para as views (sem resposta no prazo: como o Spotify fora do ar)
+
+    def get_tracks(self, track_ids):
+        try:
+            return self.run(self.get_tracks_async(track_ids))
+        except TimeoutError:
+            return dict.fromkeys(track_ids)  # indisponíveis
+
+    def get_many_tracks(self, track_ids):
+        """Busca cada música individualmente, em paralelo (mesma ordem dos ids)"""
+        return self._run_many(self.get_track_async, track_ids, None)
+
+    def search_many(self, queries, limit=20):
+        """Executa várias buscas em paralelo (mesma ordem das consultas)"""
+        return self._run_many(lambda query: self.search_tracks_async(query, limit), queries, [])
+
+    def get_many_track_features(self, track_ids):
+        """Características de áudio de várias músicas, em paralelo (mesma ordem dos ids)"""
+        return self._run_many(self.get_track_features_async, track_ids, None)
+
+    def get_many_artist_top_tracks(self, artist_ids, limit=10):
+        """Top tracks de vários artistas, em paralelo (mesma ordem dos ids)"""
+        return self._run_many(lambda artist_id: self.get_artist_top_tracks_async(artist_id, limit),
+                              artist_ids, [])
+
+    def _run_many(self, lookup, keys, default):
+        keys = list(keys)
+        try:
+            return self.run(self.gather_limited(lookup(key) for key in keys))
+        except TimeoutError:
+            return [default] * len(keys)
+
+
+# Instância global: mesmo cache, token e disjuntor do serviço síncrono
+async_spotify_service = AsyncSpotifyService(sync_service=spotify_service)
@@ -0,0 +1,117 @@
+import time
+import threading
+from collections import OrderedDict, namedtuple
+from flask import g
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from app import db
+from app.models.user import User
+
+
+# O que as verificações de permissão precisam saber do usuário do token
+Principal = namedtuple('Principal', ['id', 'is_admin', 'is_active'])
+
+
+class CurrentUserLoader:
+    """Usuário do token da requisição atual, carregado no máximo uma vez
+
+    principal() devolve só id, is_admin e is_active, que é o que as
+    verificações de permissão usam. Vem, nesta ordem, das claims do token
+    (se JWT_USER_CLAIMS estiver ativo), do cache do processo (por
+    CURRENT_USER_CACHE_TTL segundos, invalidado nos commits que alteram ou
+    removem o usuário; 0 desativa) ou de uma query de duas colunas.
+
+    user() devolve o modelo completo, para as rotas que leem ou alteram o
+    próprio usuário. Os dois ficam guardados em g até o fim da requisição.
+    """
+
+    def __init__(self):
+        self.cache_ttl = 5.0
+        self.max_cached = 10000
+        self.embed_claims = False
+        self._cache = OrderedDict()  # id -> (expira_em, Principal ou None)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.cache_ttl = app.config.get('CURRENT_USER_CACHE_TTL', self.cache_ttl)
+        self.embed_claims = app.config.get('JWT_USER_CLAIMS', self.embed_claims)
+        with self._lock:
+            self._cache = OrderedDict()
+
+    def claims_for(self, user):
+        """Claims adicionais do access token (vazias se JWT_USER_CLAIMS estiver desativado)"""
+        if not self.embed_claims:
+            return {}
+        return {'is_admin': user.is_admin, 'is_active': user.is_active}
+
+    def principal(self):
+        """Principal do usuário do token, ou None se ele não existe mais"""
+        if 'current_principal' not in g:
+            g.current_principal = self._load_principal(get_jwt_identity())
+        return g.current_principal
+
+    def user(self):
+        """Modelo User do usuário do token, ou None se ele não existe mais"""
+        if 'current_user' not in g:
+            g.current_user = db.session.get(User, get_jwt_identity())
+        return g.current_user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._cache.pop(user_id, None)
+
+    def _load_principal(self, user_id):
+        claims = get_jwt()
+        if 'is_admin' in claims and 'is_active' in claims:
+            return Principal(user_id, claims['is_admin'], claims['is_active'])
+
+        # Usuário completo já carregado nesta requisição
+        if 'current_user' in g:
+            user = g.current_user
+            return Principal(user.id, user.is_admin, user.is_active) if user else None
+
+        if self.cache_ttl > 0:
+            now = time.monotonic()
+            with self._lock:
+                cached = self._cache.get(user_id)
+                if cached and cached[0] > now:
+                    self._cache.move_to_end(user_id)
+                    return cached[1]
+
+        row = db.session.query(User.id, User.is_admin, User.is_active).filter(User.id == user_id).first()
+        principal = Principal(*row) if row else None
+
+        if self.cache_ttl > 0:
+            with self._lock:
+                self._cache[user_id] = (time.monotonic() + self.cache_ttl, principal)
+                self._cache.move_to_end(user_id)
+                while len(self._cache) > self.max_cached:
+                    self._cache.popitem(last=False)
+        return principal
+
+
+# Instância global do carregador
+current_user_loader = CurrentUserLoader()
+
+
+def _queue_invalidation(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('user_changes', set()).add(target.id)
+
+
+event.listen(User, 'after_update', _queue_invalidation)
+event.listen(User, 'after_delete', _queue_invalidation)
+
+
+# Invalida o cache depois do commit (os demais workers expiram pelo TTL)
+@event.listens_for(Session, 'after_commit')
+def _apply_invalidations(session):
+    for user_id in session.info.pop('user_changes', ()):
+        current_user_loader.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidations(session):
+    session.info.pop('user_changes', None)
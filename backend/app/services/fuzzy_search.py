@@ -0,0 +1,347 @@
+import re
+import time
+import heapq
+import threading
+from array import array
+from collections import Counter
+from sqlalchemy import DDL, case, event, func, inspect, literal, or_, select
+from flask import current_app
+from sqlalchemy.orm import Session, object_session
+from app import db
+from app.models.music import Music
+from app.models.playlist import Playlist
+from app.utils.text import normalize
+
+
+# Colunas comparadas em cada tabela
+FIELDS = {
+    'music': (Music, ('title', 'artist', 'album')),
+    'playlists': (Playlist, ('name', 'description')),
+}
+
+# Modos de busca das listagens: text (palavras por prefixo) ou fuzzy (tolerante a erros)
+SEARCH_MODES = ('text', 'fuzzy')
+
+# Similaridade mínima padrão (mesmo padrão do word_similarity do pg_trgm)
+DEFAULT_THRESHOLD = 0.6
+
+# Máximo de candidatos do índice em memória repassados ao banco
+MAX_CANDIDATES = 1000
+
+# Fração de documentos mortos a partir da qual o índice em memória é compactado
+COMPACT_RATIO = 0.25
+COMPACT_MIN_DEAD = 64
+
+# No PostgreSQL: pg_trgm com índices GIN por coluna
+PG_SETUP = {
+    'music': [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS ix_music_title_trgm ON music USING gin (title gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_music_artist_trgm ON music USING gin (artist gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_music_album_trgm ON music USING gin (album gin_trgm_ops)",
+    ],
+    'playlists': [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS ix_playlists_name_trgm ON playlists USING gin (name gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_playlists_description_trgm ON playlists USING gin (description gin_trgm_ops)",
+    ],
+}
+
+for kind, statements in PG_SETUP.items():
+    for statement in statements:
+        event.listen(FIELDS[kind][0].__table__, 'after_create',
+                     DDL(statement).execute_if(dialect='postgresql'))
+
+
+def trigrams(text):
+    """Trigramas no formato do pg_trgm (palavras com dois espaços antes e um depois)"""
+    grams = set()
+    for word in re.findall(r'\w+', normalize(text)):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """Índice invertido de trigramas em memória (alternativa ao pg_trgm)
+
+    Cada texto indexado é um documento. A similaridade aproxima o
+    word_similarity do pg_trgm: fração dos trigramas da busca presentes no
+    texto, de modo que uma palavra com erro de digitação ainda encontra um
+    título longo; empates favorecem textos mais curtos.
+
+    Documentos de itens alterados ou removidos são marcados como mortos;
+    quando passam de COMPACT_RATIO do total, os vivos são renumerados e os
+    mortos saem das listas de trigramas (compact).
+    """
+
+    def __init__(self):
+        self.postings = {}  # trigrama -> documentos
+        self.doc_items = array('q')  # documento -> id do item
+        self.doc_sizes = array('l')  # documento -> quantidade de trigramas (0 = morto)
+        self.item_docs = {}  # id do item -> documentos
+        self.dead = 0
+
+    def add(self, item_id, texts):
+        self.remove(item_id)
+        docs = []
+        for text in texts:
+            grams = trigrams(text)
+            if not grams:
+                continue
+            doc = len(self.doc_items)
+            self.doc_items.append(item_id)
+            self.doc_sizes.append(len(grams))
+            for gram in grams:
+                postings = self.postings.get(gram)
+                if postings is None:
+                    postings = self.postings[gram] = array('q')
+                postings.append(doc)
+            docs.append(doc)
+        if docs:
+            self.item_docs[item_id] = docs
+
+    def remove(self, item_id):
+        for doc in self.item_docs.pop(item_id, ()):
+            self.doc_sizes[doc] = 0
+            self.dead += 1
+        if self.dead >= COMPACT_MIN_DEAD and self.dead > COMPACT_RATIO * len(self.doc_items):
+            self.compact()
+
+    def compact(self):
+        """Renumera os documentos vivos e tira os mortos das listas de trigramas"""
+        renumbered = array('q', [-1]) * len(self.doc_items)  # documento antigo -> novo
+        doc_items, doc_sizes = array('q'), array('l')
+        for doc, size in enumerate(self.doc_sizes):
+            if size:
+                renumbered[doc] = len(doc_items)
+                doc_items.append(self.doc_items[doc])
+                doc_sizes.append(size)
+
+        postings = {}
+        for gram, docs in self.postings.items():
+            live = array('q', (renumbered[doc] for doc in docs if renumbered[doc] >= 0))
+            if live:
+                postings[gram] = live
+
+        self.postings, self.doc_items, self.doc_sizes = postings, doc_items, doc_sizes
+        self.item_docs = {item_id: [renumbered[doc] for doc in docs] for item_id, docs in self.item_docs.items()}
+        self.dead = 0
+
+    def search(self, text, threshold, limit=MAX_CANDIDATES):
+        """[(id, similaridade)] dos itens com similaridade >= threshold, melhores primeiro"""
+        grams = trigrams(text)
+        if not grams:
+            return []
+
+        shared = Counter()
+        for gram in grams:
+            postings = self.postings.get(gram)
+            if postings is not None:
+                shared.update(postings)
+
+        minimum = threshold * len(grams)
+        scores = {}
+        for doc, count in shared.items():
+            size = self.doc_sizes[doc]
+            if not size or count < minimum:
+                continue
+            # (fração da busca encontrada, similaridade do texto inteiro)
+            score = (count / len(grams), count / (len(grams) + size - count))
+            item_id = self.doc_items[doc]
+            if score > scores.get(item_id, (0, 0)):
+                scores[item_id] = score
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(item_id, score[0]) for item_id, score in best]
+
+
+class FuzzySearch:
+    """Busca aproximada (tolerante a erros de digitação) em músicas e playlists
+
+    No PostgreSQL usa pg_trgm com índices GIN; nos demais bancos, um
+    índice de trigramas em memória construído na primeira busca e mantido
+    pelos commits que alteram as tabelas.
+
+    O índice em memória só vê os commits do próprio processo. Os candidatos
+    dele sempre passam pelos filtros da query no banco (um item removido ou
+    tornado privado em outro worker não aparece), e o índice é reconstruído
+    em segundo plano a cada FUZZY_REBUILD_INTERVAL segundos para incluir o
+    que outros workers criaram ou renomearam.
+    """
+
+    def __init__(self):
+        self.backend = 'trigram'
+        self.rebuild_interval = 600.0
+        self._indexes = {}
+        self._built_at = {}
+        self._rebuilding = {}  # tabela -> mudanças recebidas durante a reconstrução
+        self._lock = threading.RLock()
+
+    def init_app(self, app):
+        uri = app.config['SQLALCHEMY_DATABASE_URI']
+        self.backend = 'pg_trgm' if uri.startswith('postgresql') else 'trigram'
+        self.rebuild_interval = app.config.get('FUZZY_REBUILD_INTERVAL', self.rebuild_interval)
+        with self._lock:
+            self._indexes = {}
+            self._built_at = {}
+            self._rebuilding = {}
+
+    def search(self, query, kind, search, threshold=DEFAULT_THRESHOLD):
+        """Filtra a query (de music ou playlists) e retorna (query, ordenação por similaridade)
+
+        Deve receber a query já com todos os filtros: no índice em memória
+        os candidatos são escolhidos (e limitados) entre os que a query aceita.
+        """
+        if self.backend == 'pg_trgm':
+            return self._search_pg_trgm(query, kind, search, threshold)
+        return self._search_trigram(query, kind, search, threshold)
+
+    @staticmethod
+    def _search_pg_trgm(query, kind, search, threshold):
+        model, fields = FIELDS[kind]
+        columns = [getattr(model, field) for field in fields]
+
+        # O operador <% usa o limite da sessão (e os índices GIN); is_local
+        # limita o valor à transação, sem vazar para a conexão devolvida ao pool
+        db.session.execute(select(func.set_config('pg_trgm.word_similarity_threshold', str(threshold), True)))
+        query = query.filter(or_(*(literal(search).op('<%')(column) for column in columns)))
+        score = func.greatest(*(func.word_similarity(search, func.coalesce(column, '')) for column in columns))
+        return query, score.desc()
+
+    def _search_trigram(self, query, kind, search, threshold):
+        model, _ = FIELDS[kind]
+        index = self.index(kind)
+
+        # Os candidatos passam pelos filtros da query (visibilidade) antes do
+        # corte em MAX_CANDIDATES: itens que o usuário não vê não ocupam
+        # vagas. Se faltarem candidatos visíveis, o índice é consultado de
+        # novo com um limite maior
+        limit, checked, visible = MAX_CANDIDATES, 0, []
+        while True:
+            with self._lock:
+                matches = index.search(search, threshold, limit)
+            chunk = [item_id for item_id, _ in matches[checked:]]
+            if chunk:
+                allowed = {item_id for (item_id,) in
+                           query.with_entities(model.id).filter(model.id.in_(chunk)).order_by(None)}
+                visible.extend(item_id for item_id in chunk if item_id in allowed)
+            if len(visible) >= MAX_CANDIDATES or len(matches) < limit:
+                break
+            checked, limit = len(matches), limit * 2
+        if not visible:
+            return query.filter(db.false()), model.id
+
+        ranks = {item_id: rank for rank, item_id in enumerate(visible[:MAX_CANDIDATES])}
+        return query.filter(model.id.in_(ranks)), case(ranks, value=model.id)
+
+    def index(self, kind):
+        """Índice em memória da tabela, construído na primeira chamada
+
+        Passado rebuild_interval desde a construção, um novo índice é
+        montado em segundo plano; até ficar pronto, o atual continua em uso.
+        """
+        index = self._indexes.get(kind)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(kind)
+                if index is None:
+                    index = self._indexes[kind] = self._build(kind)
+                    self._built_at[kind] = time.monotonic()
+        elif self.rebuild_interval and time.monotonic() - self._built_at[kind] >= self.rebuild_interval:
+            with self._lock:
+                if kind not in self._rebuilding:
+                    self._rebuilding[kind] = []
+                    threading.Thread(target=self._rebuild, args=(current_app._get_current_object(), kind),
+                                     name=f'fuzzy-index-{kind}', daemon=True).start()
+        return index
+
+    def _rebuild(self, app, kind):
+        try:
+            with app.app_context():
+                index = self._build(kind)
+        except Exception as e:
+            print(f"❌ Erro ao reconstruir o índice de busca aproximada: {str(e)}")
+            index = None
+
+        with self._lock:
+            replay = self._rebuilding.pop(kind, [])
+            if index is None:
+                self._built_at[kind] = time.monotonic()  # tentar de novo no próximo intervalo
+                return
+            # Commits deste processo durante a leitura (add e remove são idempotentes)
+            for item_id, texts in replay:
+                self._apply_one(index, item_id, texts)
+            self._indexes[kind] = index
+            self._built_at[kind] = time.monotonic()
+
+    @staticmethod
+    def _build(kind):
+        model, fields = FIELDS[kind]
+        index = TrigramIndex()
+        rows = db.session.query(model.id, *(getattr(model, field) for field in fields)).yield_per(10000)
+        for item_id, *texts in rows:
+            index.add(item_id, texts)
+        return index
+
+    @staticmethod
+    def _apply_one(index, item_id, texts):
+        if texts is None:
+            index.remove(item_id)
+        else:
+            index.add(item_id, texts)
+
+    def apply(self, changes):
+        """Aplica uma lista de (tabela, id, textos ou None se removido)"""
+        with self._lock:
+            for kind, item_id, texts in changes:
+                if kind in self._rebuilding:
+                    self._rebuilding[kind].append((item_id, texts))
+                index = self._indexes.get(kind)
+                if index is None:
+                    continue  # a construção lerá o estado atual do banco
+                self._apply_one(index, item_id, texts)
+
+
+# Instância global da busca aproximada
+fuzzy_search = FuzzySearch()
+
+
+def _register_events(kind):
+    model, fields = FIELDS[kind]
+
+    def queue(target, texts):
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault('fuzzy_changes', []).append((kind, target.id, texts))
+
+    @event.listens_for(model, 'after_insert')
+    def inserted(mapper, connection, target):
+        queue(target, [getattr(target, field) for field in fields])
+
+    @event.listens_for(model, 'after_update')
+    def updated(mapper, connection, target):
+        state = inspect(target)
+        if any(state.attrs[field].history.has_changes() for field in fields):
+            queue(target, [getattr(target, field) for field in fields])
+
+    @event.listens_for(model, 'after_delete')
+    def deleted(mapper, connection, target):
+        queue(target, None)
+
+
+for kind in FIELDS:
+    _register_events(kind)
+
+
+# As mudanças só entram no índice depois do commit; rollback as descarta
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    changes = session.info.pop('fuzzy_changes', None)
+    if changes:
+        fuzzy_search.apply(changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('fuzzy_changes', None)
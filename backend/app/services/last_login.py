@@ -0,0 +1,96 @@
+from app.services.write_behind import WriteBehindBuffer
+
+
+class LastLoginRecorder(WriteBehindBuffer):
+    """Buffer write-behind para users.last_login
+
+    O login só anota (usuário, horário) em memória; a gravação é um único
+    UPDATE em lote, periódico ou quando o buffer atinge o limite. Assim o
+    login não espera um commit e vários logins do mesmo usuário entre dois
+    flushes viram uma escrita só (vale o mais recente).
+
+    Hashes de senha refeitos no login (record_rehash) vão pelo mesmo
+    caminho; só substituem o hash gravado se ele não mudou desde o login.
+    """
+
+    config_prefix = 'LAST_LOGIN'
+    thread_name = 'last-login-flush'
+    flushed_stat = 'flushed_logins'
+    error_message = 'Erro ao gravar último login'
+
+    def record(self, user_id, when):
+        """Registra um login do usuário"""
+        with self._lock:
+            logins = self._pending['logins']
+            previous = logins.get(user_id)
+            if previous is None or when > previous:
+                logins[user_id] = when
+            depth = self._depth(self._pending)
+        self._recorded(depth)
+
+    def record_rehash(self, user_id, old_hash, new_hash):
+        """Registra um hash de senha refeito no login"""
+        with self._lock:
+            self._pending['rehashes'][user_id] = (old_hash, new_hash)
+            depth = self._depth(self._pending)
+        self._recorded(depth)
+
+    def pending(self, user_id):
+        """Último login ainda não gravado do usuário (ou None)"""
+        with self._lock:
+            return self._pending['logins'].get(user_id)
+
+    def _empty(self):
+        return {'logins': {}, 'rehashes': {}}  # id -> último login / (hash antigo, hash novo)
+
+    def _depth(self, buffer):
+        return len(buffer['logins']) + len(buffer['rehashes'])
+
+    def _size(self, batch):
+        return len(batch['logins'])
+
+    def _restore(self, batch):
+        # Sem sobrescrever logins mais novos nem rehashes registrados depois
+        logins = self._pending['logins']
+        for user_id, when in batch['logins'].items():
+            if user_id not in logins or logins[user_id] < when:
+                logins[user_id] = when
+        for user_id, hashes in batch['rehashes'].items():
+            self._pending['rehashes'].setdefault(user_id, hashes)
+
+    def _pending_metrics(self):
+        return {
+            'pending_logins': len(self._pending['logins']),
+            'pending_rehashes': len(self._pending['rehashes'])
+        }
+
+    def _write(self, connection, batch):
+        from app import db
+        from app.models.user import User
+
+        table = User.__table__
+        if batch['logins']:
+            connection.execute(
+                table.update().where(table.c.id == db.bindparam('b_id')).values(
+                    # Outro worker pode já ter gravado um login mais novo
+                    last_login=db.case(
+                        (table.c.last_login > db.bindparam('b_last_login'), table.c.last_login),
+                        else_=db.bindparam('b_last_login')
+                    ),
+                    updated_at=table.c.updated_at  # não conta como edição
+                ),
+                [{'b_id': user_id, 'b_last_login': when} for user_id, when in batch['logins'].items()]
+            )
+        if batch['rehashes']:
+            connection.execute(
+                table.update().where(
+                    (table.c.id == db.bindparam('b_id'))
+                    & (table.c.password_hash == db.bindparam('b_old_hash'))
+                ).values(password_hash=db.bindparam('b_new_hash'), updated_at=table.c.updated_at),
+                [{'b_id': user_id, 'b_old_hash': old, 'b_new_hash': new}
+                 for user_id, (old, new) in batch['rehashes'].items()]
+            )
+
+
+# Instância global do buffer
+last_login_recorder = LastLoginRecorder()
@@ -0,0 +1,133 @@
+import re
+from sqlalchemy import DDL, Float, Integer, event, func, literal_column, text
+from app.models.music import Music
+
+
+# Índice de busca textual no SQLite: tabela FTS5 com conteúdo externo
+# (lê de music) mantida por triggers. unicode61 com remove_diacritics
+# ignora maiúsculas e acentos; prefix acelera buscas por prefixo.
+SQLITE_SETUP = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS music_fts USING fts5(
+        title, artist, album,
+        content='music', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS music_fts_ai AFTER INSERT ON music BEGIN
+        INSERT INTO music_fts (rowid, title, artist, album)
+        VALUES (new.id, new.title, new.artist, new.album);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS music_fts_ad AFTER DELETE ON music BEGIN
+        INSERT INTO music_fts (music_fts, rowid, title, artist, album)
+        VALUES ('delete', old.id, old.title, old.artist, old.album);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS music_fts_au AFTER UPDATE OF title, artist, album ON music BEGIN
+        INSERT INTO music_fts (music_fts, rowid, title, artist, album)
+        VALUES ('delete', old.id, old.title, old.artist, old.album);
+        INSERT INTO music_fts (rowid, title, artist, album)
+        VALUES (new.id, new.title, new.artist, new.album);
+    END""",
+]
+
+# Pesos das colunas no bm25 (título > artista > álbum)
+SQLITE_WEIGHTS = (10.0, 5.0, 1.0)
+
+# No PostgreSQL: configuração portuguesa sem acentos (unaccent + stemmer)
+# e índice GIN sobre o tsvector ponderado, sem coluna extra na tabela.
+PG_CONFIG = 'pt_unaccent'
+
+PG_DOCUMENT = (
+    f"setweight(to_tsvector('{PG_CONFIG}', coalesce(title, '')), 'A') || "
+    f"setweight(to_tsvector('{PG_CONFIG}', coalesce(artist, '')), 'B') || "
+    f"setweight(to_tsvector('{PG_CONFIG}', coalesce(album, '')), 'C')"
+)
+
+PG_SETUP = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    f"""DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = '{PG_CONFIG}') THEN
+            CREATE TEXT SEARCH CONFIGURATION {PG_CONFIG} (COPY = portuguese);
+            ALTER TEXT SEARCH CONFIGURATION {PG_CONFIG}
+                ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem;
+        END IF;
+    END
+    $$""",
+    f"CREATE INDEX IF NOT EXISTS ix_music_search ON music USING gin (({PG_DOCUMENT}))",
+]
+
+# Criar o índice junto com a tabela (db.create_all); bancos existentes
+# recebem o mesmo índice pela migration
+for statement in SQLITE_SETUP:
+    event.listen(Music.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+for statement in PG_SETUP:
+    event.listen(Music.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+event.listen(Music.__table__, 'before_drop',
+             DDL('DROP TABLE IF EXISTS music_fts').execute_if(dialect='sqlite'))
+
+
+def search_terms(search):
+    """Palavras da busca, sem pontuação nem operadores"""
+    return re.findall(r'\w+', search.lower())
+
+
+class MusicSearch:
+    """Busca textual de músicas (título, artista e álbum)
+
+    O mecanismo é escolhido pela URI do banco na inicialização: FTS5 no
+    SQLite, tsvector + GIN no PostgreSQL e ILIKE nos demais. Em todos, a
+    busca é por prefixo de cada palavra (todas obrigatórias), ignora
+    acentos e ordena pela relevância.
+    """
+
+    def __init__(self):
+        self.backend = 'like'
+
+    def init_app(self, app):
+        uri = app.config['SQLALCHEMY_DATABASE_URI']
+        if uri.startswith('sqlite'):
+            self.backend = 'fts5'
+        elif uri.startswith('postgresql'):
+            self.backend = 'tsvector'
+        else:
+            self.backend = 'like'
+
+    def search(self, query, search):
+        """Filtra a query pela busca e retorna (query, ordenação por relevância)"""
+        terms = search_terms(search)
+        if not terms or self.backend == 'like':
+            return self._search_like(query, search)
+        if self.backend == 'fts5':
+            return self._search_fts5(query, terms)
+        return self._search_tsvector(query, terms)
+
+    @staticmethod
+    def _search_like(query, search):
+        query = query.filter(
+            (Music.title.ilike(f'%{search}%')) |
+            (Music.artist.ilike(f'%{search}%')) |
+            (Music.album.ilike(f'%{search}%'))
+        )
+        return query, Music.title.ilike(f'{search}%').desc()
+
+    @staticmethod
+    def _search_fts5(query, terms):
+        match = ' '.join(f'"{term}"*' for term in terms)
+        matches = text(
+            f"SELECT rowid AS music_id, bm25(music_fts, {', '.join(map(str, SQLITE_WEIGHTS))}) AS rank "
+            "FROM music_fts WHERE music_fts MATCH :match"
+        ).bindparams(match=match).columns(music_id=Integer, rank=Float).subquery('music_fts_matches')
+
+        query = query.join(matches, matches.c.music_id == Music.id)
+        return query, matches.c.rank.asc()  # bm25: menor é mais relevante
+
+    @staticmethod
+    def _search_tsvector(query, terms):
+        document = literal_column(f'({PG_DOCUMENT})')
+        tsquery = func.to_tsquery(literal_column(f"'{PG_CONFIG}'"), ' & '.join(f'{term}:*' for term in terms))
+
+        query = query.filter(document.op('@@')(tsquery))
+        return query, func.ts_rank(document, tsquery).desc()
+
+
+# Instância global da busca
+music_search = MusicSearch()
@@ -0,0 +1,205 @@
+import os
+import atexit
+import base64
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import bcrypt
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+# Custo padrão de cada algoritmo: rounds (log2) no bcrypt, iterações no
+# pbkdf2 e log2(N) no scrypt
+DEFAULT_COSTS = {
+    'bcrypt': 10,
+    'pbkdf2': 600000,
+    'scrypt': 15,
+}
+
+ALGORITHMS = tuple(DEFAULT_COSTS)
+
+POOLS = ('thread', 'process', 'none')
+
+# bcrypt só usa os primeiros 72 bytes da senha e rejeita NUL: a senha passa
+# antes por SHA-256 (em base64, 44 bytes sem NUL). Hashes bcrypt sem o
+# prefixo (gravados antes) continuam válidos e são refeitos no login.
+BCRYPT_SHA256_PREFIX = 'bcrypt-sha256:'
+
+
+def is_valid_password(password):
+    """Se a senha é texto que pode ser codificado em UTF-8"""
+    if not isinstance(password, str):
+        return False
+    try:
+        password.encode('utf-8')
+    except UnicodeEncodeError:
+        return False  # surrogates soltos vindos do JSON
+    return True
+
+
+def _bcrypt_secret(password):
+    return base64.b64encode(hashlib.sha256(password.encode('utf-8')).digest())
+
+
+def identify(password_hash):
+    """(algoritmo, custo) de um hash gravado; (None, None) se desconhecido"""
+    if password_hash.startswith(BCRYPT_SHA256_PREFIX):
+        return 'bcrypt', int(password_hash.split('$')[2])
+    if password_hash.startswith('$2'):
+        return 'bcrypt-legacy', int(password_hash.split('$')[2])
+    method = password_hash.split('$', 1)[0]
+    if method.startswith('pbkdf2:'):
+        parts = method.split(':')
+        return 'pbkdf2', int(parts[2]) if len(parts) > 2 else 600000
+    if method.startswith('scrypt:'):
+        parts = method.split(':')
+        return 'scrypt', (int(parts[1]) if len(parts) > 1 else 32768).bit_length() - 1
+    return None, None
+
+
+def hash_password(password, algorithm, cost):
+    """Gera o hash (função de módulo para poder rodar em outro processo)"""
+    if algorithm == 'bcrypt':
+        return BCRYPT_SHA256_PREFIX + bcrypt.hashpw(_bcrypt_secret(password), bcrypt.gensalt(cost)).decode('ascii')
+    if algorithm == 'pbkdf2':
+        return generate_password_hash(password, method=f'pbkdf2:sha256:{cost}')
+    if algorithm == 'scrypt':
+        return generate_password_hash(password, method=f'scrypt:{2 ** cost}:8:1')
+    raise ValueError(f'Algoritmo de senha desconhecido: {algorithm}')
+
+
+def verify_password(password, password_hash):
+    """Confere a senha com um hash de qualquer algoritmo suportado"""
+    try:
+        if password_hash.startswith(BCRYPT_SHA256_PREFIX):
+            bcrypt_hash = password_hash[len(BCRYPT_SHA256_PREFIX):].encode('ascii')
+            return bcrypt.checkpw(_bcrypt_secret(password), bcrypt_hash)
+        if password_hash.startswith('$2'):
+            return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('ascii'))
+        return check_password_hash(password_hash, password)
+    except ValueError:
+        return False  # hash malformado ou de formato desconhecido
+
+
+class PasswordHasher:
+    """Hash de senhas com algoritmo e custo configuráveis
+
+    PASSWORD_HASH_ALGORITHM escolhe bcrypt, pbkdf2 ou scrypt e
+    PASSWORD_HASH_COST o custo (DEFAULT_COSTS). Hashes gravados com outro
+    algoritmo ou custo continuam válidos e são refeitos no próximo login
+    (needs_rehash).
+
+    O cálculo roda em um pool (PASSWORD_HASH_POOL: thread, process ou none)
+    de PASSWORD_HASH_WORKERS workers. O pool é um limite de concorrência:
+    hash e verify ainda esperam o resultado (a requisição precisa dele),
+    mas bcrypt e hashlib liberam o GIL, então os hashes ocupam outros
+    núcleos sem travar as demais requisições do processo, e em um pico de
+    logins no máximo PASSWORD_HASH_WORKERS rodam ao mesmo tempo. Só o
+    rehash do login (rehash_later) não espera: o novo hash é entregue a um
+    callback quando fica pronto.
+    """
+
+    def __init__(self):
+        self.algorithm = 'bcrypt'
+        self.cost = DEFAULT_COSTS['bcrypt']
+        self.pool = 'thread'
+        self.workers = os.cpu_count() or 1
+        self._executor = None
+        self._lock = threading.Lock()
+        self._rehashing = {}  # chave -> future do rehash em andamento
+        self._rehash_done = threading.Condition(self._lock)
+        self._registered = False
+
+    def init_app(self, app):
+        algorithm = app.config.get('PASSWORD_HASH_ALGORITHM', self.algorithm)
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"PASSWORD_HASH_ALGORITHM deve ser um de: {', '.join(ALGORITHMS)}")
+        pool = app.config.get('PASSWORD_HASH_POOL', self.pool)
+        if pool not in POOLS:
+            raise ValueError(f"PASSWORD_HASH_POOL deve ser um de: {', '.join(POOLS)}")
+
+        self.configure(algorithm, app.config.get('PASSWORD_HASH_COST'), pool,
+                       app.config.get('PASSWORD_HASH_WORKERS') or self.workers)
+
+    def configure(self, algorithm, cost=None, pool='thread', workers=None):
+        self.shutdown()
+        self.algorithm = algorithm
+        self.cost = cost or DEFAULT_COSTS[algorithm]
+        self.pool = pool
+        self.workers = workers or os.cpu_count() or 1
+        if not self._registered:
+            atexit.register(self.shutdown)
+            self._registered = True
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _run(self, function, *args):
+        if self.pool == 'none':
+            return function(*args)
+        return self._submit(function, *args).result()
+
+    def _submit(self, function, *args):
+        return self._get_executor().submit(function, *args)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.pool == 'process':
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix='password-hash')
+            return self._executor
+
+    def hash(self, password):
+        return self._run(hash_password, password, self.algorithm, self.cost)
+
+    def verify(self, password, password_hash):
+        if not password_hash or not is_valid_password(password):
+            return False
+        return self._run(verify_password, password, password_hash)
+
+    def rehash_later(self, key, password, callback):
+        """Refaz o hash no pool sem esperar; callback(novo_hash) quando pronto
+
+        Um rehash por chave (ex.: id do usuário) por vez. Com pool none o
+        hash é feito na hora.
+        """
+        if self.pool == 'none':
+            callback(hash_password(password, self.algorithm, self.cost))
+            return
+        executor = self._get_executor()
+        with self._lock:
+            if key in self._rehashing:
+                return
+            future = executor.submit(hash_password, password, self.algorithm, self.cost)
+            self._rehashing[key] = future
+
+        def done(future):
+            try:
+                callback(future.result())
+            except Exception as e:
+                print(f"❌ Erro ao refazer hash de senha: {str(e)}")
+            with self._lock:
+                if self._rehashing.get(key) is future:
+                    del self._rehashing[key]
+                self._rehash_done.notify_all()
+
+        future.add_done_callback(done)
+
+    def drain(self, timeout=None):
+        """Espera os rehashes em andamento (e seus callbacks)"""
+        with self._lock:
+            return self._rehash_done.wait_for(lambda: not self._rehashing, timeout)
+
+    def needs_rehash(self, password_hash):
+        """Se o hash foi gerado com outro algoritmo ou custo"""
+        return identify(password_hash) != (self.algorithm, self.cost)
+
+
+# Instância global do hasher
+password_hasher = PasswordHasher()
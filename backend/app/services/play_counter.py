@@ -0,0 +1,113 @@
+import time
+from collections import Counter, OrderedDict
+from app.services.write_behind import WriteBehindBuffer
+
+
+class PlayCounter(WriteBehindBuffer):
+    """Buffer write-behind para contadores de reprodução.
+
+    As reproduções são acumuladas em memória por (tipo, id) e gravadas em
+    lote com UPDATE ... SET play_count = play_count + :n, periodicamente ou
+    quando o buffer atinge o limite configurado. Assim o streaming não paga
+    uma escrita síncrona no banco e reproduções concorrentes não se perdem.
+    """
+
+    config_prefix = 'PLAY_COUNT'
+    thread_name = 'play-counter-flush'
+    flushed_stat = 'flushed_increments'
+    error_message = 'Erro ao gravar contadores de reprodução'
+
+    def __init__(self):
+        super().__init__()
+        self._sessions = OrderedDict()  # (tipo, id, sessão) -> expiração (time.monotonic())
+        self.session_ttl = 6 * 60 * 60
+        self.replay_window = 30.0
+        self.max_sessions = 100000
+
+    def init_app(self, app):
+        super().init_app(app)
+        self.replay_window = app.config.get('PLAY_COUNT_REPLAY_WINDOW', self.replay_window)
+        with self._lock:
+            self._sessions.clear()
+
+    def record(self, kind, item_id, count=1):
+        """Registra reproduções de uma música ('music') ou playlist ('playlist')"""
+        with self._lock:
+            self._pending[kind][item_id] += count
+            depth = self._depth(self._pending)
+        self._recorded(depth)
+
+    def record_once(self, kind, item_id, session_key, ttl=None):
+        """Registra uma reprodução apenas na primeira vez que a sessão é vista.
+
+        Usado pelo streaming, em que uma mesma reprodução gera várias
+        requisições (Range) ao avançar ou voltar no áudio. A sessão vale por
+        ttl segundos (padrão: session_ttl). As sessões vistas ficam na
+        memória do processo: com vários workers, uma reprodução cujo início
+        (byte 0) é pedido de novo a outro worker pode ser contada mais de
+        uma vez.
+        """
+        key = (kind, item_id, session_key)
+        now = time.monotonic()
+        with self._lock:
+            # Descartar sessões expiradas ou excedentes (mais antigas primeiro)
+            while self._sessions:
+                oldest_key, expires_at = next(iter(self._sessions.items()))
+                if expires_at > now and len(self._sessions) < self.max_sessions:
+                    break
+                del self._sessions[oldest_key]
+
+            expires_at = self._sessions.get(key)
+            if expires_at is not None and expires_at > now:
+                return False
+            self._sessions[key] = now + (self.session_ttl if ttl is None else ttl)
+            self._sessions.move_to_end(key)
+
+        self.record(kind, item_id)
+        return True
+
+    def pending(self, kind, item_id):
+        """Reproduções ainda não gravadas para o item"""
+        with self._lock:
+            return self._pending[kind].get(item_id, 0)
+
+    def _empty(self):
+        return {'music': Counter(), 'playlist': Counter()}
+
+    def _depth(self, buffer):
+        return sum(len(counter) for counter in buffer.values())
+
+    def _size(self, batch):
+        return sum(sum(counter.values()) for counter in batch.values())
+
+    def _restore(self, batch):
+        for kind, counter in batch.items():
+            self._pending[kind].update(counter)
+
+    def _pending_metrics(self):
+        return {
+            'pending_items': self._depth(self._pending),
+            'pending_increments': self._size(self._pending)
+        }
+
+    def _write(self, connection, batch):
+        from app import db
+        from app.models.music import Music
+        from app.models.playlist import Playlist
+
+        tables = {'music': Music.__table__, 'playlist': Playlist.__table__}
+        for kind, counter in batch.items():
+            if not counter:
+                continue
+            table = tables[kind]
+            connection.execute(
+                table.update().where(table.c.id == db.bindparam('b_id')).values(
+                    play_count=table.c.play_count + db.bindparam('b_count'),
+                    updated_at=table.c.updated_at  # não conta como edição
+                ),
+                [{'b_id': item_id, 'b_count': count} for item_id, count in counter.items()]
+            )
+
+
+# Instância global do buffer
+play_counter = PlayCounter()
@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class MemoryCacheBackend:
+    """Armazenamento LRU em memória (por processo)"""
+
+    blocking = False  # get/set não fazem I/O
+
+    def __init__(self, max_entries=5000, max_bytes=50 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # chave -> (expira_em, valor serializado)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        """Armazena o valor e retorna quantas entradas foram despejadas"""
+        if len(value) > self.max_bytes:
+            return 0
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time() + ttl, value)
+            self._bytes += len(value)
+
+            evicted = 0
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                evicted += 1
+            return evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def size(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes}
+
+    def _remove(self, key):
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value)
+
+
+class SQLiteCacheBackend:
+    """Armazenamento LRU em um arquivo SQLite, compartilhado entre processos
+
+    Útil com vários workers do gunicorn: uma resposta obtida por um worker
+    serve a todos os outros.
+    """
+
+    blocking = True  # get/set fazem I/O em disco
+
+    def __init__(self, path, max_entries=50000, max_bytes=200 * 1024 * 1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS response_cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, '
+                'expires_at REAL NOT NULL, last_access REAL NOT NULL)'
+            )
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS ix_response_cache_last_access '
+                'ON response_cache (last_access)'
+            )
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        with self._connection() as conn:
+            row = conn.execute(
+                'SELECT value, expires_at FROM response_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                conn.execute('DELETE FROM response_cache WHERE key = ?', (key,))
+                return None
+            conn.execute('UPDATE response_cache SET last_access = ? WHERE key = ?', (now, key))
+            return row[0]
+
+    def set(self, key, value, ttl):
+        """Armazena o valor e retorna quantas entradas foram despejadas"""
+        if len(value) > self.max_bytes:
+            return 0
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO response_cache (key, value, size, expires_at, last_access) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, value, len(value), now + ttl, now)
+            )
+            evicted = conn.execute('DELETE FROM response_cache WHERE expires_at <= ?', (now,)).rowcount
+
+            entries, total_bytes = self._usage(conn)
+            if entries > self.max_entries:
+                evicted += self._evict_oldest(conn, entries - self.max_entries)
+                entries, total_bytes = self._usage(conn)
+
+            while total_bytes > self.max_bytes and entries:
+                evicted += self._evict_oldest(conn, max(entries // 10, 1))
+                entries, total_bytes = self._usage(conn)
+            return evicted
+
+    @staticmethod
+    def _usage(conn):
+        return conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response_cache').fetchone()
+
+    @staticmethod
+    def _evict_oldest(conn, count):
+        """Remove as count entradas usadas há mais tempo"""
+        return conn.execute(
+            'DELETE FROM response_cache WHERE key IN ('
+            'SELECT key FROM response_cache ORDER BY last_access LIMIT ?)', (count,)
+        ).rowcount
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM response_cache')
+
+    def size(self):
+        with self._connection() as conn:
+            entries, total_bytes = self._usage(conn)
+        return {'entries': entries, 'bytes': total_bytes}
+
+
+class ResponseCache:
+    """Cache de respostas de APIs externas com TTL por endpoint
+
+    A chave é formada pelo endpoint e pelos parâmetros normalizados, de
+    modo que buscas equivalentes ("Anitta", " anitta ") compartilham a
+    mesma entrada.
+    """
+
+    def __init__(self, backend, ttls=None, default_ttl=300):
+        self.backend = backend
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(endpoint, params=None):
+        """Chave estável para (endpoint, parâmetros normalizados)"""
+        normalized = {}
+        for name, value in (params or {}).items():
+            if isinstance(value, str):
+                value = ' '.join(value.split())
+                if name == 'q':
+                    value = value.lower()
+            normalized[name] = value
+        return f"{endpoint.strip('/')}?{json.dumps(normalized, sort_keys=True, ensure_ascii=False)}"
+
+    def ttl_for(self, endpoint):
+        """TTL do endpoint, pelo primeiro segmento do caminho (search, tracks, ...)"""
+        return self.ttls.get(endpoint.strip('/').split('/')[0], self.default_ttl)
+
+    def get(self, endpoint, params=None):
+        value = self.backend.get(self.make_key(endpoint, params))
+        with self._lock:
+            self._stats['hits' if value is not None else 'misses'] += 1
+        return json.loads(value) if value is not None else None
+
+    def set(self, endpoint, data, params=None):
+        value = json.dumps(data, separators=(',', ':')).encode()
+        evicted = self.backend.set(self.make_key(endpoint, params), value, self.ttl_for(endpoint))
+        if evicted:
+            with self._lock:
+                self._stats['evictions'] += evicted
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(self.backend.size())
+        return stats
+
+
+def create_response_cache(ttls, default_ttl=300):
+    """Cria o cache conforme as variáveis de ambiente SPOTIFY_CACHE_*"""
+    backend_name = os.environ.get('SPOTIFY_CACHE_BACKEND', 'memory').lower()
+    max_entries = int(os.environ.get('SPOTIFY_CACHE_MAX_ENTRIES', 5000))
+    max_bytes = int(os.environ.get('SPOTIFY_CACHE_MAX_BYTES', 50 * 1024 * 1024))
+
+    if backend_name == 'sqlite':
+        path = os.environ.get('SPOTIFY_CACHE_PATH', os.path.join('instance', 'spotify_cache.db'))
+        backend = SQLiteCacheBackend(path, max_entries, max_bytes)
+    elif backend_name == 'memory':
+        backend = MemoryCacheBackend(max_entries, max_bytes)
+    else:
+        raise ValueError(f'SPOTIFY_CACHE_BACKEND inválido: {backend_name}')
+
+    return ResponseCache(backend, ttls, default_ttl)
@@ -1,19 +1,194 @@
 import os
-import requests
+import time
+import random
 import base64
+import threading
+import requests
+from concurrent.futures import Future
+from flask import has_request_context
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timedelta
+from app.services.response_cache import create_response_cache
+
+# TTL (segundos) das respostas em cache, por endpoint da API do Spotify
+CACHE_TTLS = {
+    'search': 10 * 60,
+    'tracks': 24 * 60 * 60,
+    'audio-features': 7 * 24 * 60 * 60,
+    'artists': 60 * 60
+}
+
+# Limite de ids por chamada do endpoint tracks?ids=
+MAX_TRACKS_PER_REQUEST = 50
+
+
+class CircuitBreaker:
+    """Disjuntor: após falhas consecutivas, bloqueia chamadas por um intervalo.
+    
+    Passado o intervalo, uma única chamada de teste é liberada (meio-aberto);
+    se ela funcionar o circuito fecha, se falhar volta a abrir.
+    """
+    
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+    
+    def allow(self):
+        """Indica se uma chamada pode ser feita agora"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Liberar apenas esta chamada de teste
+                self.opened_at = time.monotonic()
+                return True
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
 
 
 class SpotifyService:
     """Serviço para integração com a API do Spotify"""
     
-    def __init__(self):
+    def __init__(self, cache=None):
         self.client_id = os.environ.get('SPOTIFY_CLIENT_ID')
         self.client_secret = os.environ.get('SPOTIFY_CLIENT_SECRET')
         self.base_url = 'https://api.spotify.com/v1'
         self.auth_url = 'https://accounts.spotify.com/api/token'
         self.access_token = None
         self.token_expires_at = None
+        self._token_lock = threading.Lock()
+        self._token_attempts = 0
+        self._inflight = {}  # chave do cache -> Future da requisição em andamento
+        self._inflight_lock = threading.Lock()
+        self.cache = cache or create_response_cache(CACHE_TTLS)
+        
+        # Conexões HTTP: pool persistente, timeouts, retentativas e disjuntor
+        self.connect_timeout = float(os.environ.get('SPOTIFY_CONNECT_TIMEOUT', 3.05))
+        self.read_timeout = float(os.environ.get('SPOTIFY_READ_TIMEOUT', 10))
+        self.max_retries = int(os.environ.get('SPOTIFY_MAX_RETRIES', 3))
+        self.backoff_base = 0.5  # segundos; dobra a cada tentativa
+        self.max_backoff = 30  # também é o maior Retry-After respeitado fora de requisições
+        # Prazo total de uma chamada (tentativas e esperas) e maior Retry-After
+        # respeitado durante uma requisição do usuário
+        self.deadline = float(os.environ.get('SPOTIFY_DEADLINE', 15))
+        self.max_retry_after = float(os.environ.get('SPOTIFY_MAX_RETRY_AFTER', 2))
+        self.pool_size = int(os.environ.get('SPOTIFY_POOL_SIZE', 10))
+        self._session = None
+        self._session_lock = threading.Lock()
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=int(os.environ.get('SPOTIFY_CIRCUIT_FAILURES', 5)),
+            reset_timeout=float(os.environ.get('SPOTIFY_CIRCUIT_RESET', 30))
+        )
+    
+    @property
+    def session(self):
+        """Sessão HTTP do serviço, criada no primeiro uso"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._create_session(self.pool_size)
+        return self._session
+    
+    @staticmethod
+    def _create_session(pool_size):
+        """Sessão HTTP com keep-alive e pool de conexões"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+    
+    def _backoff(self, attempt):
+        """Espera exponencial com jitter antes da próxima tentativa"""
+        return min(self.max_backoff, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1)
+    
+    def _retry_after(self, response, attempt):
+        """Espera indicada pelo Retry-After de um 429 (None se longa demais)
+        
+        Durante uma requisição do usuário só esperas curtas são respeitadas:
+        um worker parado esperando o Spotify não atende mais ninguém.
+        """
+        try:
+            delay = float(response.headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            return self._backoff(attempt)
+        limit = self.max_retry_after if has_request_context() else self.max_backoff
+        return delay if delay <= limit else None
+    
+    def _retry_delay(self, response, attempt):
+        """(erro, espera) se a resposta deve ser repetida, None se é final.
+        
+        Espera None indica um Retry-After longo demais: desistir.
+        """
+        if response.status_code == 429:
+            return 'HTTP 429', self._retry_after(response, attempt)
+        if response.status_code >= 500:
+            return f'HTTP {response.status_code}', self._backoff(attempt)
+        return None
+    
+    def _send(self, method, url, **kwargs):
+        """Envia uma requisição com timeout, retentativas e disjuntor.
+        
+        Erros de conexão, timeouts e respostas 5xx são repetidos com espera
+        exponencial; 429 respeita o Retry-After. Tentativas e esperas cabem em
+        self.deadline segundos: uma espera que passaria do prazo encerra a
+        chamada na hora. Retorna a resposta final ou None quando o Spotify
+        está indisponível.
+        """
+        if not self.circuit_breaker.allow():
+            print("⚠️  Spotify indisponível, requisição ignorada (circuito aberto)")
+            return None
+        
+        deadline = time.monotonic() + self.deadline
+        error = None
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            try:
+                response = self.session.request(
+                    method, url, timeout=(min(self.connect_timeout, remaining),
+                                          min(self.read_timeout, remaining)), **kwargs
+                )
+            except requests.RequestException as e:
+                error, delay = str(e), self._backoff(attempt)
+            else:
+                retry = self._retry_delay(response, attempt)
+                if retry is None:
+                    self.circuit_breaker.record_success()
+                    return response
+                error, delay = retry
+                if delay is None:
+                    break
+            
+            if attempt < self.max_retries:
+                if time.monotonic() + delay >= deadline:
+                    error = f'{error} (prazo de {self.deadline:g}s esgotado)'
+                    break
+                time.sleep(delay)
+        
+        self.circuit_breaker.record_failure()
+        print(f"❌ Spotify indisponível após {attempt + 1} tentativa(s): {error}")
+        return None
     
     def _get_access_token(self):
         """Obtém token de acesso do Spotify usando Client Credentials Flow"""
@@ -22,42 +197,94 @@ class SpotifyService:
             return None
         
         # Verificar se token ainda é válido
-        if (self.access_token and self.token_expires_at and 
-            datetime.now() < self.token_expires_at):
+        if self._token_is_valid():
             return self.access_token
         
-        try:
-            # Preparar credenciais
-            credentials = f"{self.client_id}:{self.client_secret}"
-            credentials_b64 = base64.b64encode(credentials.encode()).decode()
+        # Uma única renovação por vez: quem chegar durante ela espera e usa o
+        # resultado, em vez de pedir outro token (ou repetir uma falha)
+        attempts = self._token_attempts
+        with self._token_lock:
+            if self._token_attempts != attempts:
+                return self.access_token if self._token_is_valid() else None
+            if self._token_is_valid():
+                return self.access_token
             
-            headers = {
+            try:
+                response = self._send('POST', self.auth_url, **self._token_request())
+                if response is None:
+                    return None
+                
+                if response.status_code == 200:
+                    return self._store_token(response.json())
+                else:
+                    print(f"❌ Erro ao obter token do Spotify: {response.status_code}")
+                    return None
+                    
+            except Exception as e:
+                print(f"❌ Erro na autenticação do Spotify: {str(e)}")
+                return None
+            finally:
+                self._token_attempts += 1
+    
+    def _token_is_valid(self):
+        return bool(self.access_token and self.token_expires_at and
+                    datetime.now() < self.token_expires_at)
+    
+    def _token_request(self):
+        """Cabeçalhos e corpo da requisição de token (Client Credentials)"""
+        credentials = f"{self.client_id}:{self.client_secret}"
+        credentials_b64 = base64.b64encode(credentials.encode()).decode()
+        
+        return {
+            'headers': {
                 'Authorization': f'Basic {credentials_b64}',
                 'Content-Type': 'application/x-www-form-urlencoded'
-            }
-            
-            data = {
+            },
+            'data': {
                 'grant_type': 'client_credentials'
             }
-            
-            response = requests.post(self.auth_url, headers=headers, data=data)
-            
-            if response.status_code == 200:
-                token_data = response.json()
-                self.access_token = token_data['access_token']
-                expires_in = token_data.get('expires_in', 3600)
-                self.token_expires_at = datetime.now() + timedelta(seconds=expires_in - 60)
-                return self.access_token
-            else:
-                print(f"❌ Erro ao obter token do Spotify: {response.status_code}")
-                return None
-                
-        except Exception as e:
-            print(f"❌ Erro na autenticação do Spotify: {str(e)}")
-            return None
+        }
+    
+    def _store_token(self, token_data):
+        """Guarda o token recebido, com margem de 60s antes de expirar"""
+        self.access_token = token_data['access_token']
+        expires_in = token_data.get('expires_in', 3600)
+        self.token_expires_at = datetime.now() + timedelta(seconds=expires_in - 60)
+        return self.access_token
     
     def _make_request(self, endpoint, params=None):
-        """Faz uma requisição autenticada para a API do Spotify"""
+        """Faz uma requisição autenticada para a API do Spotify
+        
+        Chamadas idênticas simultâneas são agrupadas: só a primeira vai ao
+        Spotify e as demais aguardam a mesma resposta.
+        """
+        cached = self.cache.get(endpoint, params)
+        if cached is not None:
+            return cached
+        
+        key = self.cache.make_key(endpoint, params)
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        
+        if not leader:
+            return future.result()
+        
+        try:
+            data = self._fetch(endpoint, params)
+            future.set_result(data)
+            return data
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+    
+    def _fetch(self, endpoint, params=None):
+        """GET autenticado na API do Spotify, guardando a resposta no cache"""
         token = self._get_access_token()
         if not token:
             return None
@@ -69,10 +296,14 @@ class SpotifyService:
         
         try:
             url = f"{self.base_url}/{endpoint}"
-            response = requests.get(url, headers=headers, params=params)
+            response = self._send('GET', url, headers=headers, params=params)
+            if response is None:
+                return None
             
             if response.status_code == 200:
-                return response.json()
+                data = response.json()
+                self.cache.set(endpoint, data, params)
+                return data
             else:
                 print(f"❌ Erro na requisição Spotify: {response.status_code}")
                 return None
@@ -114,6 +345,56 @@ class SpotifyService:
         
         return self._format_track_data(data)
     
+    def get_tracks(self, track_ids):
+        """Obtém várias músicas pelo endpoint tracks?ids=, em blocos de 50.
+        
+        Retorna um dicionário spotify_id -> dados formatados das músicas
+        encontradas. Os ids cuja consulta falhou (Spotify indisponível) ficam
+        com None, para não serem confundidos com músicas inexistentes, que
+        não aparecem no dicionário.
+        """
+        tracks = {}
+        for chunk in self._track_chunks(track_ids):
+            missing = self._tracks_from_cache(chunk, tracks)
+            if missing:
+                self._add_tracks(self._make_request('tracks', {'ids': ','.join(missing)}), tracks, missing)
+        return tracks
+    
+    @staticmethod
+    def _track_chunks(track_ids):
+        """Ids sem repetição, em blocos aceitos pelo endpoint tracks?ids="""
+        track_ids = list(dict.fromkeys(track_ids))
+        return [track_ids[start:start + MAX_TRACKS_PER_REQUEST]
+                for start in range(0, len(track_ids), MAX_TRACKS_PER_REQUEST)]
+    
+    def _tracks_from_cache(self, chunk, tracks):
+        """Preenche tracks com as músicas já em cache e retorna os ids restantes"""
+        missing = []
+        for track_id in chunk:
+            cached = self.cache.get(f'tracks/{track_id}')
+            if cached is not None:
+                track_data = self._format_track_data(cached)
+                if track_data:
+                    tracks[track_id] = track_data
+            else:
+                missing.append(track_id)
+        return missing
+    
+    def _add_tracks(self, data, tracks, requested):
+        """Formata a resposta de tracks?ids= e guarda cada música no cache"""
+        if not data or 'tracks' not in data:
+            # Consulta falhou: os ids pedidos ficam como indisponíveis
+            tracks.update(dict.fromkeys(requested))
+            return
+        
+        for track in data['tracks']:
+            if not track:
+                continue
+            self.cache.set(f"tracks/{track['id']}", track)
+            track_data = self._format_track_data(track)
+            if track_data:
+                tracks[track['id']] = track_data
+    
     def get_track_features(self, track_id):
         """Obtém características de áudio de uma música"""
         data = self._make_request(f'audio-features/{track_id}')
@@ -0,0 +1,351 @@
+import gc
+import time
+import heapq
+import threading
+from bisect import bisect_left, insort
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session, object_session
+from app import db
+from app.models.music import Music
+from app.utils.text import normalize
+
+
+# Campos sugeridos, na ordem em que aparecem na chave
+KINDS = ('title', 'artist', 'album')
+
+# Máximo de sugestões por consulta
+MAX_SUGGESTIONS = 20
+
+# Prefixos que cobrem mais chaves que isso têm o resultado guardado
+# (calculado na construção e invalidado quando uma chave do prefixo
+# muda), para não percorrer milhares de entradas a cada tecla
+CACHE_MIN_RANGE = 1000
+
+# Uma sugestão (de índice i, no campo column) ainda tem música visível ao
+# usuário? {texts} são os parâmetros de todas as grafias da chave
+VISIBLE_CHECK = (
+    f'SELECT {{index}} WHERE EXISTS (SELECT 1 FROM {Music.__tablename__} '
+    'WHERE {column} IN ({texts}) AND (is_public = :public OR uploaded_by_id = :user_id))'
+)
+
+# Atributos que afetam o índice
+TRACKED_ATTRIBUTES = ('title', 'artist', 'album', 'is_public', 'uploaded_by_id', 'play_count')
+
+
+class PrefixIndex:
+    """Chaves ordenadas (texto normalizado + tipo) para busca por prefixo com bisect
+
+    Cada chave guarda as grafias originais que a formam (textos que só
+    diferem em maiúsculas ou acentos, com quantas músicas usam cada uma), o
+    tipo, quantas músicas a usam e a soma das reproduções dessas músicas,
+    que define a ordem das sugestões.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.entries = {}  # chave -> [{grafia: músicas}, tipo, músicas, reproduções]
+        self._top = {}  # prefixo -> melhores chaves
+
+    def load(self, entries):
+        """Substitui o conteúdo (construção inicial, ordena uma única vez)"""
+        self.entries = entries
+        self.keys = sorted(entries)
+        self._top = {}
+        self._top_in_range('', 0, len(self.keys))
+
+    def add(self, key, text, kind, count, plays):
+        """Soma (ou subtrai, com valores negativos) uma contribuição à chave"""
+        entry = self.entries.get(key)
+        if entry is None:
+            if count <= 0:
+                return
+            self.entries[key] = [{text: count}, kind, count, plays]
+            insort(self.keys, key)
+        else:
+            variants = entry[0]
+            variants[text] = variants.get(text, 0) + count
+            if variants[text] <= 0:
+                del variants[text]
+            entry[2] += count
+            entry[3] += plays
+            if entry[2] <= 0:
+                del self.entries[key]
+                del self.keys[bisect_left(self.keys, key)]
+
+        for size in range(1, len(key) + 1):
+            self._top.pop(key[:size], None)
+
+    def top(self, prefix, limit):
+        """As limit chaves mais tocadas que começam com o prefixo"""
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + '\U0010ffff', start)
+        return self._top_in_range(prefix, start, end)[:limit]
+
+    def _top_in_range(self, prefix, start, end):
+        """Melhores chaves de keys[start:end], todas com o prefixo dado.
+
+        Faixas pequenas são percorridas; as grandes combinam os melhores de
+        cada prefixo um caractere maior (recursivamente, guardando o
+        resultado), de modo que só o caminho invalidado é recalculado.
+        """
+        if end - start <= CACHE_MIN_RANGE:
+            return self._best(self.keys[start:end], MAX_SUGGESTIONS)
+
+        best = self._top.get(prefix)
+        if best is None:
+            candidates = []
+            size = len(prefix) + 1
+            while start < end:
+                child = self.keys[start][:size]
+                child_end = bisect_left(self.keys, child + '\U0010ffff', start, end)
+                candidates.extend(self._top_in_range(child, start, child_end))
+                start = child_end
+            best = self._top[prefix] = self._best(candidates, MAX_SUGGESTIONS)
+        return best
+
+    def _best(self, keys, limit):
+        return heapq.nlargest(limit, keys, key=lambda key: (self.entries[key][3], self.entries[key][2]))
+
+
+class SuggestIndex:
+    """Índice em memória para autocompletar títulos, artistas e álbuns
+
+    Construído a partir do banco na inicialização (em segundo plano) e
+    atualizado a cada commit que cria, altera ou remove músicas. Músicas
+    públicas ficam em um índice compartilhado; as privadas, em um índice
+    por dono, consultado apenas para ele.
+
+    Cada processo só vê os próprios commits: o que outro worker muda chega
+    ao índice na próxima reconstrução (a cada SUGGEST_REBUILD_INTERVAL
+    segundos). Por isso as sugestões finais são conferidas no banco antes
+    de sair, e uma música removida ou tornada privada em outro worker não
+    é sugerida a quem não a vê mais.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.built = False
+        self.rebuild_interval = 600.0
+        self._public = PrefixIndex()
+        self._private = {}  # dono -> PrefixIndex
+        self._lock = threading.RLock()
+
+    def init_app(self, app):
+        self.app = app
+        self.rebuild_interval = app.config.get('SUGGEST_REBUILD_INTERVAL', self.rebuild_interval)
+        with self._lock:
+            self.built = False
+            self._public = PrefixIndex()
+            self._private = {}
+        if app.config.get('SUGGEST_PRELOAD'):
+            threading.Thread(target=self._preload, name='suggest-index', daemon=True).start()
+
+    def _preload(self):
+        """Constrói o índice e o reconstrói periodicamente (mudanças de outros workers)"""
+        build = self.ensure_built
+        while True:
+            try:
+                with self.app.app_context():
+                    build()
+            except Exception as e:
+                print(f"❌ Erro ao construir o índice de sugestões: {str(e)}")
+            if not self.rebuild_interval:
+                return
+            time.sleep(self.rebuild_interval)
+            build = self.build
+
+    def ensure_built(self):
+        if not self.built:
+            with self._lock:
+                if not self.built:
+                    self.build()
+
+    def build(self):
+        """(Re)constrói o índice a partir de todas as músicas do banco"""
+        rows = Music.query.with_entities(
+            Music.uploaded_by_id, Music.is_public, Music.play_count,
+            Music.title, Music.artist, Music.album
+        ).yield_per(10000)
+
+        # Milhões de listas pequenas: sem o coletor de ciclos durante a carga,
+        # que do contrário percorreria o índice inteiro várias vezes
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            public, private = self._load_entries(rows)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        with self._lock:
+            self._public = PrefixIndex()
+            self._public.load(public)
+            self._private = {}
+            for owner, entries in private.items():
+                self._private[owner] = PrefixIndex()
+                self._private[owner].load(entries)
+            self.built = True
+
+    @staticmethod
+    def _load_entries(rows):
+        """Agrega as músicas por chave: {chave: [{grafia: músicas}, tipo, músicas, reproduções]}"""
+        public, private = {}, {}
+        repeated = {}  # (tipo, texto) -> chave; artistas e álbuns se repetem muito
+        for owner, is_public, plays, *texts in rows:
+            entries = public if is_public else private.setdefault(owner, {})
+            for kind, text in zip(KINDS, texts):
+                key = repeated.get((kind, text))
+                if key is None:
+                    key = normalize(text)
+                    key = f'{key}\x00{kind}' if key else ''
+                    if kind != 'title':
+                        repeated[(kind, text)] = key
+                if not key:
+                    continue
+                entry = entries.get(key)
+                if entry is None:
+                    entries[key] = [{text: 1}, kind, 1, plays or 0]
+                else:
+                    entry[0][text] = entry[0].get(text, 0) + 1
+                    entry[2] += 1
+                    entry[3] += plays or 0
+        return public, private
+
+    def suggest(self, prefix, user_id=None, limit=10):
+        """Sugestões para o prefixo, visíveis ao usuário, mais tocadas primeiro"""
+        prefix = normalize(prefix)
+        limit = max(1, min(limit, MAX_SUGGESTIONS))
+        if not prefix:
+            return []
+
+        with self._lock:
+            indexes = [self._public]
+            if user_id in self._private:
+                indexes.append(self._private[user_id])
+
+            merged, variants = {}, {}
+            for index in indexes:
+                for key in index.top(prefix, limit):
+                    texts, kind, count, plays = index.entries[key]
+                    if key in merged:
+                        merged[key]['count'] += count
+                        merged[key]['play_count'] += plays
+                        for text, uses in texts.items():
+                            variants[key][text] = variants[key].get(text, 0) + uses
+                    else:
+                        merged[key] = {'text': None, 'type': kind, 'count': count, 'play_count': plays}
+                        variants[key] = dict(texts)
+
+        # Sugere a grafia mais usada
+        for key, item in merged.items():
+            item['text'] = max(variants[key], key=variants[key].get)
+
+        # Candidatos a mais, para completar o limite se algum não passar na conferência
+        candidates = heapq.nlargest(MAX_SUGGESTIONS, merged,
+                                    key=lambda key: (merged[key]['play_count'], merged[key]['count']))
+        suggestions = []
+        while candidates and len(suggestions) < limit:
+            batch = candidates[:limit - len(suggestions)]
+            candidates = candidates[len(batch):]
+            visible = self._visible([(merged[key]['type'], list(variants[key])) for key in batch], user_id)
+            suggestions.extend(merged[key] for i, key in enumerate(batch) if i in visible)
+        return suggestions
+
+    @staticmethod
+    def _visible(suggestions, user_id):
+        """Índices das sugestões (tipo, grafias) que ainda têm uma música visível ao usuário
+
+        Uma única query com um EXISTS por sugestão, que para na primeira
+        música encontrada pelos índices de título, artista e álbum. Todas as
+        grafias da chave são conferidas: se a música de uma delas some,
+        as outras continuam sugeridas. O SQL é montado como texto: gerar a
+        chave de cache de um select com dezenas de EXISTS custaria mais que
+        a própria consulta.
+        """
+        if not suggestions:
+            return set()
+
+        params = {'public': True, 'user_id': user_id}
+        checks = []
+        for i, (kind, texts) in enumerate(suggestions):
+            names = [f'text{i}_{j}' for j in range(len(texts))]
+            params.update(zip(names, texts))
+            checks.append(VISIBLE_CHECK.format(index=i, column=kind,
+                                               texts=', '.join(f':{name}' for name in names)))
+        return set(db.session.scalars(text(' UNION ALL '.join(checks)), params))
+
+    def apply(self, changes):
+        """Aplica uma lista de (antes, depois) de músicas; None quando não existe"""
+        with self._lock:
+            if not self.built:
+                return  # a construção lerá o estado atual do banco
+            for old, new in changes:
+                if old is not None:
+                    self._contribute(old, -1)
+                if new is not None:
+                    self._contribute(new, 1)
+
+    def _contribute(self, snapshot, sign):
+        owner, is_public, plays, *texts = snapshot
+        if is_public:
+            index = self._public
+        else:
+            index = self._private.setdefault(owner, PrefixIndex())
+
+        for kind, text in zip(KINDS, texts):
+            key = normalize(text)
+            if key:
+                index.add(f'{key}\x00{kind}', text, kind, sign, sign * (plays or 0))
+
+
+# Instância global do índice
+suggest_index = SuggestIndex()
+
+
+def _snapshot(target, previous=False):
+    """(dono, pública, reproduções, título, artista, álbum) da música"""
+    state = inspect(target)
+    values = []
+    for attribute in ('uploaded_by_id', 'is_public', 'play_count', 'title', 'artist', 'album'):
+        history = state.attrs[attribute].history
+        if previous and history.deleted:
+            values.append(history.deleted[0])
+        else:
+            values.append(getattr(target, attribute))
+    return tuple(values)
+
+
+def _queue_change(target, old, new):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('suggest_changes', []).append((old, new))
+
+
+@event.listens_for(Music, 'after_insert')
+def _music_inserted(mapper, connection, target):
+    _queue_change(target, None, _snapshot(target))
+
+
+@event.listens_for(Music, 'after_update')
+def _music_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[attribute].history.has_changes() for attribute in TRACKED_ATTRIBUTES):
+        _queue_change(target, _snapshot(target, previous=True), _snapshot(target))
+
+
+@event.listens_for(Music, 'after_delete')
+def _music_deleted(mapper, connection, target):
+    _queue_change(target, _snapshot(target, previous=True), None)
+
+
+# As mudanças só entram no índice depois do commit; rollback as descarta
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    changes = session.info.pop('suggest_changes', None)
+    if changes:
+        suggest_index.apply(changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('suggest_changes', None)
@@ -0,0 +1,233 @@
+import math
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models.revoked_token import RevokedToken
+
+
+class BloomFilter:
+    """Filtro de Bloom: "talvez contenha" ou "com certeza não contém"
+
+    Os k bits de cada chave saem de um único blake2b (hashing duplo).
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        # Tamanho e quantidade de hashes ótimos para a capacidade e a taxa de erro
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class TokenBlocklist:
+    """Revogação de JWTs compartilhada entre os workers
+
+    A fonte da verdade é a tabela revoked_tokens. Cada processo mantém um
+    filtro de Bloom com os jti revogados, de modo que a verificação de um
+    token válido (o caso comum) não consulta o banco; só os "talvez" do
+    filtro vão ao banco, com o resultado guardado em um LRU.
+
+    Revogações feitas por outros workers entram no filtro na sincronização
+    incremental, feita no máximo a cada sync_interval segundos (esse é o
+    atraso máximo para um logout valer em todos os workers; 0 sincroniza a
+    cada verificação). A cada reload_interval os tokens expirados são
+    apagados e o filtro é reconstruído, em uma thread de fundo: a
+    verificação de um token só lê, e nunca pela sessão da requisição.
+    """
+
+    # Margem para revogações gravadas por transações que terminaram fora de ordem
+    SYNC_OVERLAP = timedelta(seconds=30)
+
+    def __init__(self):
+        self.app = None
+        self.sync_interval = 5.0
+        self.reload_interval = 3600.0
+        self.max_cached = 10000
+        self._bloom = BloomFilter(10000)
+        self._cache = OrderedDict()  # jti -> revogado
+        self._synced_at = None  # revoked_at até onde o filtro foi sincronizado
+        self._last_sync = None  # time.monotonic() da última sincronização
+        self._last_reload = None
+        self._loading = None  # jtis marcados como revogados durante um _load
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._reload_thread = None
+        self._stats = {'checks': 0, 'bloom_negatives': 0, 'cache_hits': 0, 'db_lookups': 0, 'syncs': 0}
+
+    def init_app(self, app):
+        self.app = app
+        self.sync_interval = app.config.get('TOKEN_BLOCKLIST_SYNC_INTERVAL', self.sync_interval)
+        self.reload_interval = app.config.get('TOKEN_BLOCKLIST_RELOAD_INTERVAL', self.reload_interval)
+        with self._lock:
+            self._bloom = BloomFilter(10000)
+            self._cache = OrderedDict()
+            self._synced_at = None
+            self._loading = None
+            self._last_sync = self._last_reload = None
+            self._stats = dict.fromkeys(self._stats, 0)
+
+    def revoke(self, jti, expires_at):
+        """Revoga o token (expires_at: datetime UTC ou timestamp do claim exp)"""
+        if not isinstance(expires_at, datetime):
+            expires_at = datetime.utcfromtimestamp(expires_at)
+
+        db.session.add(RevokedToken(jti=jti, expires_at=expires_at))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # já revogado
+
+        with self._lock:
+            self._mark_revoked(jti)
+            self._remember(jti, True)
+
+    def is_revoked(self, jti):
+        """Verifica se o token foi revogado (sem I/O para tokens válidos)"""
+        self._refresh()
+        with self._lock:
+            self._stats['checks'] += 1
+            if jti not in self._bloom:
+                self._stats['bloom_negatives'] += 1
+                return False
+            if jti in self._cache:
+                self._stats['cache_hits'] += 1
+                self._cache.move_to_end(jti)
+                return self._cache[jti]
+
+        # Talvez revogado: confirmar no banco
+        revoked = db.session.get(RevokedToken, jti) is not None
+        with self._lock:
+            self._stats['db_lookups'] += 1
+            if revoked:
+                self._mark_revoked(jti)
+            self._remember(jti, revoked)
+        return revoked
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'cached': len(self._cache)}
+
+    def _mark_revoked(self, jti):
+        """Acrescenta o jti ao filtro (e ao próximo, se um _load está em andamento)"""
+        self._bloom.add(jti)
+        if self._loading is not None:
+            self._loading.add(jti)
+
+    def _remember(self, jti, revoked):
+        self._cache[jti] = revoked
+        self._cache.move_to_end(jti)
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def _due(last, interval, now):
+        return last is None or now - last >= interval
+
+    def _refresh(self):
+        now = time.monotonic()
+        if not self._due(self._last_sync, self.sync_interval, now):
+            return
+        # Um thread sincroniza; os demais seguem com o filtro atual
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            if not self._due(self._last_sync, self.sync_interval, now):
+                return
+            if self._synced_at is None:
+                self._load()  # primeira carga: o filtro ainda está vazio
+                self._last_reload = now
+            else:
+                self._sync()
+                if self._due(self._last_reload, self.reload_interval, now):
+                    self._last_reload = now
+                    self._start_reload()
+            self._last_sync = now
+        finally:
+            self._refresh_lock.release()
+
+    # _sync e _load rodam dentro da verificação do token de uma requisição:
+    # leem por uma conexão própria, nunca pela sessão da requisição (que pode
+    # ter alterações pendentes e não deve ser confirmada por uma leitura)
+
+    def _sync(self):
+        """Acrescenta ao filtro as revogações feitas desde a última sincronização"""
+        started = datetime.utcnow()
+        table = RevokedToken.__table__
+        with db.engine.connect() as connection:
+            rows = connection.execute(
+                select(table.c.jti).where(table.c.revoked_at >= self._synced_at - self.SYNC_OVERLAP)
+            ).all()
+        with self._lock:
+            for (jti,) in rows:
+                self._mark_revoked(jti)
+                if jti in self._cache:
+                    self._cache[jti] = True  # "não revogado" guardado antes da revogação
+            self._synced_at = started
+            self._stats['syncs'] += 1
+
+    def _load(self):
+        """Reconstrói o filtro com todos os tokens revogados
+
+        Revogações registradas neste processo enquanto a leitura roda (e que
+        ela pode não ter visto) são guardadas em _loading e somadas ao novo
+        filtro antes da troca.
+        """
+        started = datetime.utcnow()
+        with self._lock:
+            self._loading = set()
+        try:
+            table = RevokedToken.__table__
+            with db.engine.connect() as connection:
+                jtis = {jti for (jti,) in connection.execute(select(table.c.jti))}
+            bloom = BloomFilter(max(10000, 2 * len(jtis)))
+            for jti in jtis:
+                bloom.add(jti)
+            with self._lock:
+                jtis |= self._loading
+                for jti in self._loading:
+                    bloom.add(jti)
+                self._bloom = bloom
+                self._cache = OrderedDict((jti, True) for jti in self._cache if jti in jtis)
+                self._synced_at = started
+                self._stats['syncs'] += 1
+        finally:
+            with self._lock:
+                self._loading = None
+
+    def _start_reload(self):
+        if self.app is None or (self._reload_thread and self._reload_thread.is_alive()):
+            return
+        self._reload_thread = threading.Thread(target=self._reload, name='token-blocklist-reload', daemon=True)
+        self._reload_thread.start()
+
+    def _reload(self):
+        """Apaga os tokens expirados e reconstrói o filtro com os restantes (thread de fundo)"""
+        try:
+            with self.app.app_context():
+                table = RevokedToken.__table__
+                with db.engine.begin() as connection:
+                    connection.execute(delete(table).where(table.c.expires_at < datetime.utcnow()))
+                self._load()
+        except Exception as e:
+            print(f"❌ Erro ao limpar tokens revogados: {str(e)}")
+
+
+# Instância global da lista de revogação
+token_blocklist = TokenBlocklist()
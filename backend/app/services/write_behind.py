@@ -0,0 +1,141 @@
+import atexit
+import threading
+import time
+
+
+class WriteBehindBuffer:
+    """Base dos buffers write-behind (contadores de reprodução, último login)
+
+    As escritas são acumuladas em memória e gravadas em lote, em uma única
+    transação, por uma thread de fundo: a cada flush_interval segundos ou
+    quando o buffer atinge flush_threshold itens. Se a gravação falha o
+    lote volta ao buffer para a próxima tentativa; no encerramento do
+    processo o que estiver pendente é gravado.
+
+    As subclasses definem o formato do buffer (_empty, _depth, _size,
+    _restore) e os UPDATEs (_write); config_prefix dá o nome das
+    configurações <prefixo>_FLUSH_INTERVAL e <prefixo>_FLUSH_THRESHOLD.
+    """
+
+    config_prefix = None
+    thread_name = 'write-behind-flush'
+    flushed_stat = 'flushed_items'
+    error_message = 'Erro ao gravar buffer'
+
+    def __init__(self):
+        self.app = None
+        self.flush_interval = 5.0
+        self.flush_threshold = 1000
+        self._pending = self._empty()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stopped = False
+        self._registered = False
+        self._stats = {
+            'flushes': 0,
+            self.flushed_stat: 0,
+            'failed_flushes': 0,
+            'last_flush_ms': None,
+            'max_flush_ms': None
+        }
+
+    def init_app(self, app):
+        """Configura o buffer a partir da aplicação"""
+        self.app = app
+        self.flush_interval = app.config.get(f'{self.config_prefix}_FLUSH_INTERVAL', self.flush_interval)
+        self.flush_threshold = app.config.get(f'{self.config_prefix}_FLUSH_THRESHOLD', self.flush_threshold)
+        if not self._registered:
+            atexit.register(self.shutdown)
+            self._registered = True
+
+    def flush(self):
+        """Grava no banco tudo o que está no buffer; retorna quantos itens gravou"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, self._empty()
+
+            if not self._depth(batch) or self.app is None:
+                return 0
+
+            start = time.perf_counter()
+            try:
+                from app import db
+                with self.app.app_context():
+                    with db.engine.begin() as connection:
+                        self._write(connection, batch)
+            except Exception as e:
+                # Devolver ao buffer para a próxima tentativa
+                with self._lock:
+                    self._restore(batch)
+                    self._stats['failed_flushes'] += 1
+                print(f"❌ {self.error_message}: {str(e)}")
+                return 0
+
+            elapsed = (time.perf_counter() - start) * 1000
+            flushed = self._size(batch)
+            with self._lock:
+                self._stats['flushes'] += 1
+                self._stats[self.flushed_stat] += flushed
+                self._stats['last_flush_ms'] = round(elapsed, 3)
+                self._stats['max_flush_ms'] = round(max(elapsed, self._stats['max_flush_ms'] or 0), 3)
+            return flushed
+
+    def metrics(self):
+        """Profundidade do buffer e latência dos flushes"""
+        with self._lock:
+            return {**self._pending_metrics(), **self._stats}
+
+    def shutdown(self):
+        """Para a thread de flush e grava o que estiver pendente"""
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def _recorded(self, depth):
+        """Chamado após cada registro, com o número de itens no buffer"""
+        self._ensure_thread()
+        if depth >= self.flush_threshold:
+            self._wakeup.set()
+
+    def _ensure_thread(self):
+        if self._thread is not None or self._stopped:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if not self._stopped:
+                self.flush()
+
+    # Formato do buffer (_restore e _pending_metrics são chamados com self._lock)
+
+    def _empty(self):
+        raise NotImplementedError
+
+    def _depth(self, buffer):
+        """Quantas chaves distintas o buffer tem"""
+        raise NotImplementedError
+
+    def _size(self, batch):
+        """Quantos itens o lote gravou (para as estatísticas)"""
+        return self._depth(batch)
+
+    def _restore(self, batch):
+        """Devolve ao buffer um lote cuja gravação falhou"""
+        raise NotImplementedError
+
+    def _pending_metrics(self):
+        return {}
+
+    def _write(self, connection, batch):
+        """Executa os UPDATEs do lote na transação recebida"""
+        raise NotImplementedError
@@ -0,0 +1,191 @@
+import json
+import math
+import time
+import base64
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+# Modos de contagem do total: exact (COUNT a cada página), estimated
+# (estimativa do planejador no PostgreSQL; nos demais bancos, COUNT guardado
+# por COUNT_CACHE_TTL segundos) ou none (sem total)
+COUNT_MODES = ('exact', 'estimated', 'none')
+COUNT_CACHE_TTL = 60
+COUNT_CACHE_SIZE = 1000
+
+_count_cache = OrderedDict()  # (sql, parâmetros) -> (expira_em, total)
+_count_cache_lock = threading.Lock()
+
+
+class InvalidPagination(ValueError):
+    """Parâmetros de paginação inválidos"""
+
+
+class InvalidCursor(InvalidPagination):
+    """Cursor de paginação malformado ou adulterado"""
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    raise TypeError(f'Tipo não suportado no cursor: {type(value).__name__}')
+
+
+# Maior inteiro aceito em um cursor (BIGINT)
+MAX_CURSOR_INT = 2 ** 63 - 1
+
+
+def _decode_value(obj):
+    if set(obj) == {'dt'}:
+        return datetime.fromisoformat(obj['dt'])
+    return obj
+
+
+def encode_cursor(values):
+    """Serializa os valores da chave de ordenação em um token opaco"""
+    payload = json.dumps(list(values), default=_encode_value, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, size):
+    """Recupera os valores da chave de ordenação a partir do token"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()), object_hook=_decode_value)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e))
+
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor('Tamanho do cursor inválido')
+    # Só os tipos que encode_cursor produz (um cursor adulterado não chega ao SQL)
+    for value in values:
+        if value is None or isinstance(value, datetime):
+            continue
+        if type(value) is not int or abs(value) > MAX_CURSOR_INT:
+            raise InvalidCursor('Valor inválido no cursor')
+    return values
+
+
+def keyset_filter(columns, values, descending=False):
+    """Condição "linha depois do cursor" para colunas na mesma direção.
+
+    Expande (a, b, c) > (x, y, z) (ou < em ordem descendente) em ORs de
+    igualdades encadeadas, o que funciona tanto no SQLite quanto no
+    PostgreSQL e aproveita índices compostos na mesma ordem.
+    """
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        equals = [columns[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equals, column < value if descending else column > value))
+    return or_(*clauses)
+
+
+def planner_estimate(query):
+    """Linhas estimadas pelo planejador do PostgreSQL (EXPLAIN), sem executar a query
+
+    None em outros bancos.
+    """
+    connection = query.session.connection()
+    dialect = connection.dialect
+    if dialect.name != 'postgresql':
+        return None
+
+    compiled = query.statement.compile(dialect=dialect, compile_kwargs={'render_postcompile': True})
+    rows = connection.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {compiled}', compiled.params).fetchall()
+    return int(rows[0][0][0]['Plan']['Plan Rows'])
+
+
+def count_rows(query, mode='exact'):
+    """Total de linhas da query
+
+    No modo estimated, usa a estimativa do planejador no PostgreSQL (não
+    percorre as linhas); nos demais bancos, reaproveita o COUNT recente.
+    """
+    if mode == 'none':
+        return None
+
+    count_query = query.order_by(None)
+    if mode == 'exact':
+        return count_query.count()
+
+    estimate = planner_estimate(count_query)
+    if estimate is not None:
+        return estimate
+
+    compiled = count_query.statement.compile()
+    key = (str(compiled), repr(sorted(compiled.params.items())))
+    now = time.monotonic()
+    with _count_cache_lock:
+        cached = _count_cache.get(key)
+        if cached and cached[0] > now:
+            _count_cache.move_to_end(key)
+            return cached[1]
+
+    total = count_query.count()
+    with _count_cache_lock:
+        _count_cache[key] = (now + COUNT_CACHE_TTL, total)
+        _count_cache.move_to_end(key)
+        while len(_count_cache) > COUNT_CACHE_SIZE:
+            _count_cache.popitem(last=False)
+    return total
+
+
+def paginate(query, sort_columns, args, order_by=(), default_per_page=20, max_per_page=100):
+    """Pagina a query por página (page/per_page) ou por cursor (keyset).
+
+    sort_columns é a chave de ordenação única, em ordem descendente (por
+    exemplo created_at, id); order_by são critérios anteriores a ela, como
+    a relevância de uma busca, que não permitem cursor. Com ?cursor= a
+    página seguinte é lida a partir da última linha da anterior, sem
+    OFFSET; ?count= escolhe como o total é obtido (COUNT_MODES).
+
+    Retorna (itens, metadados para a resposta).
+    """
+    per_page = min(max(args.get('per_page', default_per_page, type=int), 1), max_per_page)
+    count_mode = args.get('count', 'exact')
+    if count_mode not in COUNT_MODES:
+        raise InvalidPagination(f"count deve ser um de: {', '.join(COUNT_MODES)}")
+
+    cursor = args.get('cursor')
+    if cursor is not None and order_by:
+        raise InvalidPagination('Paginação por cursor não disponível com ordenação por relevância')
+
+    total = count_rows(query, count_mode)
+
+    sort_columns = list(sort_columns)
+    page_query = query.add_columns(*sort_columns).order_by(
+        *order_by, *(column.desc() for column in sort_columns)
+    )
+
+    if cursor is not None:
+        page = None
+        values = decode_cursor(cursor, len(sort_columns))
+        page_query = page_query.filter(keyset_filter(sort_columns, values, descending=True))
+    else:
+        page = max(args.get('page', 1, type=int), 1)
+        page_query = page_query.offset((page - 1) * per_page)
+
+    rows = page_query.limit(per_page + 1).all()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+
+    width = len(rows[0]) - len(sort_columns) if rows else 0
+    items = [row[0] if width == 1 else tuple(row[:width]) for row in rows]
+    next_cursor = None
+    if has_next and not order_by:
+        next_cursor = encode_cursor(rows[-1][width:])
+
+    meta = {
+        'total': total,
+        'per_page': per_page,
+        'has_next': has_next,
+        'next_cursor': next_cursor
+    }
+    if page is not None:
+        meta.update({
+            'pages': math.ceil(total / per_page) if total is not None else None,
+            'current_page': page,
+            'has_prev': page > 1
+        })
+    return items, meta
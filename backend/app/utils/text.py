@@ -0,0 +1,10 @@
+import unicodedata
+
+
+def normalize(text):
+    """Minúsculas, sem acentos e com espaços simples"""
+    text = text or ''
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.lower().split())
@@ -0,0 +1,536 @@
+#!/usr/bin/env python3
+"""
+Benchmarks dos endpoints da API
+
+Uso:
+    python benchmark.py            # executa todos os benchmarks
+    python benchmark.py dashboard  # executa apenas o benchmark escolhido
+"""
+import os
+import sys
+import time
+import random
+import json
+import argparse
+import threading
+import statistics
+import tempfile
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Banco em memória, isolado do banco de desenvolvimento
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ['SUGGEST_PRELOAD'] = 'false'
+
+from sqlalchemy import event
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app.models.user import User
+from app.models.task_list import TaskList
+from app.models.task import Task
+from app.models.music import Music, playlist_music
+from app.models.playlist import Playlist, POSITION_GAP
+from app.services.spotify_service import SpotifyService
+from app.services.async_spotify_service import AsyncSpotifyService
+from app.services.music_search import music_search
+from app.services.suggest_index import suggest_index
+from app.services.fuzzy_search import fuzzy_search
+from app.services.current_user import current_user_loader
+from app.services.password_hasher import password_hasher, hash_password, verify_password
+from app.services.last_login import last_login_recorder
+
+
+def create_bench_app():
+    """Cria a aplicação com um banco de dados vazio"""
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def create_bench_user(username='bench'):
+    """Cria um usuário e retorna (usuário, headers de autenticação)"""
+    user = User(
+        username=username,
+        email=f'{username}@bench.local',
+        first_name='Bench',
+        last_name='User'
+    )
+    user.set_password('bench123')
+    db.session.add(user)
+    db.session.commit()
+
+    token = create_access_token(identity=user.id)
+    return user, {'Authorization': f'Bearer {token}'}
+
+
+def measure(client, url, headers, runs=20, method='GET', json=None):
+    """Executa a requisição várias vezes e retorna a mediana em ms"""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        response = client.open(url, method=method, headers=headers, json=json)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code < 300, response.get_json()
+    return statistics.median(timings)
+
+
+def seed_tasks(user_id, task_list_id, count):
+    """Insere tarefas aleatórias com um único executemany"""
+    now = datetime.utcnow()
+    priorities = [p['value'] for p in Task.get_priorities()]
+    rows = []
+    for i in range(count):
+        completed = random.random() < 0.4
+        rows.append({
+            'title': f'Tarefa {i}',
+            'description': '',
+            'completed': completed,
+            'priority': random.choice(priorities),
+            'due_date': now + timedelta(days=random.randint(-30, 30)) if random.random() < 0.7 else None,
+            'completed_at': now if completed else None,
+            'task_list_id': task_list_id,
+            'user_id': user_id,
+            'created_at': now - timedelta(days=random.randint(0, 60)),
+            'updated_at': now
+        })
+    if rows:
+        db.session.execute(Task.__table__.insert(), rows)
+        db.session.commit()
+
+
+def bench_dashboard():
+    """GET /api/tasks/dashboard com 100 a 100k tarefas"""
+    app = create_bench_app()
+
+    with app.app_context():
+        user, headers = create_bench_user()
+        task_list = TaskList.create_default_list(user.id)
+
+        print(f"{'tarefas':>10} | {'mediana (ms)':>12}")
+        seeded = 0
+        with app.test_client() as client:
+            for size in (100, 1000, 10000, 100000):
+                seed_tasks(user.id, task_list.id, size - seeded)
+                seeded = size
+                elapsed = measure(client, '/api/tasks/dashboard', headers)
+                print(f"{size:>10} | {elapsed:>12.2f}")
+
+
+def seed_music(count, uploaded_by_id=None):
+    """Insere músicas com um único executemany e retorna seus ids"""
+    now = datetime.utcnow()
+    first_id = (db.session.query(db.func.max(Music.id)).scalar() or 0) + 1
+    db.session.execute(Music.__table__.insert(), [{
+        'title': f'Música {i}',
+        'artist': f'Artista {i % 500}',
+        'album': f'Álbum {i % 2000}',
+        'duration': random.randint(90, 420),
+        'is_local': False,
+        'is_public': True,
+        'play_count': 0,
+        'uploaded_by_id': uploaded_by_id,
+        'created_at': now,
+        'updated_at': now
+    } for i in range(count)])
+    db.session.commit()
+    return list(range(first_id, first_id + count))
+
+
+def seed_playlist(owner_id, music_ids):
+    """Cria uma playlist com as músicas informadas"""
+    playlist = Playlist(name='Playlist grande', owner_id=owner_id)
+    db.session.add(playlist)
+    db.session.flush()
+    now = datetime.utcnow()
+    db.session.execute(playlist_music.insert(), [
+        {'playlist_id': playlist.id, 'music_id': music_id, 'position': (i + 1) * POSITION_GAP, 'added_at': now}
+        for i, music_id in enumerate(music_ids)
+    ])
+    db.session.commit()
+    return playlist
+
+
+def bench_duplicate():
+    """POST /api/playlists/<id>/duplicate com 100 a 10k músicas"""
+    app = create_bench_app()
+
+    with app.app_context():
+        user, headers = create_bench_user()
+
+        print(f"{'músicas':>10} | {'mediana (ms)':>12}")
+        with app.test_client() as client:
+            for size in (100, 1000, 10000):
+                playlist = seed_playlist(user.id, seed_music(size))
+                elapsed = measure(client, f'/api/playlists/{playlist.id}/duplicate', headers,
+                                  runs=5, method='POST', json={})
+                print(f"{size:>10} | {elapsed:>12.2f}")
+
+
+@contextmanager
+def mock_spotify_server(latency):
+    """Servidor local que responde token e tracks/<id> após a latência dada"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            self._reply({'access_token': 'bench', 'expires_in': 3600})
+
+        def do_GET(self):
+            time.sleep(latency)
+            track_id = self.path.split('?')[0].rsplit('/', 1)[1]
+            self._reply({'id': track_id, 'name': track_id, 'artists': [], 'album': {}, 'duration_ms': 0})
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def bench_spotify_fanout():
+    """50 consultas tracks/<id> ao Spotify: síncrono em sequência x assíncrono em paralelo"""
+    track_ids = [f'faixa{i}' for i in range(50)]
+
+    print(f"{'latência (ms)':>14} | {'síncrono (ms)':>14} | {'assíncrono (ms)':>16}")
+    for latency in (0.005, 0.02, 0.1):
+        with mock_spotify_server(latency) as url:
+            timings = []
+            for service in (SpotifyService(), AsyncSpotifyService()):
+                service.client_id, service.client_secret = 'bench', 'bench'
+                service.base_url, service.auth_url = f'{url}/v1', f'{url}/api/token'
+                service.cache.clear()
+                if isinstance(service, AsyncSpotifyService):
+                    lookup = service.get_many_tracks
+                else:
+                    lookup = lambda ids: [service.get_track(track_id) for track_id in ids]
+
+                lookup(['aquecimento'])  # token, conexão e event loop fora da medição
+                start = time.perf_counter()
+                lookup(track_ids)
+                timings.append((time.perf_counter() - start) * 1000)
+            service.close()
+        print(f"{latency * 1000:>14.0f} | {timings[0]:>14.2f} | {timings[1]:>16.2f}")
+
+
+WORDS = ('amor', 'coração', 'saudade', 'mar', 'canção', 'noite', 'sol', 'lua', 'céu', 'vida',
+         'samba', 'rio', 'estrela', 'sertão', 'paixão', 'menina', 'tempo', 'luz', 'caminho', 'festa')
+
+
+def seed_catalog(count, batch_size=50000):
+    """Insere músicas com títulos, artistas e álbuns variados (com acentos)"""
+    now = datetime.utcnow()
+    for start in range(0, count, batch_size):
+        db.session.execute(Music.__table__.insert(), [{
+            'title': ' '.join(random.sample(WORDS, 3)) + f' {i}',
+            'artist': f'{random.choice(WORDS).title()} {i % 5000}',
+            'album': ' '.join(random.sample(WORDS, 2)).title(),
+            'is_local': False,
+            'is_public': True,
+            'play_count': 0,
+            'created_at': now,
+            'updated_at': now
+        } for i in range(start, min(start + batch_size, count))])
+        db.session.commit()
+
+
+def bench_search():
+    """GET /api/music/?search= com 10k a 1M músicas: ILIKE x índice de busca textual"""
+    app = create_bench_app()
+    searches = ('saudade', 'cora ser', 'estrela 4321')
+
+    with app.app_context():
+        user, headers = create_bench_user()
+        backend = music_search.backend
+
+        print(f"{'músicas':>10} | {'busca':>14} | {'ilike (ms)':>10} | {backend + ' (ms)':>12}")
+        seeded = 0
+        with app.test_client() as client:
+            for size in (10000, 100000, 1000000):
+                seed_catalog(size - seeded)
+                seeded = size
+                for search in searches:
+                    url = f'/api/music/?search={search}'
+                    timings = []
+                    for name in ('like', backend):
+                        music_search.backend = name
+                        timings.append(measure(client, url, headers, runs=5))
+                    print(f"{size:>10} | {search:>14} | {timings[0]:>10.2f} | {timings[1]:>12.2f}")
+
+
+def bench_fuzzy():
+    """GET /api/music/?search= com 10k a 100k músicas: ILIKE x mode=fuzzy (trigramas)"""
+    app = create_bench_app()
+    searches = ('saudade', 'coracao', 'estrella 4321')
+
+    with app.app_context():
+        user, headers = create_bench_user()
+        music_search.backend = 'like'  # modo texto como ILIKE, para comparação
+
+        print(f"{'músicas':>10} | {'busca':>14} | {'ilike (ms)':>10} | {'total':>6} | "
+              f"{fuzzy_search.backend + ' (ms)':>13} | {'total':>6}")
+        seeded = 0
+        with app.test_client() as client:
+            for size in (10000, 100000):
+                seed_catalog(size - seeded)
+                seeded = size
+
+                fuzzy_search.init_app(app)  # descarta o índice em memória
+                start = time.perf_counter()
+                fuzzy_search.index('music')
+                print(f"construção do índice em memória ({size} músicas): {time.perf_counter() - start:.1f}s")
+
+                for search in searches:
+                    results = []
+                    for mode in ('text', 'fuzzy'):
+                        url = f'/api/music/?search={search}&mode={mode}'
+                        results.append(measure(client, url, headers, runs=5))
+                        results.append(client.get(url, headers=headers).get_json()['total'])
+                    print(f"{size:>10} | {search:>14} | {results[0]:>10.2f} | {results[1]:>6} | "
+                          f"{results[2]:>13.2f} | {results[3]:>6}")
+
+
+def percentile(timings, fraction):
+    """Percentil (0 a 1) de uma lista de tempos"""
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def bench_suggest():
+    """GET /api/music/suggest com 1M músicas: construção do índice e p50/p99 por consulta"""
+    app = create_bench_app()
+
+    with app.app_context():
+        user, headers = create_bench_user()
+        seed_catalog(1000000)
+
+        start = time.perf_counter()
+        suggest_index.build()
+        print(f"construção do índice: {time.perf_counter() - start:.1f}s")
+
+        prefixes = [random.choice(WORDS)[:random.randint(1, 6)] for _ in range(2000)]
+        timings = []
+        for prefix in prefixes:
+            start = time.perf_counter()
+            suggest_index.suggest(prefix, user.id)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        http_timings = []
+        with app.test_client() as client:
+            for prefix in prefixes[:500]:
+                start = time.perf_counter()
+                client.get('/api/music/suggest', headers=headers, query_string={'q': prefix})
+                http_timings.append((time.perf_counter() - start) * 1000)
+
+        print(f"{'':>10} | {'p50 (ms)':>9} | {'p99 (ms)':>9}")
+        print(f"{'índice':>10} | {percentile(timings, 0.5):>9.3f} | {percentile(timings, 0.99):>9.3f}")
+        print(f"{'http':>10} | {percentile(http_timings, 0.5):>9.3f} | {percentile(http_timings, 0.99):>9.3f}")
+
+
+def bench_user_queries():
+    """Queries por requisição nas rotas que verificam o usuário do token"""
+    app = create_bench_app()
+
+    with app.app_context():
+        admin, _ = create_bench_user('admin')
+        admin.is_admin = True
+        other, _ = create_bench_user('outro')
+        music = Music(title='Música', artist='Artista', uploaded_by_id=other.id)
+        playlist = Playlist(name='Playlist', owner_id=other.id)
+        db.session.add_all([music, playlist])
+        db.session.commit()
+        admin_id, engine = admin.id, db.engine
+        routes = [
+            ('GET', '/api/users/', None),
+            ('GET', f'/api/users/{other.id}', None),
+            ('GET', f'/api/users/{other.id}/uploads', None),
+            ('GET', '/api/music/', None),
+            ('PUT', f'/api/music/{music.id}', 'genre'),
+            ('PUT', f'/api/playlists/{playlist.id}', 'description'),
+            ('DELETE', f'/api/playlists/{playlist.id + 1}', None),
+        ]
+
+    configs = [
+        ('sem cache', 0, False),
+        ('cache 5s', 5, False),
+        ('claims', 0, True),
+    ]
+    results = {}
+    for name, ttl, claims in configs:
+        app.config['CURRENT_USER_CACHE_TTL'] = ttl
+        app.config['JWT_USER_CLAIMS'] = claims
+        current_user_loader.init_app(app)
+        with app.app_context():
+            admin = db.session.get(User, admin_id)
+            token = create_access_token(identity=admin.id, additional_claims=current_user_loader.claims_for(admin))
+        headers = {'Authorization': f'Bearer {token}'}
+
+        with app.test_client() as client:
+            client.get('/api/users/', headers=headers)  # aquece o cache e a lista de revogação
+            for method, url, field in routes:
+                statements = []
+
+                def before_cursor_execute(conn, cursor, statement, *args):
+                    statements.append(statement)
+
+                event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+                try:
+                    client.open(url, method=method, headers=headers, json={field: name} if field else None)
+                finally:
+                    event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+                results.setdefault(f'{method} {url}', []).append(len(statements))
+
+    print(f"{'rota':<28} | " + ' | '.join(f'{name:>9}' for name, _, _ in configs))
+    for route, counts in results.items():
+        print(f"{route:<28} | " + ' | '.join(f'{count:>9}' for count in counts))
+
+
+def bench_password_hashing():
+    """Logins/s por núcleo para cada algoritmo e custo, e latência das demais requisições em um pico de logins"""
+    settings = [('pbkdf2', 600000), ('bcrypt', 12), ('bcrypt', 10), ('scrypt', 15)]
+    app = create_bench_app()
+
+    with app.app_context():
+        user, headers = create_bench_user()
+        user_id = user.id
+
+    print(f"{'algoritmo':>10} | {'custo':>7} | {'hash (ms)':>9} | {'login (ms)':>10} | {'logins/s/núcleo':>15}")
+    for algorithm, cost in settings:
+        password_hasher.configure(algorithm, cost, pool='none')
+        password_hash = hash_password('bench123', algorithm, cost)
+        start = time.perf_counter()
+        for _ in range(5):
+            verify_password('bench123', password_hash)
+        verify_ms = (time.perf_counter() - start) * 1000 / 5
+
+        with app.app_context():
+            db.session.get(User, user_id).password_hash = password_hash
+            db.session.commit()
+        with app.test_client() as client:
+            login_ms = measure(client, '/api/auth/login', {}, runs=5, method='POST',
+                               json={'login': 'bench', 'password': 'bench123'})
+        print(f"{algorithm:>10} | {cost:>7} | {verify_ms:>9.1f} | {login_ms:>10.1f} | {1000 / login_ms:>15.1f}")
+
+    # Pico: 8 logins simultâneos sem parar; mediana de GET /api/tasks/ no mesmo processo
+    password_hash = hash_password('bench123', 'bcrypt', 10)
+    print(f"\n{'pool':>10} | {'GET /api/tasks/ durante o pico (ms)':>36}")
+    with app.test_client() as client:
+        idle = measure(client, '/api/tasks/', headers)
+        print(f"{'(ocioso)':>10} | {idle:>36.2f}")
+        for pool in ('none', 'thread'):
+            password_hasher.configure('bcrypt', 10, pool=pool, workers=os.cpu_count())
+            stop = threading.Event()
+
+            def logins():
+                while not stop.is_set():
+                    password_hasher.verify('bench123', password_hash)
+
+            threads = [threading.Thread(target=logins) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            try:
+                busy = measure(client, '/api/tasks/', headers)
+            finally:
+                stop.set()
+                for thread in threads:
+                    thread.join()
+            print(f"{pool:>10} | {busy:>36.2f}")
+    password_hasher.configure('bcrypt')
+
+
+def bench_login():
+    """POST /api/auth/login com 10k usuários em SQLite em arquivo: logins/s e queries por login"""
+    # Banco em arquivo: o custo do commit do login entra na medição
+    directory = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directory.name, 'login.db')}"
+    try:
+        app = create_bench_app()
+    finally:
+        os.environ['DATABASE_URL'] = 'sqlite://'
+
+    with app.app_context():
+        password_hasher.configure('bcrypt', 4, pool='none')
+        password_hash = hash_password('bench123', 'bcrypt', 4)
+        now = datetime.utcnow()
+        db.session.execute(User.__table__.insert(), [{
+            'username': f'user{i}', 'email': f'user{i}@bench.local', 'password_hash': password_hash,
+            'first_name': 'Bench', 'last_name': 'User', 'is_active': True, 'is_admin': False,
+            'created_at': now, 'updated_at': now
+        } for i in range(10000)])
+        db.session.commit()
+        # Usuários com playlists e uploads (que o payload antigo contava)
+        for user_id in range(1, 101):
+            db.session.execute(Playlist.__table__.insert(), [{
+                'name': f'Playlist {i}', 'owner_id': user_id, 'is_public': True, 'is_collaborative': False,
+                'play_count': 0, 'total_duration': 0, 'created_at': now, 'updated_at': now
+            } for i in range(20)])
+            seed_music(50, uploaded_by_id=user_id)
+        engine = db.engine
+
+    logins = [(random.randint(1, 100), random.random() < 0.5) for _ in range(300)]
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app.test_client() as client:
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        start = time.perf_counter()
+        for user_id, by_email in logins:
+            login = f'user{user_id}@bench.local' if by_email else f'user{user_id}'
+            response = client.post('/api/auth/login', json={'login': login, 'password': 'bench123'})
+            assert response.status_code == 200, response.get_json()
+        last_login_recorder.flush()  # a gravação em lote entra na conta
+        elapsed = time.perf_counter() - start
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+    print(f"{'logins':>8} | {'logins/s':>9} | {'queries/login':>13}")
+    print(f"{len(logins):>8} | {len(logins) / elapsed:>9.1f} | {len(statements) / len(logins):>13.1f}")
+    password_hasher.configure('bcrypt')
+    directory.cleanup()
+
+
+BENCHMARKS = {
+    'dashboard': bench_dashboard,
+    'duplicate': bench_duplicate,
+    'spotify_fanout': bench_spotify_fanout,
+    'search': bench_search,
+    'suggest': bench_suggest,
+    'fuzzy': bench_fuzzy,
+    'user_queries': bench_user_queries,
+    'password_hashing': bench_password_hashing,
+    'login': bench_login,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks da API')
+    parser.add_argument('names', nargs='*', metavar='nome',
+                        help=f"benchmarks a executar: {', '.join(BENCHMARKS)} (padrão: todos)")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"benchmark desconhecido: {', '.join(unknown)}")
+
+    for name in args.names or BENCHMARKS:
+        print(f"\n⏱️  {name}: {BENCHMARKS[name].__doc__}")
+        BENCHMARKS[name]()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Verifica os planos das queries das listagens em um banco populado
+
+Popula o banco com tarefas e músicas (1M de cada por padrão), chama as
+rotas de tarefas, listas e músicas, captura os SELECTs executados e roda
+EXPLAIN em cada um. Termina com erro se algum deles varrer uma tabela
+inteira (SCAN sem índice no SQLite, Seq Scan no PostgreSQL).
+
+Uso:
+    python explain_queries.py                  # SQLite em memória, 1M linhas
+    python explain_queries.py --rows 100000
+    DATABASE_URL=postgresql://... python explain_queries.py
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Sem DATABASE_URL, banco em memória, isolado do banco de desenvolvimento
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ['SUGGEST_PRELOAD'] = 'false'
+
+from sqlalchemy import event, text
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app.models.user import User
+from app.models.task_list import TaskList
+from app.models.task import Task
+from app.models.music import Music
+
+# Tabelas que não podem ser varridas por inteiro
+LARGE_TABLES = {'tasks', 'task_lists', 'music'}
+
+BATCH_SIZE = 50000
+
+
+def seed(rows, users):
+    """Distribui rows tarefas e rows músicas entre os usuários"""
+    now = datetime.utcnow()
+    user_ids = [user.id for user in users]
+    priorities = [p['value'] for p in Task.get_priorities()]
+
+    # 5 listas por usuário, uma delas arquivada
+    db.session.execute(TaskList.__table__.insert(), [{
+        'title': f'Lista {i}', 'user_id': user_id, 'is_archived': i == 4,
+        'task_count': 0, 'completed_count': 0,
+        'created_at': now - timedelta(days=i), 'updated_at': now
+    } for user_id in user_ids for i in range(5)])
+    db.session.commit()
+    lists = {}
+    for list_id, user_id in db.session.query(TaskList.id, TaskList.user_id):
+        lists.setdefault(user_id, []).append(list_id)
+
+    for start in range(0, rows, BATCH_SIZE):
+        batch = []
+        for i in range(start, min(start + BATCH_SIZE, rows)):
+            user_id = user_ids[i % len(user_ids)]
+            completed = random.random() < 0.4
+            batch.append({
+                'title': f'Tarefa {i}', 'description': '', 'completed': completed,
+                'priority': random.choice(priorities),
+                'due_date': now + timedelta(days=random.randint(-30, 30)) if random.random() < 0.7 else None,
+                'completed_at': now if completed else None,
+                'task_list_id': random.choice(lists[user_id]), 'user_id': user_id,
+                'created_at': now - timedelta(minutes=i), 'updated_at': now
+            })
+        db.session.execute(Task.__table__.insert(), batch)
+        db.session.commit()
+
+    # Músicas: 95% públicas, enviadas por usuários variados
+    for start in range(0, rows, BATCH_SIZE):
+        db.session.execute(Music.__table__.insert(), [{
+            'title': f'Música {i}', 'artist': f'Artista {i % 5000}', 'album': f'Álbum {i % 20000}',
+            'is_local': False, 'is_public': random.random() < 0.95, 'play_count': 0,
+            'uploaded_by_id': user_ids[i % len(user_ids)] if i % 10 == 0 else None,
+            'created_at': now - timedelta(seconds=i), 'updated_at': now
+        } for i in range(start, min(start + BATCH_SIZE, rows))])
+        db.session.commit()
+
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+
+
+def route_requests(user):
+    """URLs das listagens, com as combinações de filtros usadas pelo frontend"""
+    list_id = TaskList.query.filter_by(user_id=user.id, is_archived=False).first().id
+    return [
+        '/api/tasks/',
+        f'/api/tasks/?task_list_id={list_id}',
+        '/api/tasks/?completed=false',
+        f'/api/tasks/?task_list_id={list_id}&completed=true',
+        '/api/tasks/?overdue_only=true',
+        '/api/tasks/dashboard',
+        '/api/task-lists/',
+        '/api/task-lists/?include_archived=true',
+        f'/api/task-lists/{list_id}',
+        '/api/music/?count=none',
+        f'/api/music/?count=none&uploader_id={user.id}',
+        f'/api/users/{user.id}/uploads',
+    ]
+
+
+def capture_selects(client, url, headers):
+    """Executa a requisição e retorna os SELECTs (sql, parâmetros) que ela fez"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    assert response.status_code == 200, (url, response.get_json())
+    return statements
+
+
+def full_scans(statement, parameters):
+    """(tabelas varridas por inteiro, plano) do statement"""
+    connection = db.session.connection()
+    if db.engine.dialect.name == 'postgresql':
+        rows = connection.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {statement}', parameters).fetchall()
+        plan = rows[0][0][0]['Plan']
+        scans, nodes = [], [plan]
+        while nodes:
+            node = nodes.pop()
+            if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in LARGE_TABLES:
+                scans.append(node['Relation Name'])
+            nodes.extend(node.get('Plans', ()))
+        return scans, json.dumps(plan, indent=2)
+
+    rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+    details = [row[-1] for row in rows]
+    scans = []
+    for detail in details:
+        match = re.match(r'SCAN (\w+)', detail)
+        if match and match.group(1) in LARGE_TABLES and 'USING' not in detail:
+            scans.append(match.group(1))
+    return scans, '\n'.join(details)
+
+
+def explain_queries(rows, users_count, verbose=False):
+    app = create_app()
+
+    with app.app_context():
+        db.create_all()
+        if User.query.first() is not None:
+            # As tabelas são apagadas no final: nunca rodar em um banco com dados
+            print("❌ O banco já tem dados; use um banco vazio (DATABASE_URL)")
+            return False
+
+        users = [User(username=f'explain{i}', email=f'explain{i}@explain.local',
+                      first_name='Explain', last_name='User', password_hash='-')
+                 for i in range(users_count)]
+        db.session.add_all(users)
+        db.session.commit()
+
+        print(f"🌱 Populando {rows} tarefas e {rows} músicas ({users_count} usuários)...")
+        start = time.perf_counter()
+        seed(rows, users)
+        print(f"   concluído em {time.perf_counter() - start:.1f}s")
+
+        user = users[0]
+        headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+        failures = 0
+        with app.test_client() as client:
+            for url in route_requests(user):
+                url_failures = failures
+                for statement, parameters in capture_selects(client, url, headers):
+                    scans, plan = full_scans(statement, parameters)
+                    if scans:
+                        failures += 1
+                        print(f"❌ {url}: varredura completa de {', '.join(scans)}")
+                        print(f"   {' '.join(statement.split())}")
+                        print('   ' + plan.replace('\n', '\n   '))
+                    elif verbose:
+                        print(f"✅ {url}: {' '.join(statement.split())[:100]}")
+                        print('   ' + plan.replace('\n', '\n   '))
+                if not verbose and failures == url_failures:
+                    print(f"✅ {url}")
+
+        db.session.remove()
+        db.drop_all()
+
+    return failures == 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='EXPLAIN das queries das listagens')
+    parser.add_argument('--rows', type=int, default=1000000, help='tarefas e músicas a inserir (padrão: 1M)')
+    parser.add_argument('--users', type=int, default=1000, help='usuários entre os quais as linhas são divididas')
+    parser.add_argument('-v', '--verbose', action='store_true', help='mostra o plano de todas as queries')
+    args = parser.parse_args()
+
+    success = explain_queries(args.rows, args.users, args.verbose)
+    sys.exit(0 if success else 1)
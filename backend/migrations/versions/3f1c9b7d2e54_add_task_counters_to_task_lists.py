@@ -0,0 +1,44 @@
+"""Add denormalized task counters to task_lists
+
+Revision ID: 3f1c9b7d2e54
+Revises: ac73429b2a43
+Create Date: 2026-10-18 09:12:41.318406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9b7d2e54'
+down_revision = 'ac73429b2a43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('task_lists', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('task_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('completed_count', sa.Integer(), nullable=False, server_default='0'))
+
+    # Preencher os contadores com os dados existentes
+    task_lists = sa.table('task_lists', sa.column('id', sa.Integer), sa.column('task_count', sa.Integer),
+                          sa.column('completed_count', sa.Integer))
+    tasks = sa.table('tasks', sa.column('id', sa.Integer), sa.column('task_list_id', sa.Integer),
+                     sa.column('completed', sa.Boolean))
+
+    total = sa.select(sa.func.count(tasks.c.id)).where(
+        tasks.c.task_list_id == task_lists.c.id
+    ).scalar_subquery()
+    completed = sa.select(sa.func.count(tasks.c.id)).where(
+        tasks.c.task_list_id == task_lists.c.id,
+        tasks.c.completed == sa.true()
+    ).scalar_subquery()
+
+    op.execute(task_lists.update().values(task_count=total, completed_count=completed))
+
+
+def downgrade():
+    with op.batch_alter_table('task_lists', schema=None) as batch_op:
+        batch_op.drop_column('completed_count')
+        batch_op.drop_column('task_count')
@@ -0,0 +1,26 @@
+"""Add owner_id index to playlists for per-user playlist counts
+
+Revision ID: 5c8e1f3a9d27
+Revises: b7e2f4a9c853
+Create Date: 2026-10-18 16:02:47.519318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c8e1f3a9d27'
+down_revision = 'b7e2f4a9c853'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('playlists', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_playlists_owner_id'), ['owner_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('playlists', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_playlists_owner_id'))
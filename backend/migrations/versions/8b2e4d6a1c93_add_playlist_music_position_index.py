@@ -0,0 +1,26 @@
+"""Add (playlist_id, position) index to playlist_music
+
+Revision ID: 8b2e4d6a1c93
+Revises: 3f1c9b7d2e54
+Create Date: 2026-10-18 10:04:27.551902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4d6a1c93'
+down_revision = '3f1c9b7d2e54'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('playlist_music', schema=None) as batch_op:
+        batch_op.create_index('ix_playlist_music_playlist_id_position', ['playlist_id', 'position'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('playlist_music', schema=None) as batch_op:
+        batch_op.drop_index('ix_playlist_music_playlist_id_position')
@@ -0,0 +1,26 @@
+"""Add album index to music for suggestion visibility checks
+
+Revision ID: 9e4b7c2d1a60
+Revises: 5c8e1f3a9d27
+Create Date: 2026-10-18 18:21:05.740163
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4b7c2d1a60'
+down_revision = '5c8e1f3a9d27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('music', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_music_album'), ['album'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('music', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_music_album'))
@@ -0,0 +1,46 @@
+"""Add unique lower(email) index to users for login lookups
+
+Revision ID: b7e2f4a9c853
+Revises: a4d9e6b3c071
+Create Date: 2026-10-18 14:36:12.284907
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2f4a9c853'
+down_revision = 'a4d9e6b3c071'
+branch_labels = None
+depends_on = None
+
+
+users = sa.table('users',
+    sa.column('id', sa.Integer),
+    sa.column('email', sa.String)
+)
+
+
+def upgrade():
+    conn = op.get_bind()
+    email = sa.func.lower(users.c.email)
+
+    # Contas cujo email só difere em maiúsculas precisam ser resolvidas à mão
+    # (não dá para escolher sozinho qual delas fica com o email)
+    duplicates = conn.execute(
+        sa.select(email).group_by(email).having(sa.func.count() > 1).order_by(email)
+    ).scalars().all()
+    if duplicates:
+        raise RuntimeError(
+            'Emails cadastrados em mais de uma conta (sem diferenciar maiúsculas): '
+            + ', '.join(duplicates)
+        )
+
+    # Emails passam a ser gravados em minúsculas
+    op.execute(users.update().where(users.c.email != email).values(email=email))
+    op.create_index('ix_users_email_lower', 'users', [sa.text('lower(email)')], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_users_email_lower', table_name='users')
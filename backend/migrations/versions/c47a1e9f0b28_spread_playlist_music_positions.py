@@ -0,0 +1,64 @@
+"""Spread playlist_music positions into gapped ranks
+
+Revision ID: c47a1e9f0b28
+Revises: 8b2e4d6a1c93
+Create Date: 2026-10-18 10:41:09.204118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c47a1e9f0b28'
+down_revision = '8b2e4d6a1c93'
+branch_labels = None
+depends_on = None
+
+# Mesmo valor de app.models.playlist.POSITION_GAP
+POSITION_GAP = 1024
+
+playlist_music = sa.table('playlist_music',
+    sa.column('playlist_id', sa.Integer),
+    sa.column('music_id', sa.Integer),
+    sa.column('position', sa.Integer),
+    sa.column('added_at', sa.DateTime)
+)
+
+
+def _renumber(gap):
+    """Renumera as posições de cada playlist mantendo a ordem atual"""
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.select(playlist_music.c.playlist_id, playlist_music.c.music_id).order_by(
+            playlist_music.c.playlist_id,
+            playlist_music.c.position,
+            playlist_music.c.added_at,
+            playlist_music.c.music_id
+        )
+    ).all()
+
+    updates = []
+    current_playlist, index = None, 0
+    for playlist_id, music_id in rows:
+        if playlist_id != current_playlist:
+            current_playlist, index = playlist_id, 0
+        index += 1
+        updates.append({'b_playlist_id': playlist_id, 'b_music_id': music_id, 'b_position': index * gap})
+
+    if updates:
+        conn.execute(
+            playlist_music.update().where(
+                playlist_music.c.playlist_id == sa.bindparam('b_playlist_id'),
+                playlist_music.c.music_id == sa.bindparam('b_music_id')
+            ).values(position=sa.bindparam('b_position')),
+            updates
+        )
+
+
+def upgrade():
+    _renumber(POSITION_GAP)
+
+
+def downgrade():
+    _renumber(1)
@@ -0,0 +1,84 @@
+"""Add full-text search index for music
+
+Revision ID: d5f2a8c1b7e6
+Revises: c47a1e9f0b28
+Create Date: 2026-10-18 11:32:45.118420
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5f2a8c1b7e6'
+down_revision = 'c47a1e9f0b28'
+branch_labels = None
+depends_on = None
+
+# Mesmas definições de app.services.music_search
+SQLITE_SETUP = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS music_fts USING fts5(
+        title, artist, album,
+        content='music', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS music_fts_ai AFTER INSERT ON music BEGIN
+        INSERT INTO music_fts (rowid, title, artist, album)
+        VALUES (new.id, new.title, new.artist, new.album);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS music_fts_ad AFTER DELETE ON music BEGIN
+        INSERT INTO music_fts (music_fts, rowid, title, artist, album)
+        VALUES ('delete', old.id, old.title, old.artist, old.album);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS music_fts_au AFTER UPDATE OF title, artist, album ON music BEGIN
+        INSERT INTO music_fts (music_fts, rowid, title, artist, album)
+        VALUES ('delete', old.id, old.title, old.artist, old.album);
+        INSERT INTO music_fts (rowid, title, artist, album)
+        VALUES (new.id, new.title, new.artist, new.album);
+    END""",
+    # Indexar as músicas já existentes
+    "INSERT INTO music_fts (music_fts) VALUES ('rebuild')",
+]
+
+PG_DOCUMENT = (
+    "setweight(to_tsvector('pt_unaccent', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('pt_unaccent', coalesce(artist, '')), 'B') || "
+    "setweight(to_tsvector('pt_unaccent', coalesce(album, '')), 'C')"
+)
+
+PG_SETUP = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    """DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'pt_unaccent') THEN
+            CREATE TEXT SEARCH CONFIGURATION pt_unaccent (COPY = portuguese);
+            ALTER TEXT SEARCH CONFIGURATION pt_unaccent
+                ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem;
+        END IF;
+    END
+    $$""",
+    f"CREATE INDEX IF NOT EXISTS ix_music_search ON music USING gin (({PG_DOCUMENT}))",
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        statements = SQLITE_SETUP
+    elif dialect == 'postgresql':
+        statements = PG_SETUP
+    else:
+        return
+
+    for statement in statements:
+        op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for trigger in ('music_fts_ai', 'music_fts_ad', 'music_fts_au'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS music_fts')
+    elif dialect == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_music_search')
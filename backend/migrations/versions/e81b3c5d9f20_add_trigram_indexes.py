@@ -0,0 +1,43 @@
+"""Add trigram indexes for fuzzy search
+
+Revision ID: e81b3c5d9f20
+Revises: d5f2a8c1b7e6
+Create Date: 2026-10-18 12:15:03.772941
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e81b3c5d9f20'
+down_revision = 'd5f2a8c1b7e6'
+branch_labels = None
+depends_on = None
+
+# Mesmos índices de app.services.fuzzy_search (só no PostgreSQL; nos
+# demais bancos a busca aproximada usa um índice em memória)
+TRIGRAM_INDEXES = [
+    ('ix_music_title_trgm', 'music', 'title'),
+    ('ix_music_artist_trgm', 'music', 'artist'),
+    ('ix_music_album_trgm', 'music', 'album'),
+    ('ix_playlists_name_trgm', 'playlists', 'name'),
+    ('ix_playlists_description_trgm', 'playlists', 'description'),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        op.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for name, _, _ in TRIGRAM_INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS {name}')
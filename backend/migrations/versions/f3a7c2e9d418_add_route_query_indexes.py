@@ -0,0 +1,46 @@
+"""Add composite indexes for task, task list and music queries
+
+Revision ID: f3a7c2e9d418
+Revises: e81b3c5d9f20
+Create Date: 2026-10-18 13:02:51.406318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a7c2e9d418'
+down_revision = 'e81b3c5d9f20'
+branch_labels = None
+depends_on = None
+
+# Mesmos índices declarados nos modelos (verificados por explain_queries.py)
+INDEXES = {
+    'tasks': [
+        ('ix_tasks_user_id_task_list_id_completed_due_date', ['user_id', 'task_list_id', 'completed', 'due_date']),
+        ('ix_tasks_user_id_completed_due_date', ['user_id', 'completed', 'due_date']),
+        ('ix_tasks_task_list_id_completed', ['task_list_id', 'completed']),
+    ],
+    'task_lists': [
+        ('ix_task_lists_user_id_is_archived_created_at', ['user_id', 'is_archived', 'created_at']),
+    ],
+    'music': [
+        ('ix_music_created_at_id', ['created_at', 'id']),
+        ('ix_music_uploaded_by_id_created_at', ['uploaded_by_id', 'created_at']),
+    ],
+}
+
+
+def upgrade():
+    for table, indexes in INDEXES.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for name, columns in indexes:
+                batch_op.create_index(name, columns, unique=False)
+
+
+def downgrade():
+    for table, indexes in INDEXES.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for name, _ in indexes:
+                batch_op.drop_index(name)
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Script para corrigir divergências nos contadores de tarefas das listas
+"""
+
+import sys
+import os
+
+# Adicionar o diretório parent ao Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from app.models.task_list import TaskList
+
+def reconcile_task_counters():
+    """Recalcula task_count/completed_count de todas as listas"""
+    app = create_app()
+    
+    with app.app_context():
+        try:
+            fixed = TaskList.reconcile_counters()
+            
+            if fixed:
+                print(f"✅ Contadores corrigidos em {fixed} lista(s)")
+            else:
+                print("✅ Todos os contadores já estavam corretos")
+            return True
+            
+        except Exception as e:
+            print(f"❌ Erro ao reconciliar contadores: {e}")
+            return False
+
+if __name__ == '__main__':
+    success = reconcile_task_counters()
+    sys.exit(0 if success else 1)
@@ -4,15 +4,197 @@ Script para testar a aplicação Flask
 """
 import os
 import sys
+import json
+import base64
+import time
+import tempfile
+import threading
+from datetime import datetime, timedelta
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app import create_app
+from contextlib import contextmanager
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from sqlalchemy import event, select
+from sqlalchemy.exc import IntegrityError
+from flask import Flask
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app.models.user import User
+from app.models.music import Music
+from app.models.playlist import Playlist
+from app.models.task_list import TaskList
+from app.models.task import Task
+from app.services.spotify_service import SpotifyService
+from app.services.async_spotify_service import AsyncSpotifyService
+from app.services.suggest_index import suggest_index
+from app.services.fuzzy_search import fuzzy_search
+from app.services.token_blocklist import TokenBlocklist, token_blocklist
+from app.services.current_user import current_user_loader
+from app.services.password_hasher import password_hasher
+from app.services.last_login import last_login_recorder
+from app.services.play_counter import play_counter
+from werkzeug.security import generate_password_hash
+from app.models.revoked_token import RevokedToken
+from app.services.response_cache import ResponseCache, MemoryCacheBackend, SQLiteCacheBackend
+
+
+def create_test_app():
+    """Cria a aplicação com um banco SQLite em memória"""
+    os.environ['DATABASE_URL'] = 'sqlite://'
+    os.environ['SUGGEST_PRELOAD'] = 'false'
+    os.environ['PASSWORD_HASH_COST'] = '4'  # bcrypt mínimo: testes rápidos
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def create_test_user(username, is_admin=False):
+    """Cria um usuário e retorna (usuário, headers de autenticação)"""
+    user = User(
+        username=username,
+        email=f'{username}@test.local',
+        first_name=username.title(),
+        last_name='Teste',
+        is_admin=is_admin
+    )
+    user.set_password('senha123')
+    db.session.add(user)
+    db.session.commit()
+    
+    token = create_access_token(identity=user.id)
+    return user, {'Authorization': f'Bearer {token}'}
+
+
+@contextmanager
+def count_queries():
+    """Conta os comandos SQL executados dentro do bloco"""
+    statements = []
+    
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+    
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def fake_track(track_id):
+    """Música no formato retornado pela API do Spotify"""
+    return {
+        'id': track_id,
+        'name': f'Música {track_id}',
+        'artists': [{'name': 'Artista'}],
+        'album': {'name': 'Álbum', 'release_date': '2020-05-01', 'images': []},
+        'duration_ms': 180000,
+        'track_number': 1,
+        'external_urls': {'spotify': f'https://open.spotify.com/track/{track_id}'},
+        'preview_url': None,
+        'popularity': 50
+    }
+
+
+@contextmanager
+def fake_spotify_server():
+    """Servidor HTTP local que imita os endpoints usados da API do Spotify.
+    
+    Retorna o contador de requisições por caminho (sem query string) e o
+    tamanho de cada lote pedido a /v1/tracks?ids= em calls.batch_sizes. Falhas
+    podem ser injetadas em calls.faults (lista de (status, headers) usados
+    nas próximas requisições GET) e latência em calls.delay (segundos).
+    """
+    calls = Counter()
+    calls.faults = []
+    calls.delay = 0
+    calls.connections = set()
+    calls.batch_sizes = []
+    
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        
+        def log_message(self, *args):
+            pass
+        
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def do_POST(self):
+            calls[self.path] += 1
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if calls.delay:
+                time.sleep(calls.delay)
+            self._reply(200, {'access_token': 'token-de-teste', 'expires_in': 3600})
+        
+        def do_GET(self):
+            path = self.path.split('?')[0]
+            calls[path] += 1
+            calls.connections.add(self.client_address)
+            if calls.delay:
+                time.sleep(calls.delay)
+            if calls.faults:
+                status, headers = calls.faults.pop(0)
+                body = b'{}'
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            elif path == '/v1/search':
+                self._reply(200, {'tracks': {'items': [fake_track(f'busca{i}') for i in range(3)]}})
+            elif path == '/v1/tracks':
+                ids = self.path.split('ids=', 1)[1].split('&')[0].split('%2C')
+                calls.batch_sizes.append(len(ids))
+                self._reply(200, {'tracks': [
+                    None if track_id.startswith('inexistente') else fake_track(track_id)
+                    for track_id in ids
+                ]})
+            elif path.startswith('/v1/tracks/'):
+                self._reply(200, fake_track(path.rsplit('/', 1)[1]))
+            elif path.startswith('/v1/audio-features/'):
+                self._reply(200, {'id': path.rsplit('/', 1)[1], 'tempo': 120.0})
+            elif path.startswith('/v1/artists/') and path.endswith('/top-tracks'):
+                artist_id = path.split('/')[3]
+                self._reply(200, {'tracks': [fake_track(f'{artist_id}-{i}') for i in range(3)]})
+            else:
+                self._reply(404, {'error': 'not found'})
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.handle_error = lambda request, client_address: None  # clientes que desistem (timeout)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    calls.url = f'http://127.0.0.1:{server.server_address[1]}'
+    try:
+        yield calls
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def create_test_spotify_service(server, service_class=SpotifyService):
+    """Serviço do Spotify apontando para o servidor falso"""
+    service = service_class()
+    service.client_id = 'id-de-teste'
+    service.client_secret = 'segredo-de-teste'
+    service.base_url = f'{server.url}/v1'
+    service.auth_url = f'{server.url}/api/token'
+    return service
+
 
 def test_app():
     """Testa a criação da aplicação"""
     try:
         print("🧪 Testando criação da aplicação...")
-        app = create_app()
+        app = create_test_app()
         print("✅ Aplicação criada com sucesso!")
         
         print("🧪 Testando rotas...")
@@ -42,5 +224,1259 @@ def test_app():
         import traceback
         traceback.print_exc()
 
+def test_music_list_query_count():
+    """Listagens de músicas executam um número constante de queries por página"""
+    app = create_test_app()
+    
+    with app.app_context():
+        owner, headers = create_test_user('dono')
+        other, _ = create_test_user('outro')
+        
+        playlist = Playlist(name='Favoritas', owner_id=owner.id)
+        db.session.add(playlist)
+        for i in range(120):
+            db.session.add(Music(
+                title=f'Música {i}',
+                artist='Artista',
+                uploaded_by_id=owner.id if i % 2 else other.id
+            ))
+        db.session.commit()
+        
+        for music in Music.query.limit(60).all():
+            playlist.add_music(music)
+        
+        # Carga inicial (uma vez por processo) da lista de tokens revogados
+        with app.test_client() as client:
+            client.get('/api/auth/me', headers=headers)
+        
+        def queries_for(url):
+            db.session.expire_all()
+            with app.test_client() as client, count_queries() as statements:
+                response = client.get(url, headers=headers)
+            assert response.status_code == 200, response.get_json()
+            return len(statements)
+        
+        for url in ('/api/music/?per_page={}',
+                    f'/api/users/{owner.id}/uploads?per_page={{}}',
+                    f'/api/playlists/{playlist.id}/tracks?per_page={{}}'):
+            small, large = queries_for(url.format(5)), queries_for(url.format(100))
+            assert small == large, f'{url}: {small} queries com 5 itens, {large} com 100'
+
+
+def test_playlist_tracks_pagination():
+    """Faixas da playlist paginadas no banco, na ordem das posições"""
+    app = create_test_app()
+    
+    with app.app_context():
+        user, headers = create_test_user('dono')
+        playlist = Playlist(name='Paginada', owner_id=user.id)
+        songs = [Music(title=f'Música {i}', artist='Artista') for i in range(7)]
+        db.session.add_all([playlist, *songs])
+        db.session.commit()
+        
+        # Ordem diferente da de criação: 6, 0, 1, ..., 5
+        for song in songs[:6]:
+            playlist.add_music(song)
+        playlist.add_music(songs[6], position=1)
+        expected = [songs[6].id] + [song.id for song in songs[:6]]
+        
+        pages = []
+        with app.test_client() as client:
+            for page in (1, 2, 3, 4):
+                with count_queries() as statements:
+                    response = client.get(f'/api/playlists/{playlist.id}/tracks',
+                                          headers=headers, query_string={'page': page, 'per_page': 3})
+                data = response.get_json()
+                assert response.status_code == 200 and data['total'] == 7
+                pages.append([track['id'] for track in data['tracks']])
+                assert any('LIMIT' in statement and 'playlist_music' in statement for statement in statements)
+        
+        assert pages == [expected[:3], expected[3:6], expected[6:], []]
+
+
+def test_playlist_positions():
+    """Posições com intervalos: inserir entre duas, esgotar o intervalo e reordenar"""
+    from app.models.music import playlist_music
+    from app.models.playlist import POSITION_GAP
+    
+    app = create_test_app()
+    
+    with app.app_context():
+        user, headers = create_test_user('dono')
+        playlist = Playlist(name='Ordem', owner_id=user.id)
+        songs = [Music(title=f'Música {i}', artist='Artista') for i in range(20)]
+        db.session.add_all([playlist, *songs])
+        db.session.commit()
+        a, b, c, d = (song.id for song in songs[:4])
+        
+        def positions():
+            return db.session.execute(
+                select(playlist_music.c.music_id, playlist_music.c.position)
+                .where(playlist_music.c.playlist_id == playlist.id)
+                .order_by(playlist_music.c.position)
+            ).all()
+        
+        def order():
+            return [music_id for music_id, _ in positions()]
+        
+        for song in songs[:3]:
+            playlist.add_music(song)
+        assert [position for _, position in positions()] == [POSITION_GAP, 2 * POSITION_GAP, 3 * POSITION_GAP]
+        
+        # Inserir entre A e B só grava a nova linha
+        playlist.add_music(songs[3], position=2)
+        assert positions() == [(a, POSITION_GAP), (d, POSITION_GAP * 3 // 2),
+                               (b, 2 * POSITION_GAP), (c, 3 * POSITION_GAP)]
+        
+        # Inserções repetidas no mesmo ponto esgotam o intervalo e renumeram a playlist
+        inserted = []
+        for song in songs[4:16]:
+            playlist.add_music(song, position=2)
+            inserted.insert(0, song.id)
+        assert order() == [a, *inserted, d, b, c]
+        ranks = [position for _, position in positions()]
+        assert len(set(ranks)) == len(ranks)
+        assert dict(positions())[c] != 3 * POSITION_GAP  # renumerada
+        
+        # Mover uma música
+        assert playlist.reorder_music(c, 1)
+        assert order() == [c, a, *inserted, d, b]
+        
+        # Permutação parcial: as informadas trocam de lugar entre si, as demais ficam
+        before = order()
+        with app.test_client() as client:
+            response = client.post(f'/api/playlists/{playlist.id}/tracks/reorder', headers=headers,
+                                   json={'order': [b, c]})
+            assert response.status_code == 200
+            assert client.post(f'/api/playlists/{playlist.id}/tracks/reorder', headers=headers,
+                               json={'order': [a, a]}).status_code == 400
+            assert client.post(f'/api/playlists/{playlist.id}/tracks/reorder', headers=headers,
+                               json={'order': [a, songs[19].id]}).status_code == 400
+        db.session.expire_all()
+        assert order() == [b, *before[1:-1], c]
+        
+        # Permutação completa
+        playlist.reorder_tracks(list(reversed(order())))
+        assert order() == [c, *reversed(before[1:-1]), b]
+        
+        # Posições vazias (dados antigos) são normalizadas antes de inserir
+        db.session.execute(playlist_music.update().where(playlist_music.c.playlist_id == playlist.id)
+                           .values(position=None))
+        db.session.commit()
+        playlist.add_music(songs[16], position=1)
+        assert order()[0] == songs[16].id and len(set(p for _, p in positions())) == len(positions())
+
+
+def test_playlist_duplicate():
+    """Duplicar copia as faixas acessíveis na mesma ordem, com a duração total"""
+    app = create_test_app()
+    
+    with app.app_context():
+        owner, owner_headers = create_test_user('dono')
+        user, headers = create_test_user('ouvinte')
+        playlist = Playlist(name='Original', owner_id=owner.id)
+        songs = [Music(title=f'Música {i}', artist='Artista', duration=60 * (i + 1)) for i in range(4)]
+        hidden = Music(title='Privada', artist='Artista', duration=999, is_public=False, uploaded_by_id=owner.id)
+        db.session.add_all([playlist, *songs, hidden])
+        db.session.commit()
+        
+        for song in songs:
+            playlist.add_music(song)
+        playlist.add_music(hidden, position=2)
+        playlist.reorder_tracks([songs[3].id, songs[0].id])  # 3, privada, 1, 2, 0
+        
+        with app.test_client() as client, count_queries() as statements:
+            response = client.post(f'/api/playlists/{playlist.id}/duplicate', headers=headers, json={})
+        assert response.status_code == 201
+        data = response.get_json()['playlist']
+        assert data['name'] == 'Original - Cópia' and data['owner_id'] == user.id
+        assert [track['id'] for track in data['tracks']] == [songs[i].id for i in (3, 1, 2, 0)]
+        assert data['tracks_count'] == 4
+        assert data['total_duration'] == 60 * (1 + 2 + 3 + 4)
+        assert sum('INSERT INTO playlist_music' in statement for statement in statements) == 1
+        
+        # O dono também copia a própria música privada
+        with app.test_client() as client:
+            data = client.post(f'/api/playlists/{playlist.id}/duplicate', headers=owner_headers,
+                               json={'name': 'Minha cópia'}).get_json()['playlist']
+        assert [track['id'] for track in data['tracks']][:2] == [songs[3].id, hidden.id]
+        assert data['total_duration'] == 60 * 10 + 999
+
+
+def test_playlist_bulk_tracks():
+    """Adição e remoção em lote, com validação dos ids e da posição"""
+    app = create_test_app()
+    
+    with app.app_context():
+        user, headers = create_test_user('dono')
+        playlist = Playlist(name='Lote', owner_id=user.id)
+        songs = [Music(title=f'Música {i}', artist='Artista', duration=100) for i in range(4)]
+        db.session.add_all([playlist, *songs])
+        db.session.commit()
+        ids = [song.id for song in songs]
+        url = f'/api/playlists/{playlist.id}/tracks/bulk'
+        
+        with app.test_client() as client:
+            response = client.post(url, headers=headers, json={'music_ids': [ids[0], ids[2], 9999]})
+            assert response.status_code == 200
+            assert response.get_json()['added'] == [ids[0], ids[2]]
+            assert response.get_json()['not_found'] == [9999]
+            
+            response = client.post(url, headers=headers, json={'music_ids': [ids[1], ids[0]], 'position': 2})
+            assert response.get_json()['added'] == [ids[1]]
+            assert response.get_json()['already_in_playlist'] == [ids[0]]
+            db.session.expire_all()
+            assert [music.id for music, _ in playlist.tracks_query()] == [ids[0], ids[1], ids[2]]
+            assert playlist.total_duration == 300
+            
+            # Tipos inválidos dão 400, não 500
+            for body in ({'music_ids': [ids[3]], 'position': '2'}, {'music_ids': ['1']},
+                         {'music_ids': [True]}, {'music_ids': []}, {'music_ids': [[1]]}):
+                assert client.post(url, headers=headers, json=body).status_code == 400
+            assert client.delete(url, headers=headers, json={'music_ids': [{'id': 1}]}).status_code == 400
+            
+            response = client.delete(url, headers=headers, json={'music_ids': [ids[1], ids[3]]})
+            assert response.get_json()['removed'] == [ids[1]]
+            assert response.get_json()['not_in_playlist'] == [ids[3]]
+
+
+def test_task_list_counters():
+    """Contadores das listas acompanham criação, edição, conclusão e remoção de tarefas"""
+    app = create_test_app()
+    
+    with app.app_context():
+        user, headers = create_test_user('tarefeiro')
+        first = TaskList.create_default_list(user.id)
+        second = TaskList(title='Trabalho', user_id=user.id)
+        db.session.add(second)
+        db.session.commit()
+        
+        with app.test_client() as client:
+            ids = [
+                client.post('/api/tasks/', json={'title': f'Tarefa {i}', 'task_list_id': first.id},
+                            headers=headers).get_json()['task']['id']
+                for i in range(6)
+            ]
+            client.patch(f'/api/tasks/{ids[0]}/toggle', headers=headers)
+            client.put(f'/api/tasks/{ids[1]}', json={'completed': True, 'task_list_id': second.id},
+                       headers=headers)
+            client.delete(f'/api/tasks/{ids[2]}', headers=headers)
+            client.post('/api/tasks/bulk', json={'task_ids': ids[3:5], 'operation': 'complete'},
+                        headers=headers)
+            client.post('/api/tasks/bulk', json={'task_ids': [ids[3], ids[5]], 'operation': 'move',
+                                                 'target_list_id': second.id}, headers=headers)
+            client.post('/api/tasks/bulk', json={'task_ids': [ids[4]], 'operation': 'delete'},
+                        headers=headers)
+            
+            lists = client.get('/api/task-lists/', headers=headers).get_json()['task_lists']
+        
+        counts = {tl['id']: (tl['task_count'], tl['completed_count'], tl['pending_count']) for tl in lists}
+        assert counts == {first.id: (1, 1, 0), second.id: (3, 2, 1)}
+        assert TaskList.reconcile_counters() == 0
+
+
+def test_spotify_response_cache():
+    """Respostas do Spotify são servidas do cache, com LRU e backend compartilhado"""
+    with fake_spotify_server() as server:
+        service = create_test_spotify_service(server)
+        service.cache.clear()
+        
+        first = service.search_tracks('Anitta')
+        assert service.search_tracks(' anitta ') == first
+        assert service.get_track('abc') == service.get_track('abc')
+        
+        assert server['/v1/search'] == 1
+        assert server['/v1/tracks/abc'] == 1
+        stats = service.cache.stats()
+        assert (stats['hits'], stats['misses']) == (2, 2)
+    
+    # LRU por número de entradas
+    cache = ResponseCache(MemoryCacheBackend(max_entries=2))
+    for name in ('a', 'b', 'c'):
+        cache.set(f'tracks/{name}', {'id': name})
+    assert cache.get('tracks/a') is None
+    assert cache.get('tracks/c') == {'id': 'c'}
+    assert cache.stats()['evictions'] == 1
+    
+    # Backend SQLite compartilhado entre instâncias (workers)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'cache.db')
+        writer = ResponseCache(SQLiteCacheBackend(path, max_entries=10))
+        reader = ResponseCache(SQLiteCacheBackend(path, max_entries=10))
+        writer.set('search', {'tracks': []}, {'q': 'Pitty'})
+        assert reader.get('search', {'q': 'pitty'}) == {'tracks': []}
+
+
+def test_spotify_retries_and_circuit_breaker():
+    """Conexões reaproveitadas, retentativas em 5xx/429 e disjuntor com o upstream fora"""
+    with fake_spotify_server() as server:
+        service = create_test_spotify_service(server)
+        service.cache.clear()
+        service.backoff_base = 0.01
+        service.read_timeout = 0.3
+        service.max_retries = 2
+        service.circuit_breaker.failure_threshold = 2
+        
+        # Keep-alive: várias chamadas pela mesma conexão
+        for query in ('rock', 'samba', 'forró'):
+            assert service.search_tracks(query)
+        assert len(server.connections) == 1
+        
+        # 5xx é repetido até dar certo
+        server.faults = [(500, {}), (503, {})]
+        assert service.search_tracks('mpb')
+        assert server['/v1/search'] == 6
+        
+        # 429 espera o Retry-After
+        server.faults = [(429, {'Retry-After': '1'})]
+        start = time.monotonic()
+        assert service.search_tracks('pagode')
+        assert time.monotonic() - start >= 1
+        
+        # Durante uma requisição, Retry-After longo faz desistir na hora
+        server.faults = [(429, {'Retry-After': '5'})]
+        start = time.monotonic()
+        with Flask(__name__).test_request_context():
+            assert service.search_tracks('choro') == []
+        assert time.monotonic() - start < 1
+        
+        # Esperas que passariam do prazo total encerram a chamada
+        assert service.search_tracks('frevo')
+        service.deadline, service.backoff_base = 0.5, 0.4
+        server.faults = [(503, {})] * 3
+        before, start = server['/v1/search'], time.monotonic()
+        assert service.search_tracks('baião') == []
+        assert time.monotonic() - start < 0.6
+        assert server['/v1/search'] - before == 2
+        service.deadline, service.backoff_base, server.faults = 15, 0.01, []
+        assert service.search_tracks('xote')
+        
+        # Timeouts seguidos abrem o circuito; chamadas seguintes nem saem
+        server.delay = 0.5
+        assert service.search_tracks('axé') == []
+        assert service.search_tracks('funk') == []
+        assert service.circuit_breaker.state == 'open'
+        before = server['/v1/search']
+        assert service.search_tracks('sertanejo') == []
+        assert server['/v1/search'] == before
+        
+        # Respostas em cache continuam disponíveis
+        assert service.search_tracks('rock')
+
+
+def test_import_batch_from_spotify(monkeypatch):
+    """Importação em lote: uma consulta para os existentes, blocos de 50 no Spotify"""
+    app = create_test_app()
+    
+    with fake_spotify_server() as server, app.app_context():
+        service = create_test_spotify_service(server, AsyncSpotifyService)
+        service.cache.clear()
+        monkeypatch.setattr('app.routes.music.async_spotify_service', service)
+        
+        _, headers = create_test_user('importador')
+        db.session.add(Music(title='Já existe', artist='Artista', spotify_id='faixa0'))
+        db.session.commit()
+        
+        spotify_ids = [f'faixa{i}' for i in range(120)] + ['inexistente1', 'faixa5']
+        with app.test_client() as client:
+            response = client.post('/api/music/import/batch', headers=headers,
+                                   json={'spotify_ids': spotify_ids})
+            assert response.status_code == 201
+            body = response.get_json()
+            assert (body['imported'], body['already_exists'], body['not_found']) == (119, 1, 1)
+            
+            statuses = {result['spotify_id']: result['status'] for result in body['results']}
+            assert statuses['faixa0'] == 'already_exists'
+            assert statuses['faixa7'] == 'imported'
+            assert statuses['inexistente1'] == 'not_found'
+            assert len(body['results']) == 121
+            assert sorted(server.batch_sizes) == [20, 50, 50]
+            assert Music.query.count() == 120
+            
+            # Repetir não chama o Spotify nem duplica músicas
+            response = client.post('/api/music/import/batch', headers=headers,
+                                   json={'spotify_ids': spotify_ids[:60]})
+            assert response.status_code == 200
+            assert response.get_json()['already_exists'] == 60
+            assert len(server.batch_sizes) == 3
+            
+            # Spotify fora: indisponível, não "inexistente"; cache inválido não quebra a rota
+            service.cache.set('tracks/quebrada', {'id': 'quebrada', 'artists': 5})
+            service.max_retries = 0
+            server.faults = [(500, {})]
+            response = client.post('/api/music/import/batch', headers=headers,
+                                   json={'spotify_ids': ['nova1', 'nova2', 'quebrada']})
+            assert response.status_code == 503
+            body = response.get_json()
+            assert (body['unavailable'], body['not_found']) == (2, 1)
+            statuses = {result['spotify_id']: result['status'] for result in body['results']}
+            assert statuses == {'nova1': 'unavailable', 'nova2': 'unavailable', 'quebrada': 'not_found'}
+            
+            response = client.post('/api/music/import/batch', headers=headers, json={'spotify_ids': []})
+            assert response.status_code == 400
+        service.close()
+
+
+def test_async_spotify_fan_out():
+    """Consultas em paralelo com concorrência limitada e um único token"""
+    with fake_spotify_server() as server:
+        service = create_test_spotify_service(server, AsyncSpotifyService)
+        service.cache.clear()
+        service.max_concurrency = 10
+        server.delay = 0.05
+        
+        start = time.monotonic()
+        tracks = service.get_many_tracks([f'faixa{i}' for i in range(50)])
+        elapsed = time.monotonic() - start
+        
+        assert [track['spotify_id'] for track in tracks] == [f'faixa{i}' for i in range(50)]
+        assert server['/api/token'] == 1
+        # 5 rodadas de 10 requisições, em vez de 50 em sequência (2.5s)
+        assert elapsed < 1.5
+        
+        results = service.search_many(['rock', 'samba'])
+        assert len(results) == 2 and all(results)
+        
+        features = service.get_many_track_features(['faixa1', 'faixa2'])
+        assert [f['id'] for f in features] == ['faixa1', 'faixa2']
+        top_tracks = service.get_many_artist_top_tracks(['artista1', 'artista2'], limit=2)
+        assert [[t['spotify_id'] for t in tracks] for tracks in top_tracks] == \
+            [['artista1-0', 'artista1-1'], ['artista2-0', 'artista2-1']]
+        
+        # Event loop sem resposta no prazo: a thread da requisição não fica presa
+        service.run_timeout = 0.1
+        server.delay = 0.5
+        start = time.monotonic()
+        assert service.get_tracks(['lenta1', 'lenta2']) == {'lenta1': None, 'lenta2': None}
+        assert service.get_many_tracks(['lenta3']) == [None]
+        assert time.monotonic() - start < 0.5
+        service.close()
+
+
+def test_async_spotify_shares_sync_state():
+    """Serviço assíncrono usa o cache, o token e o disjuntor do síncrono, sem sessão própria"""
+    with fake_spotify_server() as server:
+        sync_service = create_test_spotify_service(server)
+        sync_service.cache.clear()
+        service = AsyncSpotifyService(sync_service=sync_service)
+        service.base_url = sync_service.base_url
+        
+        assert sync_service.get_track('faixa1')
+        assert service.get_many_tracks(['faixa2', 'faixa3'])
+        assert server['/api/token'] == 1
+        assert service.circuit_breaker is sync_service.circuit_breaker
+        assert service.cache is sync_service.cache
+        assert service._session is None
+        
+        # Disjuntor aberto pelo caminho síncrono também bloqueia o assíncrono
+        for _ in range(sync_service.circuit_breaker.failure_threshold):
+            sync_service.circuit_breaker.record_failure()
+        before = server['/v1/tracks/faixa4']
+        assert service.get_many_tracks(['faixa4']) == [None]
+        assert server['/v1/tracks/faixa4'] == before
+        service.close()
+
+
+def test_spotify_single_flight_under_load():
+    """64 threads simultâneas: um único token e uma requisição por consulta distinta"""
+    with fake_spotify_server() as server:
+        service = create_test_spotify_service(server)
+        service.cache.clear()
+        server.delay = 0.2
+        
+        threads = 64
+        queries = [f'gênero {i % 8}' for i in range(threads)]
+        barrier = threading.Barrier(threads)
+        results = [None] * threads
+        
+        def worker(index):
+            barrier.wait()
+            results[index] = service.search_tracks(queries[index])
+        
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        
+        assert server['/api/token'] == 1
+        assert server['/v1/search'] == 8
+        assert all(results)
+        assert not service._inflight
+
+
+def test_music_full_text_search():
+    """Busca por prefixo, sem acentos, ordenada por relevância e mantida por triggers"""
+    app = create_test_app()
+    
+    with app.app_context():
+        user, headers = create_test_user('ouvinte')
+        other, _ = create_test_user('outro')
+        db.session.add_all([
+            Music(title='Lágrimas', artist='Dulce Pontes', album='Canção do Mar'),
+            Music(title='Canção do Mar', artist='Dulce Pontes', album='Lágrimas'),
+            Music(title='Mar de Gente', artist='O Rappa', album='Lado B Lado A'),
+            Music(title='Canção Secreta', artist='Alguém', is_public=False, uploaded_by_id=other.id),
+        ])
+        db.session.commit()
+        
+        def search(term):
+            response = client.get('/api/music/', headers=headers, query_string={'search': term})
+            assert response.status_code == 200
+            return [music['title'] for music in response.get_json()['music']]
+        
+        with app.test_client() as client:
+            # Sem acento, por prefixo; título pesa mais que álbum
+            assert search('cancao') == ['Canção do Mar', 'Lágrimas']
+            assert search('CANÇ MA') == ['Canção do Mar', 'Lágrimas']
+            assert search('mar')[-1] == 'Lágrimas'
+            assert search('rappa') == ['Mar de Gente']
+            # Aspas e operadores do FTS são tratados como texto comum
+            assert search('"mar*"') == search('mar')
+            
+            # Triggers mantêm o índice em alterações e exclusões
+            music = Music.query.filter_by(title='Mar de Gente').first()
+            music.title = 'Minha Alma'
+            db.session.commit()
+            assert search('gente') == []
+            assert search('alma') == ['Minha Alma']
+            
+            db.session.delete(music)
+            db.session.commit()
+            assert search('rappa') == []
+
+
+def test_music_suggest():
+    """Sugestões por prefixo: sem acentos, por reproduções, privadas só para o dono"""
+    app = create_test_app()
+    
+    with app.app_context():
+        user, headers = create_test_user('ouvinte')
+        other, other_headers = create_test_user('outro')
+        db.session.add_all([
+            Music(title='Lágrimas', artist='Lulu Santos', play_count=5),
+            Music(title='Lanterna dos Afogados', artist='Os Paralamas', play_count=50),
+            Music(title='Lá Vem o Sol', artist='Lulu Santos', play_count=1),
+            Music(title='Lista Secreta', artist='Alguém', is_public=False, uploaded_by_id=other.id),
+        ])
+        db.session.commit()
+        
+        def suggest(term, headers=headers):
+            response = client.get('/api/music/suggest', headers=headers, query_string={'q': term})
+            assert response.status_code == 200
+            return [(item['type'], item['text']) for item in response.get_json()['suggestions']]
+        
+        with app.test_client() as client:
+            assert suggest('la') == [('title', 'Lanterna dos Afogados'), ('title', 'Lágrimas'),
+                                     ('title', 'Lá Vem o Sol')]
+            assert suggest('LULU') == [('artist', 'Lulu Santos')]
+            assert suggest('lis') == []
+            assert suggest('lis', other_headers) == [('title', 'Lista Secreta')]
+            
+            # Atualizado a cada commit; rollback não altera o índice
+            music = Music.query.filter_by(title='Lanterna dos Afogados').first()
+            music.title = 'Óculos'
+            db.session.commit()
+            assert suggest('lan') == []
+            assert suggest('ocu') == [('title', 'Óculos')]
+            
+            db.session.add(Music(title='Lamento', artist='Pixinguinha'))
+            db.session.flush()
+            db.session.rollback()
+            assert suggest('lam') == []
+            
+            lulu = Music.query.filter_by(title='Lágrimas').first()
+            db.session.delete(lulu)
+            db.session.commit()
+            assert suggest('lulu')[0] == ('artist', 'Lulu Santos')
+            assert [item['count'] for item in suggest_index.suggest('lulu')] == [1]
+            
+            lulu = Music.query.filter_by(title='Lá Vem o Sol').first()
+            db.session.delete(lulu)
+            db.session.commit()
+            assert suggest('lulu') == []
+            
+            # Mudanças feitas por outro worker (sem passar pelos eventos deste
+            # processo): conferidas no banco antes de sugerir
+            table = Music.__table__
+            db.session.execute(table.update().where(table.c.title == 'Lista Secreta').values(is_public=True))
+            db.session.execute(table.update().where(table.c.title == 'Óculos').values(is_public=False))
+            db.session.execute(table.delete().where(table.c.title == 'Lágrimas'))
+            db.session.commit()
+            assert suggest('ocu') == []
+            assert suggest('lis', other_headers) == [('title', 'Lista Secreta')]
+            suggest_index.build()
+            assert suggest('lis') == [('title', 'Lista Secreta')]
+            
+            # Grafias que só diferem em maiúsculas ou acentos formam uma
+            # sugestão; apagar a música de uma delas não esconde as outras
+            db.session.add_all([Music(title='Ângela', artist='Rita Lee'),
+                                Music(title='ANGELA', artist='Rita Lee'),
+                                Music(title='ANGELA', artist='Rita Lee')])
+            db.session.commit()
+            assert suggest('ang') == [('title', 'ANGELA')]
+            db.session.execute(table.delete().where(table.c.title == 'Ângela'))
+            db.session.commit()
+            assert suggest('ang') == [('title', 'ANGELA')]
+            db.session.execute(table.delete().where(table.c.title == 'ANGELA'))
+            db.session.commit()
+            assert suggest('ang') == []
+
+
+def test_fuzzy_search(monkeypatch):
+    """mode=fuzzy tolera erros de digitação em músicas e playlists"""
+    app = create_test_app()
+    
+    with app.app_context():
+        user, headers = create_test_user('ouvinte')
+        db.session.add_all([
+            Music(title='Garota de Ipanema', artist='Tom Jobim'),
+            Music(title='Aquarela do Brasil', artist='Ary Barroso'),
+            Music(title='Águas de Março', artist='Elis Regina'),
+            Playlist(name='Bossa Nova Clássica', owner_id=user.id),
+            Playlist(name='Rock Nacional', owner_id=user.id),
+        ])
+        db.session.commit()
+        
+        def search(url, term, **params):
+            response = client.get(url, headers=headers,
+                                  query_string={'search': term, 'mode': 'fuzzy', **params})
+            assert response.status_code == 200
+            return response.get_json()
+        
+        with app.test_client() as client:
+            titles = [m['title'] for m in search('/api/music/', 'ipanemma')['music']]
+            assert titles == ['Garota de Ipanema']
+            assert [m['title'] for m in search('/api/music/', 'agua marco')['music']] == ['Águas de Março']
+            assert search('/api/music/', 'jobin')['music'][0]['artist'] == 'Tom Jobim'
+            assert search('/api/music/', 'xyzw')['music'] == []
+            
+            # Modo texto não encontra com erro de digitação
+            response = client.get('/api/music/', headers=headers, query_string={'search': 'ipanemma'})
+            assert response.get_json()['music'] == []
+            
+            names = [p['name'] for p in search('/api/playlists/', 'bosa nova')['playlists']]
+            assert names == ['Bossa Nova Clássica']
+            
+            # Índice em memória acompanha os commits
+            playlist = Playlist.query.filter_by(name='Rock Nacional').first()
+            playlist.name = 'Samba Enredo'
+            db.session.commit()
+            assert search('/api/playlists/', 'rock nacional')['playlists'] == []
+            assert [p['name'] for p in search('/api/playlists/', 'samba enredu')['playlists']] == ['Samba Enredo']
+            
+            # Limite de similaridade configurável
+            assert search('/api/music/', 'aquarella brazil', similarity=0.95)['music'] == []
+            assert search('/api/music/', 'aquarella brazil', similarity=0.5)['music'][0]['title'] == 'Aquarela do Brasil'
+            
+            response = client.get('/api/music/', headers=headers, query_string={'search': 'a', 'mode': 'x'})
+            assert response.status_code == 400
+            
+            # Renomear muitas vezes não acumula documentos mortos
+            index = fuzzy_search.index('playlists')
+            for i in range(300):
+                playlist.name = f'Samba Enredo {i}'
+                db.session.commit()
+            assert len(index.doc_items) < 200
+            assert sum(len(docs) for docs in index.postings.values()) < 200 * 20
+            assert [p['name'] for p in search('/api/playlists/', 'samba enredo 299')['playlists']][0] == \
+                'Samba Enredo 299'
+            
+            # Itens privados de outros usuários não ocupam as vagas de candidatos
+            other, _ = create_test_user('outro')
+            db.session.add_all([Music(title=f'Garota de Ipanema {i}', artist='Tom Jobim',
+                                      is_public=False, uploaded_by_id=other.id) for i in range(5)])
+            db.session.commit()
+            monkeypatch.setattr('app.services.fuzzy_search.MAX_CANDIDATES', 2)
+            assert [m['title'] for m in search('/api/music/', 'ipanemma')['music']] == ['Garota de Ipanema']
+            
+            # Nem itens fora dos filtros da listagem (gênero, ano...)
+            db.session.add_all([Music(title='Garota de Ipanema', artist='Tom Jobim', genre='Rock')
+                                for _ in range(3)])
+            db.session.add(Music(title='Garota de Ipanema (ao vivo no Rio)', artist='Tom Jobim', genre='Bossa'))
+            db.session.commit()
+            titles = [m['title'] for m in search('/api/music/', 'ipanemma', genre='Bossa')['music']]
+            assert titles == ['Garota de Ipanema (ao vivo no Rio)']
+            monkeypatch.undo()
+            
+            # Criações de outros workers entram na reconstrução periódica
+            db.session.execute(Music.__table__.insert().values(
+                title='Chega de Saudade', artist='João Gilberto', is_local=False, is_public=True,
+                play_count=0, created_at=datetime.utcnow(), updated_at=datetime.utcnow()
+            ))
+            db.session.commit()
+            assert search('/api/music/', 'xega de saudade')['music'] == []
+            fuzzy_search.rebuild_interval = 0.01
+            time.sleep(0.02)
+            search('/api/music/', 'xega de saudade')  # dispara a reconstrução
+            for _ in range(100):
+                if 'music' not in fuzzy_search._rebuilding:
+                    break
+                time.sleep(0.02)
+            fuzzy_search.rebuild_interval = 0
+            assert [m['title'] for m in search('/api/music/', 'xega de saudade')['music']] == ['Chega de Saudade']
+
+
+def test_cursor_pagination():
+    """?cursor= percorre a lista na mesma ordem das páginas, sem repetir itens"""
+    app = create_test_app()
+    
+    with app.app_context():
+        user, headers = create_test_user('ouvinte')
+        created_at = datetime(2024, 1, 1)
+        # Datas repetidas: o id desempata a ordem
+        db.session.add_all([
+            Music(title=f'Música {i}', artist='Artista', created_at=created_at + timedelta(days=i // 3))
+            for i in range(25)
+        ])
+        db.session.commit()
+        
+        with app.test_client() as client:
+            def get(**params):
+                response = client.get('/api/music/', headers=headers, query_string=params)
+                assert response.status_code == 200
+                return response.get_json()
+            
+            by_page = []
+            for page in (1, 2, 3):
+                data = get(page=page, per_page=10)
+                assert data['total'] == 25 and data['pages'] == 3
+                by_page.extend(m['id'] for m in data['music'])
+            
+            by_cursor, params = [], {'per_page': 10, 'count': 'none'}
+            while True:
+                data = get(**params)
+                assert data['total'] is None
+                by_cursor.extend(m['id'] for m in data['music'])
+                if not data['has_next']:
+                    break
+                params['cursor'] = data['next_cursor']
+            
+            assert by_cursor == by_page
+            assert len(set(by_page)) == 25
+            
+            # Contagem estimada reaproveita o COUNT anterior
+            assert get(count='estimated')['total'] == 25
+            db.session.add(Music(title='Nova', artist='Artista'))
+            db.session.commit()
+            assert get(count='estimated')['total'] == 25
+            assert get(count='exact')['total'] == 26
+            
+            # Cursor adulterado, modo de contagem inválido ou cursor com busca
+            for params in ({'cursor': 'xyz'}, {'count': 'talvez'}, {'cursor': by_page[0], 'search': 'a'}):
+                response = client.get('/api/music/', headers=headers, query_string=params)
+                assert response.status_code == 400
+            
+            # Usuários (admin): mesma paginação, 10 por página por padrão
+            _, admin_headers = create_test_user('admin', is_admin=True)
+            response = client.get('/api/users/', headers=admin_headers, query_string={'per_page': 1})
+            data = response.get_json()
+            assert data['has_next'] and data['total'] == 2
+            response = client.get('/api/users/', headers=admin_headers,
+                                  query_string={'cursor': data['next_cursor'], 'count': 'none'})
+            assert len(response.get_json()['users']) == 1
+            assert not response.get_json()['has_next']
+
+
+def test_task_dashboard_stats():
+    """Dashboard agregado no SQL dá os mesmos números que o cálculo tarefa a tarefa"""
+    app = create_test_app()
+    
+    with app.app_context():
+        user, headers = create_test_user('organizado')
+        other, _ = create_test_user('outro')
+        task_list = TaskList(title='Trabalho', user_id=user.id)
+        other_list = TaskList(title='Outra', user_id=other.id)
+        db.session.add_all([task_list, other_list])
+        db.session.flush()
+        now = datetime.utcnow()
+        priorities = ('low', 'medium', 'high', 'urgent')
+        for i in range(40):
+            db.session.add(Task(
+                title=f'Tarefa {i}', priority=priorities[i % 4], completed=i % 3 == 0,
+                due_date=now + timedelta(days=i % 20 - 10, hours=1) if i % 7 else None,
+                created_at=now - timedelta(days=i % 14, hours=12),
+                task_list_id=task_list.id, user_id=user.id
+            ))
+        db.session.add(Task(title='De outro usuário', priority='urgent', due_date=now - timedelta(days=1),
+                            task_list_id=other_list.id, user_id=other.id))
+        db.session.commit()
+        
+        # Cálculo de referência, como era feito antes (objeto por objeto)
+        tasks = Task.query.filter_by(user_id=user.id).all()
+        week_ago, next_week = now - timedelta(days=7), now + timedelta(days=7)
+        upcoming = sorted((t for t in tasks if t.due_date and not t.completed and t.due_date <= next_week),
+                          key=lambda t: (t.due_date, t.id))
+        completed = len([t for t in tasks if t.completed])
+        expected = {
+            'total_tasks': len(tasks),
+            'completed_tasks': completed,
+            'pending_tasks': len(tasks) - completed,
+            'overdue_tasks': len([t for t in tasks if t.is_overdue()]),
+            'completion_rate': round(completed / len(tasks) * 100, 2),
+            'priority_breakdown': {p: len([t for t in tasks if t.priority == p and not t.completed])
+                                   for p in priorities},
+            'recent_tasks_count': len([t for t in tasks if t.created_at >= week_ago]),
+            'upcoming_tasks_count': len(upcoming)
+        }
+        assert 0 < expected['overdue_tasks'] < expected['pending_tasks']
+        
+        with app.test_client() as client:
+            response = client.get('/api/tasks/dashboard', headers=headers)
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['stats'] == expected
+        assert [t['id'] for t in data['upcoming_tasks']] == [t.id for t in upcoming[:5]]
+
+
+def test_task_cursor_pagination():
+    """Tarefas: cursor na ordem da listagem, atrasadas filtradas no SQL e cursor adulterado com 400"""
+    app = create_test_app()
+    
+    with app.app_context():
+        user, headers = create_test_user('organizado')
+        task_list = TaskList(title='Trabalho', user_id=user.id)
+        db.session.add(task_list)
+        db.session.flush()
+        now = datetime.utcnow()
+        priorities = ('low', 'medium', 'high', 'urgent')
+        for i in range(23):
+            db.session.add(Task(
+                title=f'Tarefa {i}', priority=priorities[i % 4], completed=i % 5 == 0,
+                due_date=now + timedelta(days=i - 10) if i % 3 else None,
+                task_list_id=task_list.id, user_id=user.id
+            ))
+        db.session.commit()
+        
+        with app.test_client() as client:
+            def get(**params):
+                response = client.get('/api/tasks/', headers=headers, query_string=params)
+                assert response.status_code == 200, response.get_json()
+                return response.get_json()
+            
+            everything = [t['id'] for t in get()['tasks']]
+            assert len(everything) == 23
+            
+            by_cursor, params = [], {'limit': 4}
+            while True:
+                data = get(**params)
+                by_cursor.extend(t['id'] for t in data['tasks'])
+                if not data['has_more']:
+                    break
+                params['cursor'] = data['next_cursor']
+            assert by_cursor == everything
+            
+            data = get(overdue_only='true')
+            expected = {t.id for t in Task.query.all()
+                        if t.due_date and t.due_date < now and not t.completed}
+            assert {t['id'] for t in data['tasks']} == expected
+            assert data['total'] == len(expected)
+            
+            # Base64 válido, mas com tipos que o cursor nunca produz
+            for values in ([{'a': 1}, 0, None, 1], [0, 0, 'x', 1], [0, 0, None, 2 ** 70],
+                           [True, 0, None, 1], [0, 0, {'dt': 5}, 1]):
+                cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+                response = client.get('/api/tasks/', headers=headers, query_string={'cursor': cursor})
+                assert response.status_code == 400, values
+
+
+def test_play_count_write_behind():
+    """Reproduções acumuladas aparecem na leitura e chegam ao banco no flush"""
+    app = create_test_app()
+    
+    with app.app_context():
+        user, headers = create_test_user('ouvinte')
+        music = Music(title='Faixa', artist='Artista', play_count=10)
+        playlist = Playlist(name='Favoritas', owner_id=user.id)
+        db.session.add_all([music, playlist])
+        db.session.commit()
+        play_counter.flush()
+        
+        with app.test_client() as client:
+            for _ in range(3):
+                response = client.post(f'/api/music/{music.id}/play', headers=headers)
+            assert response.get_json()['play_count'] == 13
+            response = client.post(f'/api/playlists/{playlist.id}/play', headers=headers)
+            assert response.get_json()['play_count'] == 1
+            
+            # A leitura logo depois não "volta" o contador
+            assert client.get(f'/api/music/{music.id}', headers=headers).get_json()['music']['play_count'] == 13
+            assert client.get(f'/api/playlists/{playlist.id}', headers=headers).get_json()['playlist']['play_count'] == 1
+            assert db.session.scalar(select(Music.__table__.c.play_count).where(Music.id == music.id)) == 10
+            
+            assert play_counter.flush() == 4
+            assert play_counter.pending('music', music.id) == 0
+            assert db.session.scalar(select(Music.__table__.c.play_count).where(Music.id == music.id)) == 13
+            assert db.session.scalar(select(Playlist.__table__.c.play_count).where(Playlist.id == playlist.id)) == 1
+            db.session.expire_all()
+            assert client.get(f'/api/music/{music.id}', headers=headers).get_json()['music']['play_count'] == 13
+
+
+def test_stream_play_counting():
+    """Streaming conta a reprodução só quando o áudio sai desde o byte 0"""
+    app = create_test_app()
+    
+    with app.app_context(), tempfile.TemporaryDirectory() as directory:
+        user, headers = create_test_user('ouvinte')
+        path = os.path.join(directory, 'faixa.mp3')
+        with open(path, 'wb') as f:
+            f.write(b'\0' * 4096)
+        music = Music(title='Faixa', artist='Artista', is_local=True, file_path=path,
+                      file_format='mp3', file_size=4096)
+        db.session.add(music)
+        db.session.commit()
+        url = f'/api/music/{music.id}/stream'
+        play_counter.replay_window = 1.0
+        
+        def plays(method='get', status=200, **kwargs):
+            before = play_counter.pending('music', music.id)
+            with app.test_client() as client:
+                response = getattr(client, method)(url, headers={**headers, **kwargs.pop('extra', {})}, **kwargs)
+                response.close()
+            assert response.status_code == status
+            return play_counter.pending('music', music.id) - before
+        
+        assert plays() == 1
+        assert plays('head') == 0
+        assert plays(status=206, extra={'Range': 'bytes=100-'}) == 0
+        
+        # Sem playback_id: o player pedir o início de novo logo em seguida
+        # não conta; passada a janela, é uma nova reprodução
+        assert plays(status=206, extra={'Range': 'bytes=0-99'}) == 0
+        assert plays() == 0
+        time.sleep(1.05)
+        assert plays(status=206, extra={'Range': 'bytes=0-99'}) == 1
+        with app.test_client() as client:
+            etag = client.get(url, headers=headers).headers['ETag']
+        assert plays(status=304, extra={'If-None-Match': etag}) == 0
+        
+        # Mesma sessão de reprodução: uma única contagem
+        query = {'playback_id': 'sessao-1'}
+        assert plays(status=206, extra={'Range': 'bytes=0-99'}, query_string=query) == 1
+        assert plays(query_string=query) == 0
+        play_counter.flush()
+        play_counter.replay_window = app.config['PLAY_COUNT_REPLAY_WINDOW']
+
+
+def test_token_revocation():
+    """Logout revoga o token em todas as rotas e nos demais workers"""
+    app = create_test_app()
+    
+    with app.app_context():
+        user, headers = create_test_user('ouvinte')
+        _, other_headers = create_test_user('outro')
+        
+        with app.test_client() as client:
+            assert client.get('/api/tasks/', headers=headers).status_code == 200
+            
+            # Token válido: verificado pelo filtro de Bloom, sem consultar revoked_tokens
+            with count_queries() as statements:
+                client.get('/api/tasks/', headers=headers)
+            assert not [s for s in statements if 'revoked_tokens' in s]
+            
+            assert client.post('/api/auth/logout', headers=headers).status_code == 200
+            for url in ('/api/tasks/', '/api/music/', '/api/auth/me'):
+                response = client.get(url, headers=headers)
+                assert response.status_code == 401
+                assert response.get_json()['error'] == 'Token foi revogado'
+            assert client.get('/api/tasks/', headers=other_headers).status_code == 200
+        
+        # Outro worker: vê a revogação na sincronização com a tabela
+        jti = RevokedToken.query.one().jti
+        worker = TokenBlocklist()
+        worker.init_app(app)
+        assert worker.is_revoked(jti)
+        assert not worker.is_revoked('nao-revogado')
+        
+        worker.sync_interval = 0
+        late = 'revogado-depois'
+        assert not worker.is_revoked(late)
+        token_blocklist.revoke(late, datetime.utcnow() + timedelta(hours=1))
+        assert worker.is_revoked(late)
+        
+        # Tokens expirados são apagados na limpeza periódica (em segundo plano)
+        token_blocklist.revoke('expirado', datetime.utcnow() - timedelta(minutes=1))
+        worker.reload_interval = 0
+        worker.is_revoked(jti)
+        worker._reload_thread.join()
+        worker.reload_interval = 3600
+        assert not worker.is_revoked('expirado')
+        assert db.session.get(RevokedToken, 'expirado') is None
+        assert worker.is_revoked(jti)
+        
+        # Revogação feita neste processo enquanto a reconstrução lê a tabela
+        def revoke_during_load(conn, cursor, statement, *args):
+            if statement.startswith('SELECT revoked_tokens.jti') and 'WHERE' not in statement:
+                with worker._lock:
+                    worker._mark_revoked('durante')
+                    worker._remember('durante', True)
+        
+        event.listen(db.engine, 'after_cursor_execute', revoke_during_load)
+        try:
+            worker.reload_interval = 0
+            worker.is_revoked(jti)
+            worker._reload_thread.join()
+        finally:
+            event.remove(db.engine, 'after_cursor_execute', revoke_during_load)
+        worker.reload_interval = 3600
+        assert worker.is_revoked('durante')
+
+    # A limpeza não confirma alterações pendentes da sessão da requisição
+    # (banco em arquivo: em memória todas as conexões são a mesma)
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'tokens.db')}"
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+            token_blocklist.revoke('expirado', datetime.utcnow() - timedelta(minutes=1))
+            worker = TokenBlocklist()
+            worker.init_app(app)
+            worker.reload_interval = worker.sync_interval = 0
+            assert worker.is_revoked('expirado')
+            db.session.add(Music(title='Rascunho', artist='Artista'))
+            db.session.flush()
+            worker.is_revoked('outro')  # dispara a limpeza
+            db.session.rollback()
+            worker._reload_thread.join()
+            assert Music.query.filter_by(title='Rascunho').first() is None
+            assert db.session.get(RevokedToken, 'expirado') is None
+            db.session.remove()
+            db.engine.dispose()
+
+
+def test_current_user_loader():
+    """Permissões vêm do cache do processo ou das claims do token, sem query extra"""
+    app = create_test_app()
+    
+    with app.app_context():
+        admin, headers = create_test_user('admin', is_admin=True)
+        admin_id, engine = admin.id, db.engine
+    
+    def user_queries(url):
+        """(status, queries em users) de uma requisição com sessão nova"""
+        statements = []
+        
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+        
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            with app.test_client() as client:
+                response = client.get(url, headers=headers)
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+        return response.status_code, len([s for s in statements if 'FROM users' in s and 'count(' not in s])
+    
+    # Sem cache: uma query por requisição; com cache, só a primeira
+    current_user_loader.cache_ttl = 0
+    assert user_queries('/api/users/') == (200, 2)  # verificação + listagem
+    current_user_loader.cache_ttl = 5
+    assert user_queries('/api/users/') == (200, 2)
+    assert user_queries('/api/users/') == (200, 1)
+    
+    # Alterar o usuário invalida o cache no commit
+    with app.app_context():
+        db.session.get(User, admin_id).is_admin = False
+        db.session.commit()
+    assert user_queries('/api/users/')[0] == 403
+    with app.app_context():
+        db.session.get(User, admin_id).is_admin = True
+        db.session.commit()
+    
+    # Claims no token: nenhuma query para verificar a permissão
+    current_user_loader.embed_claims = True
+    with app.test_client() as client:
+        response = client.post('/api/auth/login', json={'login': 'admin', 'password': 'senha123'})
+        headers = {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+    current_user_loader.cache_ttl = 0
+    assert user_queries(f'/api/users/{admin_id}') == (200, 1)  # só o usuário consultado
+
+
+def test_password_rehash_on_login():
+    """Hashes de outro algoritmo ou custo continuam válidos e são refeitos no login"""
+    app = create_test_app()
+    
+    with app.app_context():
+        user, _ = create_test_user('ouvinte')
+        assert user.password_hash.startswith('bcrypt-sha256:$2b$04$')
+        
+        # Hash antigo (PBKDF2 do werkzeug)
+        user.password_hash = generate_password_hash('senha123', method='pbkdf2:sha256:1000')
+        db.session.commit()
+        
+        def login(password):
+            with app.test_client() as client:
+                status = client.post('/api/auth/login', json={'login': 'ouvinte', 'password': password}).status_code
+            password_hasher.drain()
+            last_login_recorder.flush()
+            db.session.expire_all()
+            return status
+        
+        def stored_hash():
+            return db.session.get(User, user.id).password_hash
+        
+        assert login('errada') == 401
+        assert stored_hash().startswith('pbkdf2:')
+        assert login('senha123') == 200
+        assert stored_hash().startswith('bcrypt-sha256:$2b$04$')
+        
+        # Hash bcrypt sem pré-hash (gravado antes) também é refeito
+        import bcrypt
+        user = db.session.get(User, user.id)
+        user.password_hash = bcrypt.hashpw(b'senha123', bcrypt.gensalt(4)).decode('ascii')
+        db.session.commit()
+        assert login('senha123') == 200
+        assert stored_hash().startswith('bcrypt-sha256:$2b$04$')
+        
+        # Mudança de custo (e pool de processos)
+        password_hasher.configure('bcrypt', 5, pool='process', workers=1)
+        try:
+            assert login('senha123') == 200
+            assert stored_hash().startswith('bcrypt-sha256:$2b$05$')
+            
+            password_hasher.configure('scrypt', 10, pool='none')
+            assert login('senha123') == 200
+            assert stored_hash().startswith('scrypt:1024:8:1$')
+            assert login('senha123') == 200
+        finally:
+            password_hasher.configure('bcrypt', 4)
+        
+        # Rehash não sobrescreve uma senha trocada antes do flush
+        user = db.session.get(User, user.id)
+        old_hash = user.password_hash
+        user.set_password('outra123')
+        db.session.commit()
+        last_login_recorder.record_rehash(user.id, old_hash, 'obsoleto')
+        last_login_recorder.flush()
+        db.session.expire_all()
+        assert db.session.get(User, user.id).check_password('outra123')
+        
+        # Senhas longas não são truncadas em 72 bytes; NUL e surrogates não dão 500
+        long_hash = password_hasher.hash('a' * 80)
+        assert password_hasher.verify('a' * 80, long_hash)
+        assert not password_hasher.verify('a' * 72 + 'b' * 8, long_hash)
+        
+        _, headers = create_test_user('trocador')
+        with app.test_client() as client:
+            response = client.post('/api/auth/change-password', headers=headers, data=(
+                '{"current_password": "senha123", "new_password": "senha\\ud800"}'
+            ), content_type='application/json')
+            assert response.status_code == 400
+            response = client.post('/api/auth/change-password', headers=headers, json={
+                'current_password': 'senha123', 'new_password': 'senha\x00123'
+            })
+            assert response.status_code == 200
+            assert client.post('/api/auth/login', json={'login': 'trocador', 'password': 'senha\x00123'}).status_code == 200
+            assert client.post('/api/auth/login', json={'login': 'trocador', 'password': 'senha'}).status_code == 401
+            assert client.post('/api/auth/login', data='{"login": "trocador", "password": "senha\\ud800"}',
+                               content_type='application/json').status_code == 401
+            assert client.post('/api/auth/login', json={'login': 'trocador', 'password': 123456}).status_code == 401
+
+
+def test_login_hot_path():
+    """Login: uma query por coluna indexada, último login em lote e payload leve"""
+    app = create_test_app()
+    
+    with app.app_context():
+        user, _ = create_test_user('Ouvinte')
+        user_id = user.id
+        db.session.add(Playlist(name='Favoritas', owner_id=user_id))
+        db.session.commit()
+        engine = db.engine
+    
+    def login(name, **params):
+        statements = []
+        
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+        
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            with app.test_client() as client:
+                response = client.post('/api/auth/login', query_string=params,
+                                       json={'login': name, 'password': 'senha123'})
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+        return response, statements
+    
+    response, statements = login(' OUVINTE@test.local ')
+    assert response.status_code == 200
+    assert len(statements) == 1 and ' OR ' not in statements[0]
+    data = response.get_json()['user']
+    assert 'playlists_count' not in data and data['last_login']
+    
+    # Username continua diferenciando maiúsculas
+    assert login('Ouvinte')[0].status_code == 200
+    assert login('ouvinte')[0].status_code == 401
+    
+    response, _ = login('Ouvinte', include_counts='true')
+    assert response.get_json()['user']['playlists_count'] == 1
+    
+    # last_login só chega ao banco no flush
+    with app.app_context():
+        assert db.session.get(User, user_id).last_login is None
+        assert last_login_recorder.pending(user_id) is not None
+        last_login_recorder.flush()
+        assert last_login_recorder.pending(user_id) is None
+        assert db.session.get(User, user_id).last_login is not None
+        
+        # Um email por conta, sem diferenciar maiúsculas
+        assert User.find_by_email(' ouvinte@TEST.local').id == user_id
+        assert User.normalize_email(' Outro@Test.Local ') == 'outro@test.local'
+        db.session.add(User(username='outro', email='ouvinte@test.local',
+                            first_name='Outro', last_name='Teste', password_hash='-'))
+        try:
+            db.session.commit()
+            assert False, 'email repetido aceito'
+        except IntegrityError:
+            db.session.rollback()
+
+
+def test_user_list_counts():
+    """Página de 100 usuários: contagens em queries agrupadas, não por usuário"""
+    app = create_test_app()
+    
+    with app.app_context():
+        admin, headers = create_test_user('admin')
+        admin.is_admin = True
+        for i in range(100):
+            user = User(username=f'usuario{i}', email=f'usuario{i}@test.local',
+                        first_name='Usuário', last_name=str(i), password_hash='-')
+            db.session.add(user)
+            db.session.flush()
+            for j in range(i % 3):
+                db.session.add(Playlist(name=f'Playlist {j}', owner_id=user.id))
+            if i % 2:
+                db.session.add(Music(title=f'Música {i}', artist='Artista', uploaded_by_id=user.id))
+        db.session.commit()
+        
+        # Carga inicial da lista de tokens revogados e do cache de permissões
+        with app.test_client() as client:
+            client.get('/api/users/?per_page=1', headers=headers)
+        
+        db.session.expire_all()
+        with app.test_client() as client, count_queries() as statements:
+            response = client.get('/api/users/?per_page=100', headers=headers)
+        assert response.status_code == 200, response.get_json()
+        
+        # COUNT da paginação, usuários da página e um COUNT agrupado por relacionamento
+        assert len(statements) == 4, statements
+        users = {user['username']: user for user in response.get_json()['users']}
+        assert len(users) == 100
+        assert users['usuario5']['playlists_count'] == 2
+        assert users['usuario5']['uploads_count'] == 1
+        assert users['usuario6']['playlists_count'] == 0
+        assert users['usuario6']['uploads_count'] == 0
+        
+        # Um único usuário: as duas contagens em uma query, sem carregar as coleções
+        user_id = User.query.filter_by(username='usuario5').first().id
+        db.session.expire_all()
+        with app.test_client() as client, count_queries() as statements:
+            response = client.get(f'/api/users/{user_id}', headers=headers)
+        data = response.get_json()['user']
+        assert (data['playlists_count'], data['uploads_count']) == (2, 1)
+        assert len(statements) == 2, statements
+
+
 if __name__ == '__main__':
-    test_app() 
\ No newline at end of file
+    test_app() 
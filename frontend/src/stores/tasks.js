@@ -44,10 +44,21 @@ export const useTasksStore = defineStore('tasks', () => {
     error.value = null
     
     try {
-      const response = await apiService.get('/api/tasks', { params: filters })
-      
-      tasks.value = response.data.tasks || []
-      return response.data
+      // A API pagina por cursor: seguir next_cursor até a última página
+      const allTasks = []
+      let cursor = null
+      let data
+      do {
+        const params = { ...filters, limit: 500 }
+        if (cursor) params.cursor = cursor
+        const response = await apiService.get('/api/tasks', { params })
+        data = response.data
+        allTasks.push(...(data.tasks || []))
+        cursor = data.next_cursor
+      } while (cursor)
+
+      tasks.value = allTasks
+      return { ...data, tasks: allTasks, has_more: false, next_cursor: null }
     } catch (err) {
       error.value = err.response?.data?.error || 'Erro ao carregar tarefas'
       console.error('Erro ao buscar tarefas:', err)